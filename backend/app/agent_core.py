@@ -1,12 +1,14 @@
-import json
 import os
-import urllib.error
-import urllib.request
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, Dict, List
 
 from dotenv import load_dotenv
 
+from app.llm_cache import cache_key, get_response_cache
+from app.llm_client import get_gemini_client
+from app.prompt_builder import PromptBuild, get_prompt_builder
+from app.schemas.strategic_brief import ProductionMasterPlan
+
 # Load environment from backend/.env (local dev). In Vercel, env vars come from Project Settings.
 ENV_PATH = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=ENV_PATH, override=False)
@@ -44,14 +46,13 @@ Your process:
 - Be explicit and useful for downstream teams (creative, media, production). Flag gaps, mandatories, and assumptions.
 - The agent can be adapted with company-specific context later; note any places where brand data or historical learnings would help.
 
-Current Plan State:
+Current Plan State (compact JSON; empty fields are omitted):
 {current_plan}
 """
 
-def _gemini_generate(system_prompt: str, chat_log: List[dict]) -> str:
-    """
-    Minimal Gemini REST call (stdlib only) to keep the serverless backend lightweight.
-    """
+
+def _stub_reply() -> str | None:
+    """Canned reply for demo mode or when no API key is configured, else None."""
     if os.getenv("DEMO_AGENT_STUB") == "1":
         return (
             "Demo mode: let's lock a solid ModCon brief. Give me campaign name, SMP, primary audience, "
@@ -66,48 +67,94 @@ def _gemini_generate(system_prompt: str, chat_log: List[dict]) -> str:
             "and specs/asset libraries, and I'll draft the brief once connected."
         )
 
-    payload = {
-        "systemInstruction": {"parts": [{"text": system_prompt.strip()}]},
-        "contents": [
-            {
-                "role": ("model" if m.get("role") == "assistant" else "user"),
-                "parts": [{"text": str(m.get("content", "") or "")}],
-            }
-            for m in (chat_log or [])
-            if m and m.get("role") in ("user", "assistant")
-        ],
-    }
-
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{_MODEL_NAME}:generateContent?key={_GOOGLE_API_KEY}"
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-
-    try:
-        with urllib.request.urlopen(req, timeout=25) as resp:
-            raw = resp.read().decode("utf-8", errors="ignore")
-    except urllib.error.HTTPError as e:
-        err_body = ""
-        try:
-            err_body = e.read().decode("utf-8", errors="ignore")
-        except Exception:
-            pass
-        raise RuntimeError(f"Gemini API error {e.code}: {err_body or e.reason}") from e
-    except Exception as e:
-        raise RuntimeError(f"Gemini request failed: {e}") from e
-
-    try:
-        parsed = json.loads(raw)
-        text = " ".join(
-            (p.get("text") or "")
-            for p in (parsed.get("candidates", [{}])[0].get("content", {}).get("parts", []) or [])
-            if isinstance(p, dict)
-        ).strip()
-        return text or "No reply generated."
-    except Exception:
-        return raw or "No reply generated."
-
-
-async def process_message(history: List[dict], current_plan: dict) -> str:
-    current_plan_str = json.dumps(current_plan or {}, indent=2)
-    system_prompt = SYSTEM_PROMPT.format(current_plan=current_plan_str)
-    return _gemini_generate(system_prompt=system_prompt, chat_log=history or [])
+    return None
+
+
+async def _gemini_generate(system_prompt: str, chat_log: List[dict], use_cache: bool = True) -> str:
+    """
+    Gemini REST call through the shared async client (pooled, deadline-bound).
+
+    Identical (model, system prompt, chat log) payloads are answered from the
+    response cache; `use_cache=False` skips the lookup but still refreshes it.
+    """
+    stub = _stub_reply()
+    if stub is not None:
+        return stub
+
+    client = get_gemini_client()
+    cache = get_response_cache()
+    key = cache_key(client.model_path, system_prompt, chat_log or [])
+    if use_cache:
+        cached = await cache.aget(key)
+        if cached is not None:
+            return cached
+    else:
+        cache.record_bypass()
+
+    reply = await client.generate(system_prompt=system_prompt, chat_log=chat_log or [])
+    if reply != "No reply generated.":
+        await cache.aset(key, reply)
+    return reply
+
+
+async def _gemini_stream(system_prompt: str, chat_log: List[dict], use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of `_gemini_generate`: yields reply text chunks.
+
+    A cache hit is replayed as a single chunk; a completed stream is cached.
+    """
+    stub = _stub_reply()
+    if stub is not None:
+        yield stub
+        return
+
+    client = get_gemini_client()
+    cache = get_response_cache()
+    key = cache_key(client.model_path, system_prompt, chat_log or [])
+    if use_cache:
+        cached = await cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+    else:
+        cache.record_bypass()
+
+    parts: List[str] = []
+    async for chunk in client.stream_generate(system_prompt=system_prompt, chat_log=chat_log or []):
+        parts.append(chunk)
+        yield chunk
+
+    reply = "".join(parts).strip()
+    if reply:
+        await cache.aset(key, reply)
+
+
+def _build_prompt(history: List[dict], current_plan: dict, usage: Dict[str, int] | None) -> PromptBuild:
+    build = get_prompt_builder().build(
+        render=lambda plan_json: SYSTEM_PROMPT.format(current_plan=plan_json),
+        state=current_plan,
+        chat_log=history or [],
+        model_cls=ProductionMasterPlan,
+    )
+    if usage is not None:
+        usage.update(build.usage())
+    return build
+
+
+async def process_message(
+    history: List[dict], current_plan: dict, use_cache: bool = True, usage: Dict[str, int] | None = None
+) -> str:
+    """
+    Reply to the latest turn. Pass a dict as `usage` to receive the prompt's
+    estimated input tokens and history windowing stats.
+    """
+    build = _build_prompt(history, current_plan, usage)
+    return await _gemini_generate(system_prompt=build.system_prompt, chat_log=build.chat_log, use_cache=use_cache)
+
+
+async def stream_message(
+    history: List[dict], current_plan: dict, use_cache: bool = True, usage: Dict[str, int] | None = None
+) -> AsyncIterator[str]:
+    build = _build_prompt(history, current_plan, usage)
+    async for chunk in _gemini_stream(system_prompt=build.system_prompt, chat_log=build.chat_log, use_cache=use_cache):
+        yield chunk
@@ -1,10 +1,21 @@
-from typing import Any, Dict, List, Literal
+from typing import Any, AsyncIterator, Dict, List, Literal
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException, Path
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
 
+from app.api.sse import sse_event, sse_response
+from app.llm_cache import bypass_requested
 from app.schemas.brief import ModConBrief
-from app.services.brief_service import override_brief, update_brief_ai
+from app.services.brief_service import (
+    is_model_error_reply,
+    override_brief,
+    patch_brief,
+    stream_brief_ai,
+    update_brief_ai,
+)
+from app.services.json_patch import JsonPatchError
+from app.services.session_store import BriefSession, SessionConflictError, get_session_store
 
 
 router = APIRouter()
@@ -16,43 +27,214 @@ class BriefChatMessage(BaseModel):
 
 
 class BriefChatRequest(BaseModel):
-    current_state: ModConBrief
-    chat_log: List[BriefChatMessage]
+    """
+    Either the full payload (current_state + chat_log), or a session turn:
+    session_id + the new user message only. The server then supplies the
+    stored brief state and history.
+    """
+
+    current_state: ModConBrief | None = None
+    chat_log: List[BriefChatMessage] = []
+    session_id: str | None = None
+    message: str | None = None
 
 
 class BriefChatResponse(BaseModel):
     reply: str
     quality_score: float | None = None
     state: ModConBrief
+    session_id: str | None = None
+    # Estimated prompt size for this turn (see app.prompt_builder).
+    usage: Dict[str, int] | None = None
 
 
 class BriefUpdateRequest(BaseModel):
-    current_state: ModConBrief
-    manual_updates: Dict[str, Any]
+    """
+    Either current_state + manual_updates, or session_id + a JSON-Patch
+    (RFC 6902) list of manual edits applied to the stored brief.
+    """
+
+    current_state: ModConBrief | None = None
+    manual_updates: Dict[str, Any] = {}
+    session_id: str | None = None
+    patch: List[Dict[str, Any]] | None = None
 
 
 class BriefUpdateResponse(BaseModel):
     state: ModConBrief
+    session_id: str | None = None
+
+
+class CreateSessionRequest(BaseModel):
+    current_state: ModConBrief | None = None
+    chat_log: List[BriefChatMessage] = []
+
+
+class SessionResponse(BaseModel):
+    session_id: str
+    state: ModConBrief
+    chat_log: List[BriefChatMessage]
+    version: int
+
+
+def _session_response(session: BriefSession) -> SessionResponse:
+    return SessionResponse(
+        session_id=session.session_id,
+        state=session.state,
+        chat_log=[BriefChatMessage(**m) for m in session.chat_log],
+        version=session.version,
+    )
+
+
+# The session store is SQLite-backed; its calls run in the threadpool so a
+# write lock held by another worker never stalls the event loop.
+async def _load_session(session_id: str) -> BriefSession:
+    session = await run_in_threadpool(get_session_store().get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
+async def _save_session(session: BriefSession) -> BriefSession:
+    try:
+        return await run_in_threadpool(get_session_store().save, session)
+    except SessionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _resolve_chat(request: BriefChatRequest) -> tuple[BriefSession | None, ModConBrief, List[Dict[str, str]]]:
+    """Return (session, state, chat_log) for either request shape."""
+    if request.session_id:
+        if not (request.message or "").strip():
+            raise HTTPException(status_code=422, detail="message is required when session_id is provided")
+        session = await _load_session(request.session_id)
+        chat_log = session.chat_log + [{"role": "user", "content": request.message}]
+        return session, session.state, chat_log
+
+    if request.current_state is None:
+        raise HTTPException(status_code=422, detail="Provide current_state + chat_log, or session_id + message")
+    return None, request.current_state, [m.dict() for m in request.chat_log]
+
+
+async def _record_turn(
+    session: BriefSession, chat_log: List[Dict[str, str]], state: ModConBrief, reply: str
+) -> BriefSession:
+    # A failed model call is not a turn: keep the stored log as it was so the
+    # user can simply resend the message.
+    if is_model_error_reply(reply):
+        return session
+    session.chat_log = chat_log + [{"role": "assistant", "content": reply}]
+    session.state = state
+    return await _save_session(session)
+
+
+@router.post("/session", response_model=SessionResponse)
+async def create_session(request: CreateSessionRequest) -> SessionResponse:
+    """
+    Start a server-side brief session, optionally seeded with existing state.
+    """
+    session = BriefSession(
+        state=request.current_state or ModConBrief(),
+        chat_log=[m.dict() for m in request.chat_log],
+    )
+    return _session_response(await _save_session(session))
+
+
+@router.get("/session/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str = Path(..., description="ID of the brief session")) -> SessionResponse:
+    return _session_response(await _load_session(session_id))
+
+
+@router.delete("/session/{session_id}")
+async def delete_session(session_id: str = Path(..., description="ID of the brief session")):
+    if not await run_in_threadpool(get_session_store().delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
 
 
 @router.post("/chat", response_model=BriefChatResponse)
-async def brief_chat(request: BriefChatRequest) -> BriefChatResponse:
+async def brief_chat(
+    request: BriefChatRequest, x_llm_cache: str | None = Header(default=None)
+) -> BriefChatResponse:
+    session, current_state, chat_log = await _resolve_chat(request)
+    usage: Dict[str, int] = {}
     try:
-        new_state, reply, quality_score = update_brief_ai(
-            current_state=request.current_state, chat_log=[m.dict() for m in request.chat_log]
+        new_state, reply, quality_score = await update_brief_ai(
+            current_state=current_state,
+            chat_log=chat_log,
+            use_cache=not bypass_requested(x_llm_cache),
+            usage=usage,
         )
-        return BriefChatResponse(reply=reply, state=new_state, quality_score=quality_score)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    session_id = None
+    if session is not None:
+        session_id = (await _record_turn(session, chat_log, new_state, reply)).session_id
+    return BriefChatResponse(
+        reply=reply, state=new_state, quality_score=quality_score, session_id=session_id, usage=usage
+    )
+
+
+@router.post("/chat/stream")
+async def brief_chat_stream(request: BriefChatRequest, x_llm_cache: str | None = Header(default=None)):
+    """
+    SSE variant of /brief/chat.
+
+    Emits `token` events with assistant_reply text as soon as it is parsed out
+    of the partial model JSON, then one `done` event with the cleaned reply,
+    quality_score and merged ModConBrief state. Session turns are saved
+    before the `done` event is sent.
+    """
+    session, current_state, chat_log = await _resolve_chat(request)
+    use_cache = not bypass_requested(x_llm_cache)
+
+    async def frames() -> AsyncIterator[str]:
+        usage: Dict[str, int] = {}
+        try:
+            async for event, data in stream_brief_ai(
+                current_state=current_state, chat_log=chat_log, use_cache=use_cache, usage=usage
+            ):
+                if event == "done":
+                    data["usage"] = usage
+                if event == "done" and session is not None:
+                    await _record_turn(session, chat_log, ModConBrief(**data["state"]), data["reply"])
+                    data["session_id"] = session.session_id
+                yield sse_event(event, data)
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return sse_response(frames())
+
 
 @router.put("/update", response_model=BriefUpdateResponse)
 async def brief_update(request: BriefUpdateRequest) -> BriefUpdateResponse:
+    if request.session_id:
+        session = await _load_session(request.session_id)
+        try:
+            if request.manual_updates:
+                session.state = override_brief(current_state=session.state, manual_updates=request.manual_updates)
+            session.state = patch_brief(session.state, request.patch or [])
+        except (JsonPatchError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        saved = await _save_session(session)
+        return BriefUpdateResponse(state=saved.state, session_id=saved.session_id)
+
+    if request.current_state is None:
+        raise HTTPException(status_code=422, detail="Provide current_state + manual_updates, or session_id + patch")
     try:
         new_state = override_brief(
             current_state=request.current_state, manual_updates=request.manual_updates
         )
+        if request.patch:
+            new_state = patch_brief(new_state, request.patch)
         return BriefUpdateResponse(state=new_state)
+    except (JsonPatchError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
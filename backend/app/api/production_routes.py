@@ -1,19 +1,28 @@
-from typing import List
+import re
+from typing import AsyncIterator, Dict, List, get_origin
 
-from fastapi import APIRouter, HTTPException, Path
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Path, Query
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
 
+from app.api.sse import sse_event, sse_response
+from app.feed_schema import normalise_column
 from app.models.production_matrix import ProductionAsset, ProductionBatch
-from app.schemas.concepts import CreativeConcept
+from app.schemas.concepts import ConceptState, CreativeConcept
 from app.schemas.production_matrix import ProductionJob
-from app.schemas.strategic_matrix import StrategicMatrixRow
-from app.services.matrix_builder import MatrixBuilder
+from app.schemas.strategic_matrix import AudienceContentMatrix, StrategicMatrixRow
+from app.schemas.uploads import UploadSelection
+from app.services.matrix_builder import MatrixBuilder, get_catalog_columns
 from app.services.matrix_generator import (
     generate_production_plan,
+    generate_production_plans,
     get_batch,
+    get_batch_status_counts,
+    list_campaign_batches,
     update_asset_status,
 )
-from app.services.spec_service import get_all_specs
+from app.services.spec_registry import get_spec_registry
+from app.upload_store import select_upload
 
 
 router = APIRouter()
@@ -33,11 +42,46 @@ class GenerateProductionResponse(BaseModel):
     assets: List[ProductionAsset]
 
 
+class BulkGenerateProductionRequest(BaseModel):
+    """
+    Whole-campaign explosion: every decision row in the matrix × every concept.
+    campaign_id defaults to the matrix's campaign_name.
+
+    Instead of an inline `matrix`, `matrix_rows` can reference a strategy CSV
+    stored by /upload (one StrategicMatrixRow per row; column names are
+    matched to the fields case- and punctuation-insensitively, so
+    "Segment Name" fills segment_name). campaign_id is then required.
+    """
+
+    matrix: AudienceContentMatrix | None = None
+    matrix_rows: UploadSelection | None = None
+    concepts: ConceptState
+    campaign_id: str | None = None
+    source_asset_requirements: str | None = None
+    adaptation_instruction: str | None = None
+
+
+class BulkGenerateProductionResponse(BaseModel):
+    campaign_id: str
+    batches: List[GenerateProductionResponse]
+    asset_count: int
+
+
 class BatchResponse(BaseModel):
     batch: ProductionBatch
     assets: List[ProductionAsset]
 
 
+class BatchStatusCountsResponse(BaseModel):
+    batch_id: str
+    counts: Dict[str, int]
+
+
+class CampaignBatchesResponse(BaseModel):
+    campaign_id: str
+    batches: List[ProductionBatch]
+
+
 class UpdateStatusRequest(BaseModel):
     status: str
 
@@ -50,13 +94,21 @@ class MatrixBuilderRequest(BaseModel):
     """
     Frontend payload for the Production Matrix Builder.
 
-    The UI selects one creative concept label and a set of spec IDs
-    (from the spec library). The backend then groups those specs into
-    consolidated ProductionJob tickets.
+    The UI selects one creative concept label (or several, for a whole
+    campaign) and a set of spec IDs (from the spec library). The backend
+    then groups those specs into consolidated ProductionJob tickets, one set
+    per concept.
+
+    With `consolidate`, sizes that can be scaled (or cropped and scaled)
+    down from a larger render with an aspect ratio within `ratio_tolerance`
+    share that master's job instead of getting their own.
     """
 
-    creative_concept: str
+    creative_concept: str | None = None
+    creative_concepts: List[str] = []
     spec_ids: List[str]
+    consolidate: bool = False
+    ratio_tolerance: float = Field(0.05, ge=0.0, le=0.5)
 
 
 class MatrixBuilderResponse(BaseModel):
@@ -69,7 +121,8 @@ async def generate_production(request: GenerateProductionRequest) -> GeneratePro
     Trigger the Production Matrix 'explosion' for a given Strategy row + Concept.
     """
     try:
-        batch, assets = generate_production_plan(
+        batch, assets = await run_in_threadpool(
+            generate_production_plan,
             campaign_id=request.campaign_id,
             strategy=request.strategy,
             concept=request.concept,
@@ -82,17 +135,150 @@ async def generate_production(request: GenerateProductionRequest) -> GeneratePro
         raise HTTPException(status_code=500, detail=str(e))
 
 
+_LIST_CELL_RE = re.compile(r"[;|\n]")
+
+
+def _uploaded_strategies(selection: UploadSelection) -> List[StrategicMatrixRow]:
+    try:
+        rows = select_upload(selection)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    fields = {normalise_column(name): name for name in StrategicMatrixRow.model_fields}
+    columns = {column: fields[normalise_column(column)] for column in rows.table.column_names if normalise_column(column) in fields}
+    # List fields (platform_environments) arrive as one cell: "Meta Reels; TikTok".
+    list_fields = {
+        name for name, info in StrategicMatrixRow.model_fields.items() if get_origin(info.annotation) in (list, List)
+    }
+    strategies: List[StrategicMatrixRow] = []
+    for n, row in enumerate(rows, start=1):
+        data = {}
+        for column, field in columns.items():
+            value = row[column]
+            if field in list_fields:
+                value = [part.strip() for part in _LIST_CELL_RE.split(value) if part.strip()]
+            data[field] = value
+        try:
+            strategies.append(StrategicMatrixRow.model_validate(data))
+        except ValidationError as e:
+            error = e.errors()[0]
+            raise HTTPException(
+                status_code=422,
+                detail=f"matrix_rows row {n}: {'.'.join(map(str, error['loc']))}: {error['msg']}",
+            )
+    return strategies
+
+
+def _generate_bulk(request: BulkGenerateProductionRequest) -> tuple[str, list]:
+    if request.matrix_rows is not None:
+        if not request.campaign_id:
+            raise HTTPException(status_code=422, detail="campaign_id is required with matrix_rows")
+        strategies = _uploaded_strategies(request.matrix_rows)
+        campaign_id = request.campaign_id
+    elif request.matrix is not None:
+        strategies = request.matrix.decision_rows
+        campaign_id = request.campaign_id or request.matrix.campaign_name
+    else:
+        raise HTTPException(status_code=422, detail="Provide matrix or matrix_rows.")
+    if not strategies or not request.concepts.concepts:
+        raise HTTPException(status_code=422, detail="matrix.decision_rows and concepts.concepts must not be empty")
+    try:
+        plans = generate_production_plans(
+            campaign_id=campaign_id,
+            strategies=strategies,
+            concepts=request.concepts.concepts,
+            source_asset_requirements=request.source_asset_requirements,
+            adaptation_instruction=request.adaptation_instruction,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return campaign_id, plans
+
+
+@router.post("/generate/bulk", response_model=BulkGenerateProductionResponse)
+async def generate_production_bulk(request: BulkGenerateProductionRequest) -> BulkGenerateProductionResponse:
+    """
+    Run the Production Matrix explosion for every strategy row × concept in one
+    call. All batches are stored in a single transaction.
+    """
+    # Reading an uploaded matrix and the plan explosion are CPU / disk bound,
+    # and the store's writes can wait on another worker's SQLite write lock.
+    campaign_id, plans = await run_in_threadpool(_generate_bulk, request)
+    return BulkGenerateProductionResponse(
+        campaign_id=campaign_id,
+        batches=[GenerateProductionResponse(batch=batch, assets=assets) for batch, assets in plans],
+        asset_count=sum(len(assets) for _, assets in plans),
+    )
+
+
+@router.post("/generate/bulk/stream")
+async def generate_production_bulk_stream(request: BulkGenerateProductionRequest):
+    """
+    SSE variant of /production/generate/bulk.
+
+    The plans are generated and stored up front (one transaction), then sent
+    as one `batch` event per batch ({batch, assets}) followed by a `done`
+    event with the totals, so large grids render progressively.
+    """
+    campaign_id, plans = await run_in_threadpool(_generate_bulk, request)
+
+    async def frames() -> AsyncIterator[str]:
+        for batch, assets in plans:
+            yield sse_event(
+                "batch", GenerateProductionResponse(batch=batch, assets=assets).model_dump(mode="json")
+            )
+        yield sse_event(
+            "done",
+            {
+                "campaign_id": campaign_id,
+                "batch_count": len(plans),
+                "asset_count": sum(len(assets) for _, assets in plans),
+            },
+        )
+
+    return sse_response(frames())
+
+
 @router.get("/batch/{batch_id}", response_model=BatchResponse)
-async def get_production_batch(batch_id: str = Path(..., description="ID of the production batch")) -> BatchResponse:
+async def get_production_batch(
+    batch_id: str = Path(..., description="ID of the production batch"),
+    status: str | None = Query(None, description="Only return assets in this workflow status"),
+) -> BatchResponse:
     """
     Return a ProductionBatch and all associated ProductionAssets.
     """
-    batch, assets = get_batch(batch_id)
+    batch, assets = await run_in_threadpool(get_batch, batch_id, status)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     return BatchResponse(batch=batch, assets=assets)
 
 
+@router.get("/batch/{batch_id}/counts", response_model=BatchStatusCountsResponse)
+async def get_production_batch_counts(
+    batch_id: str = Path(..., description="ID of the production batch"),
+) -> BatchStatusCountsResponse:
+    """
+    Return the number of assets in each workflow status (kanban column counts).
+    """
+    counts = await run_in_threadpool(get_batch_status_counts, batch_id)
+    if counts is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return BatchStatusCountsResponse(batch_id=batch_id, counts=counts)
+
+
+@router.get("/campaign/{campaign_id}/batches", response_model=CampaignBatchesResponse)
+async def get_campaign_batches(
+    campaign_id: str = Path(..., description="ID of the campaign"),
+) -> CampaignBatchesResponse:
+    """
+    Return every ProductionBatch generated for a campaign.
+    """
+    batches = await run_in_threadpool(list_campaign_batches, campaign_id)
+    return CampaignBatchesResponse(campaign_id=campaign_id, batches=batches)
+
+
 @router.patch("/asset/{asset_id}/status", response_model=UpdateStatusResponse)
 async def patch_asset_status(
     asset_id: str = Path(..., description="ID of the production asset to update"),
@@ -101,7 +287,7 @@ async def patch_asset_status(
     """
     Update the workflow status for a ProductionAsset (e.g., Todo -> In_Progress).
     """
-    asset = update_asset_status(asset_id, payload.status)
+    asset = await run_in_threadpool(update_asset_status, asset_id, payload.status)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     return UpdateStatusResponse(asset=asset)
@@ -112,31 +298,40 @@ async def build_production_jobs(payload: MatrixBuilderRequest) -> MatrixBuilderR
     """
     Production Matrix Builder endpoint.
 
-    - Looks up the selected specs from the Spec Library (by ID).
-    - Uses MatrixBuilder to collapse redundant specs into master ProductionJobs.
+    - Looks up the selected specs in the catalog's columnar view (by ID).
+    - Uses MatrixBuilder to collapse redundant specs into master ProductionJobs,
+      for every requested concept in one pass (optionally consolidating
+      near-identical aspect ratios onto shared master renders).
     - Returns the consolidated job list for display in the UI.
 
     Note: For this POC, jobs are not persisted to a real database; the
     frontend treats the response as the current working plan.
     """
+    concepts = ([payload.creative_concept] if payload.creative_concept else []) + payload.creative_concepts
+    if not concepts:
+        raise HTTPException(status_code=422, detail="Provide creative_concept or creative_concepts.")
+
     try:
-        all_specs = get_all_specs()
-        spec_by_id = {spec.id: spec for spec in all_specs}
+        registry = get_spec_registry()
+        columns = get_catalog_columns()
 
-        selected_specs: List[dict] = []
+        rows: List[int] = []
         for sid in payload.spec_ids:
-            spec = spec_by_id.get(sid)
-            if spec:
-                selected_specs.append(spec.model_dump())
-
-        if not selected_specs:
+            row = columns.positions.get(sid)
+            if row is None:
+                entry = registry.entry(sid)
+                row = columns.positions.get(entry["id"]) if entry else None
+            if row is not None:
+                rows.append(row)
+
+        if not rows:
             raise HTTPException(status_code=400, detail="No valid specs found for the provided spec_ids.")
 
         builder = MatrixBuilder()
-        jobs = builder.group_specs_by_creative(
-            selected_specs=selected_specs,
-            creative_concept=payload.creative_concept,
-        )
+        if payload.consolidate:
+            jobs = builder.consolidate_campaign(columns, rows, concepts, ratio_tolerance=payload.ratio_tolerance)
+        else:
+            jobs = builder.group_campaign(columns, rows, concepts)
         return MatrixBuilderResponse(jobs=jobs)
     except HTTPException:
         raise
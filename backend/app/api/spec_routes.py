@@ -1,33 +1,130 @@
+import base64
+from email.utils import formatdate, parsedate_to_datetime
 from typing import List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 
 from app.schemas.specs import Spec, SpecCreate
-from app.services.spec_service import get_all_specs, save_spec
+from app.services.environment_matcher import get_environment_matcher
+from app.services.spec_registry import get_spec_registry
+from app.services.spec_service import query_specs, save_spec
 
 
 router = APIRouter()
 
 
+def _encode_cursor(position: int) -> str:
+    return base64.urlsafe_b64encode(f"p{position}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith("p"):
+            raise ValueError(raw)
+        return int(raw[1:])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _not_modified(etag: str, last_modified: float, if_none_match: str | None, if_modified_since: str | None) -> bool:
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
 @router.get("", response_model=List[Spec])
-async def list_specs() -> List[Spec]:
+async def list_specs(
+    response: Response,
+    platform: str | None = Query(None, description="Platform name or id, e.g. 'meta' or 'TikTok'"),
+    media_type: str | None = Query(None, description="e.g. 'video', 'image_or_video'"),
+    orientation: str | None = Query(None, description="vertical | horizontal | square, or a ratio label like '9:16'"),
+    min_width: int | None = Query(None, ge=0),
+    max_width: int | None = Query(None, ge=0),
+    min_height: int | None = Query(None, ge=0),
+    max_height: int | None = Query(None, ge=0),
+    aspect_ratio: str | None = Query(None, description="'9:16', '1.91:1' or a decimal width/height"),
+    ratio_tolerance: float = Query(0.01, ge=0, le=1, description="Relative tolerance for aspect_ratio"),
+    q: str | None = Query(None, description="Free-text search over id, platform, placement and notes"),
+    limit: int | None = Query(None, ge=1, le=500, description="Page size; omit for all matches"),
+    cursor: str | None = Query(None, description="X-Next-Cursor from the previous page"),
+    if_none_match: str | None = Header(default=None),
+    if_modified_since: str | None = Header(default=None),
+) -> List[Spec]:
     """
     Return the current spec library for use in dropdowns and planning tools.
+
+    All filters are optional and combine with AND. When `limit` is set and
+    more matches remain, the X-Next-Cursor header carries the cursor for the
+    next page. Responses are tagged with the catalog version (ETag /
+    Last-Modified) and answer conditional requests with 304.
     """
+    registry = get_spec_registry()
+    etag = f'"{registry.version}"'
+    last_modified = registry.last_modified
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
     try:
-        return get_all_specs()
+        specs, next_position = query_specs(
+            platform=platform,
+            media_type=media_type,
+            orientation=orientation,
+            min_width=min_width,
+            max_width=max_width,
+            min_height=min_height,
+            max_height=max_height,
+            aspect_ratio=aspect_ratio,
+            ratio_tolerance=ratio_tolerance,
+            search=q,
+            after=_decode_cursor(cursor) if cursor else -1,
+            limit=limit,
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    response.headers.update(headers)
+    if next_position is not None:
+        response.headers["X-Next-Cursor"] = _encode_cursor(next_position)
+    return specs
+
+
+@router.get("/match")
+async def match_environment(
+    label: str = Query(..., min_length=1, description="Environment label, e.g. 'Meta: Stories/Reels (9:16)'"),
+    limit: int = Query(5, ge=1, le=50),
+):
+    """
+    Rank spec IDs for a strategist environment label, with confidence scores.
+    """
+    try:
+        matches = get_environment_matcher().match(label, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"label": label, "matches": [m.as_dict() for m in matches]}
+
 
 @router.post("", response_model=Spec)
 async def create_spec(payload: SpecCreate) -> Spec:
     """
-    Create a new custom spec (POC-only: stored in JSON).
+    Create a new custom spec (appended to the custom spec log).
     """
     try:
         return save_spec(payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
-
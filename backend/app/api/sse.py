@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+"""
+Server-Sent Events helpers shared by the streaming chat routes.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one SSE frame with a named event and a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(frames: AsyncIterator[str]) -> StreamingResponse:
+    """
+    Wrap pre-formatted SSE frames in a StreamingResponse.
+
+    An initial comment frame is sent immediately so proxies flush headers and
+    the browser sees the first byte before the model has produced anything.
+    """
+
+    async def body() -> AsyncIterator[str]:
+        yield ": stream open\n\n"
+        async for frame in frames:
+            yield frame
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+"""
+Streaming ZIP bundle of everything production needs for a campaign.
+
+The archive is written with zipfile onto a sink that is drained after every
+write, so each part leaves the server as soon as it is compressed and
+nothing is buffered beyond the part currently in flight (zipfile falls back
+to data descriptors because the sink cannot seek). The DCO feed is
+generated and encoded straight into its entry a slice of rows at a time.
+
+The parts that are rendered whole (the PDF, production batches from the
+store) start on their own threads as soon as the bundle is requested and
+are written in as they complete, while the TXT brief, job list and feed
+are streamed.
+
+Layout, in write order:
+    brief.txt
+    feed/asset_feed.csv, feed/asset_feed.ndjson
+    production/jobs.json
+    production/batches/<batch_id>.json   ({batch, assets};
+                                          production/batches.error.txt if the store read failed)
+    brief.pdf                            (brief.pdf.error.txt if the render failed)
+"""
+
+import asyncio
+import json
+import zipfile
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.feed_generator import iter_dco_feed
+from app.feed_schema import FeedSchema
+from app.feed_stream import encode_feed
+from app.plan_export import get_pdf_renderer, render_plan_txt
+from app.services.matrix_generator import get_batch, list_campaign_batches
+
+
+# Feed rows generated and compressed per thread hop.
+FEED_SLICE_ROWS = 2000
+
+FEED_MEMBERS = {"csv": "feed/asset_feed.csv", "ndjson": "feed/asset_feed.ndjson"}
+
+
+class _Sink:
+    """Write-only, non-seekable file object that hands back what was written."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class BundleWriter:
+    """Synchronous ZIP writer whose methods return the bytes ready to send."""
+
+    def __init__(self) -> None:
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+        self._entry: Any = None
+
+    def add(self, name: str, data: bytes | str) -> bytes:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._zip.open(name, "w", force_zip64=True) as entry:
+            entry.write(data)
+        return self._sink.drain()
+
+    def open(self, name: str) -> bytes:
+        self._entry = self._zip.open(name, "w", force_zip64=True)
+        return self._sink.drain()
+
+    def write(self, data: str) -> bytes:
+        self._entry.write(data.encode("utf-8"))
+        return self._sink.drain()
+
+    def close_entry(self) -> bytes:
+        self._entry.close()
+        self._entry = None
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._zip.close()
+        return self._sink.drain()
+
+
+def _batch_parts(batch_ids: Iterable[str], campaign_id: str | None) -> List[Tuple[str, str]]:
+    """(member name, JSON) per stored production batch."""
+    ids = list(dict.fromkeys(batch_ids))
+    if campaign_id:
+        ids.extend(b.id for b in list_campaign_batches(campaign_id) if b.id not in ids)
+    parts = []
+    for batch_id in ids:
+        batch, assets = get_batch(batch_id)
+        if batch is None:
+            continue
+        payload = {
+            "batch": batch.model_dump(mode="json"),
+            "assets": [asset.model_dump(mode="json") for asset in assets],
+        }
+        parts.append((f"production/batches/{batch_id}.json", json.dumps(payload, indent=2)))
+    return parts
+
+
+async def stream_bundle(
+    plan: Dict[str, Any],
+    *,
+    feed_inputs: Dict[str, Any] | None = None,
+    feed_formats: Iterable[str] = ("csv",),
+    jobs: List[Dict[str, Any]] | None = None,
+    batch_ids: Iterable[str] = (),
+    campaign_id: str | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield the bundle ZIP in chunks. `feed_inputs` carries the
+    /generate-feed request fields (audience_strategy, asset_list,
+    media_plan_rows, column_aliases); the feed is skipped without it.
+    """
+    writer = BundleWriter()
+    loop = asyncio.get_running_loop()
+
+    # Whole-part renders start right away and run alongside the streaming.
+    _, pdf_future = get_pdf_renderer().submit(plan)
+    pdf_task = asyncio.wrap_future(pdf_future)
+    batches_task = loop.create_task(run_in_threadpool(_batch_parts, list(batch_ids), campaign_id))
+
+    async def step(fn: Callable[..., bytes], *args: Any) -> bytes:
+        return await run_in_threadpool(fn, *args)
+
+    try:
+        yield await step(_add_brief_txt, writer, plan)
+
+        if feed_inputs is not None:
+            schema = FeedSchema(feed_inputs.get("column_aliases"))
+            for fmt in dict.fromkeys(feed_formats):
+                rows = iter_dco_feed(
+                    feed_inputs.get("audience_strategy") or [],
+                    feed_inputs.get("asset_list") or [],
+                    feed_inputs.get("media_plan_rows") or [],
+                    schema,
+                )
+                lines: Iterator[str] = encode_feed(rows, fmt)
+                yield await step(writer.open, FEED_MEMBERS[fmt])
+                while True:
+                    chunk = await step(_write_slice, writer, lines)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        yield chunk
+                yield await step(writer.close_entry)
+
+        if jobs is not None:
+            yield await step(writer.add, "production/jobs.json", json.dumps(jobs, indent=2))
+
+        # Most of the archive has already been sent by now, so a failed store
+        # read or render is recorded in the bundle rather than cutting the
+        # ZIP short.
+        try:
+            batch_parts = await batches_task
+        except Exception as e:
+            yield await step(writer.add, "production/batches.error.txt", f"Reading production batches failed: {e}\n")
+        else:
+            for name, data in batch_parts:
+                yield await step(writer.add, name, data)
+
+        try:
+            pdf = await pdf_task
+        except Exception as e:
+            yield await step(writer.add, "brief.pdf.error.txt", f"PDF render failed: {e}\n")
+        else:
+            yield await step(writer.add, "brief.pdf", pdf)
+        yield await step(writer.finish)
+    finally:
+        batches_task.cancel()
+
+
+def _add_brief_txt(writer: BundleWriter, plan: Dict[str, Any]) -> bytes:
+    return writer.add("brief.txt", render_plan_txt(plan))
+
+
+def _write_slice(writer: BundleWriter, lines: Iterator[str]) -> bytes | None:
+    """Encode and compress the next FEED_SLICE_ROWS lines; None once exhausted."""
+    text = "".join(islice(lines, FEED_SLICE_ROWS))
+    if not text:
+        return None
+    return writer.write(text)
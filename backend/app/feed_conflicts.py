@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+"""
+Targeting conflict detection for generated DCO feeds.
+
+Two feed rows are ambiguous when the ad server has nothing to choose
+between them: same platform, placement, audience, geo and trigger, and
+flight windows (date_start / date_end, inclusive, blank = open) that
+intersect. Rows that both carry a rotation_weight are deliberate rotation
+variants; an overlap made up only of those is not reported. Rows whose
+dates are not ISO dates are reported as invalid rather than treated as open.
+
+Rather than comparing rows pairwise, rows are grouped by
+(platform_id, placement_dimension, audience_id, geo_targeting) and each
+group is swept once over its sorted window boundaries:
+
+  - per trigger, a running active set gives the maximal date ranges where
+    two or more rows are live, and the rows involved (ambiguous overlaps);
+  - across triggers, the union of windows gives the date ranges between a
+    group's first and last flight that no row covers (coverage gaps).
+
+Sorting dominates, so the whole pass is O(n log n) plus the size of the
+report.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.feed_join import normalise_value
+from app.schemas.feed import AssetFeedRow
+
+
+GROUP_FIELDS = ("platform_id", "placement_dimension", "audience_id", "geo_targeting")
+
+# Day ordinals for open window ends (ends are stored exclusive).
+_MAX_DAY = date.max.toordinal()
+_OPEN_START = 0
+_OPEN_END = _MAX_DAY + 2
+# Cached in place of a day ordinal for dates that do not parse.
+_BAD_DAY = -1
+
+
+@dataclass
+class FeedOverlap:
+    """A maximal date range where 2+ rows of one group / trigger are live at once."""
+
+    group: Dict[str, str]
+    trigger: str
+    start: str | None
+    end: str | None
+    row_ids: List[str]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "group": self.group,
+            "trigger": self.trigger,
+            "start": self.start,
+            "end": self.end,
+            "row_ids": self.row_ids,
+        }
+
+
+@dataclass
+class CoverageGap:
+    """A date range inside a group's flight span that no row covers."""
+
+    group: Dict[str, str]
+    start: str
+    end: str
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"group": self.group, "start": self.start, "end": self.end}
+
+
+@dataclass
+class ConflictReport:
+    rows: int
+    groups: int
+    overlaps: List[FeedOverlap] = field(default_factory=list)
+    gaps: List[CoverageGap] = field(default_factory=list)
+    # Rows whose date_end is before their date_start, or whose dates are
+    # not ISO dates (left out of the sweep).
+    invalid_windows: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "groups": self.groups,
+            "overlaps": [o.as_dict() for o in self.overlaps],
+            "gaps": [g.as_dict() for g in self.gaps],
+            "invalid_windows": self.invalid_windows,
+        }
+
+
+def _day(value: Any) -> int | None:
+    """
+    Day ordinal of an ISO date / datetime string; None when blank, _BAD_DAY
+    when it does not parse (e.g. 01/25/2024), so it is not taken as open.
+    """
+    text = str(value or "").strip()[:10]
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text).toordinal()
+    except ValueError:
+        return _BAD_DAY
+
+
+def _iso(ordinal: int) -> str | None:
+    if ordinal < 1 or ordinal > _MAX_DAY:
+        return None
+    return date.fromordinal(ordinal).isoformat()
+
+
+# (start, exclusive end, row_id, has rotation_weight)
+_Window = Tuple[int, int, str, bool]
+
+
+def _sweep_overlaps(windows: List[_Window]) -> Iterable[Tuple[int, int, List[str]]]:
+    """
+    Maximal [start, end) ranges during which 2+ windows are live (not all of
+    them rotation variants), with every window that takes part. Each range
+    lists the windows live when it opens plus those starting inside it, so
+    the output stays linear in the number of windows.
+    """
+    events: List[Tuple[int, int, int]] = []
+    for i, (start, end, _, _) in enumerate(windows):
+        # Ends sort before starts on the same day: windows are half-open.
+        events.append((start, 1, i))
+        events.append((end, 0, i))
+    events.sort()
+
+    active: Dict[int, None] = {}
+    fixed = 0  # live windows without a rotation_weight
+    opened_at = 0
+    members: Dict[int, None] | None = None
+    n = len(events)
+    k = 0
+    while k < n:
+        day = events[k][0]
+        while k < n and events[k][0] == day:
+            _, is_start, i = events[k]
+            if is_start:
+                active[i] = None
+                fixed += not windows[i][3]
+                if members is not None:
+                    members[i] = None
+            else:
+                del active[i]
+                fixed -= not windows[i][3]
+            k += 1
+        ambiguous = len(active) > 1 and fixed > 0
+        if ambiguous and members is None:
+            opened_at, members = day, dict(active)
+        elif not ambiguous and members is not None:
+            yield opened_at, day, [windows[i][2] for i in members]
+            members = None
+
+
+def _sweep_gaps(windows: List[_Window]) -> Iterable[Tuple[int, int]]:
+    """Uncovered [start, end) ranges between the first and last window."""
+    reach: int | None = None
+    for start, end, _, _ in sorted(windows):
+        if reach is not None and start > reach:
+            yield reach, start
+        reach = end if reach is None else max(reach, end)
+
+
+def detect_feed_conflicts(feed: Iterable[AssetFeedRow | Dict[str, Any]]) -> ConflictReport:
+    """
+    Ambiguous overlaps and coverage gaps in a feed (AssetFeedRows or their
+    dict form, e.g. rows as returned by /generate-feed).
+    """
+    groups: Dict[Tuple[str, ...], Tuple[Dict[str, str], Dict[str, List[_Window]]]] = {}
+    # Feeds repeat the same few group values, dates and triggers across many
+    # rows, so each distinct value is normalised / parsed once.
+    entries: Dict[Tuple[Any, ...], Tuple[Dict[str, str], Dict[str, List[_Window]]]] = {}
+    triggers: Dict[Any, str] = {}
+    starts: Dict[Any, int] = {}
+    ends: Dict[Any, int] = {}
+    report = ConflictReport(rows=0, groups=0)
+
+    for row in feed:
+        data = row.__dict__ if isinstance(row, AssetFeedRow) else row
+        report.rows += 1
+        row_id = str(data.get("row_id") or "")
+
+        start_value = data.get("date_start")
+        start = starts.get(start_value)
+        if start is None:
+            day = _day(start_value)
+            start = starts[start_value] = _OPEN_START if day is None else day
+        end_value = data.get("date_end")
+        end = ends.get(end_value)
+        if end is None:
+            day = _day(end_value)
+            if day is None:
+                end = _OPEN_END
+            else:
+                end = day if day == _BAD_DAY else day + 1
+            ends[end_value] = end
+        if end <= start or start == _BAD_DAY or end == _BAD_DAY:
+            report.invalid_windows.append(row_id)
+            continue
+
+        values = tuple(map(data.get, GROUP_FIELDS))
+        entry = entries.get(values)
+        if entry is None:
+            raw = tuple("" if value is None else str(value) for value in values)
+            key = tuple(normalise_value(value) for value in raw)
+            entry = groups.get(key)
+            if entry is None:
+                entry = groups[key] = (dict(zip(GROUP_FIELDS, raw)), {})
+            entries[values] = entry
+        trigger_value = data.get("trigger_condition")
+        trigger = triggers.get(trigger_value)
+        if trigger is None:
+            trigger = triggers[trigger_value] = normalise_value(trigger_value)
+        entry[1].setdefault(trigger, []).append(
+            (start, end, row_id, data.get("rotation_weight") is not None)
+        )
+
+    report.groups = len(groups)
+    for label, by_trigger in groups.values():
+        for trigger, windows in by_trigger.items():
+            if len(windows) < 2:
+                continue
+            for start, end, row_ids in _sweep_overlaps(windows):
+                report.overlaps.append(
+                    FeedOverlap(
+                        group=label,
+                        trigger=trigger,
+                        start=_iso(start),
+                        end=_iso(end - 1),
+                        row_ids=row_ids,
+                    )
+                )
+        every = [w for windows in by_trigger.values() for w in windows]
+        for start, end in _sweep_gaps(every):
+            report.gaps.append(CoverageGap(group=label, start=_iso(start), end=_iso(end - 1)))
+    return report
@@ -1,105 +1,175 @@
-from typing import List, Dict, Any
-from uuid import uuid4
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from uuid import NAMESPACE_URL, uuid5
 
-from app.schemas.feed import AssetFeedRow
+from app.feed_join import JoinIndex, JoinMatch, normalise_value
+from app.feed_schema import FeedSchema
+from app.schemas.feed import AssetFeedRow, FeedDelta
 
 
-def _normalise_key(name: str) -> str:
-    """Return a lowercase, underscore variant of a column name for fuzzy matching."""
-    return name.strip().lower().replace(" ", "_")
+# Namespace for deterministic feed row IDs (uuid5 of the row's identity).
+FEED_ROW_NAMESPACE = uuid5(NAMESPACE_URL, "intelligent-briefing-agent/dco-feed-row")
+_NAMESPACE_SHA1 = hashlib.sha1(FEED_ROW_NAMESPACE.bytes)
 
 
-def generate_dco_feed(
-    audience_strategy: List[Dict[str, Any]],
-    asset_list: List[Dict[str, Any]],
-    media_plan_rows: List[Dict[str, Any]],
-) -> List[AssetFeedRow]:
+class DcoFeedBuilder:
     """
-    Generate a simple DCO feed that connects strategy + concepts + media.
-
-    This deliberately stays schema-light so we can evolve the upstream data
-    structures (AudienceStrategy, AssetList, MediaPlanRows) without having to
-    constantly rework the core loop.
+    Incremental form of generate_dco_feed.
 
-    Expected (but not strictly required) shapes:
-      - audience_strategy: [{ "audience": "Prospects", "headline": "..." }, ...]
-      - asset_list:       [{ "audience": "Prospects", "image_url": "...", "exit_url": "..." }, ...]
-      - media_plan_rows:  [{ "Placement ID": "123", "Target Audience": "Prospects", ... }, ...]
+    The strategy and asset join indexes are built once; `rows()` then turns
+    media plan rows into AssetFeedRows lazily, one at a time. Each media row
+    joins on (audience, geo, trigger, platform, size) with fallback to less
+    specific keys (see app.feed_join); when several strategy / asset rows
+    match, it expands to one feed row per combination, carrying its share
+    in `rotation_weight`. Row numbering
+    (and `is_default` on the very first row) carries on across calls, so a
+    plan can be fed in batches as it streams in.
 
-    The function:
-      - walks each media row
-      - finds a matching strategy row by audience -> headline
-      - finds a matching asset row by audience -> image_url / exit_url
-      - returns rows shaped like the Toyota-style feed:
-          { "Unique_ID", "Headline", "Image_URL", "Exit_URL" }
+    Row IDs are deterministic: a uuid5 of the row's identity, i.e. the media
+    row's placement (its "Placement ID", or its targeting fields -- audience,
+    size, placement, platform, geo, trigger -- when it has none), the audience, and which strategy / asset rows it joined to.
+    Editing copy, URLs or flight dates keeps the ID, so regenerations can be
+    diffed (see diff_dco_feed); repeated identities get an occurrence suffix.
     """
 
-    # Build simple lookup tables keyed by normalised audience name
-    strategy_by_audience: Dict[str, Dict[str, Any]] = {}
-    for s in audience_strategy:
-        audience = s.get("audience") or s.get("Audience") or s.get("target_audience")
-        if not isinstance(audience, str):
-            continue
-        strategy_by_audience[_normalise_key(audience)] = s
-
-    assets_by_audience: Dict[str, Dict[str, Any]] = {}
-    for a in asset_list:
-        audience = a.get("audience") or a.get("Audience") or a.get("target_audience")
-        if not isinstance(audience, str):
-            continue
-        assets_by_audience[_normalise_key(audience)] = a
-
-    feed: List[AssetFeedRow] = []
-
-    for idx, row in enumerate(media_plan_rows):
-        # Try a couple of common audience column names
-        audience = (
-            row.get("Target Audience")
-            or row.get("Audience")
-            or row.get("audience")
-            or row.get("Segment")
-            or row.get("segment")
-        )
+    def __init__(
+        self,
+        audience_strategy: Iterable[Dict[str, Any]],
+        asset_list: Iterable[Dict[str, Any]],
+        schema: FeedSchema | None = None,
+    ) -> None:
+        self.schema = schema = schema or FeedSchema()
+        self.rows_emitted = 0
+        self._occurrences: Dict[str, int] = {}
 
-        norm_aud = _normalise_key(audience) if isinstance(audience, str) else ""
+        # Composite-key hash indexes over the strategy / asset rows' canonical
+        # values (see app.feed_schema and app.feed_join), built once.
+        self._strategy_join = JoinIndex(schema.strategy.extract_all(audience_strategy), schema.strategy.fields)
+        self._asset_join = JoinIndex(schema.assets.extract_all(asset_list), schema.assets.fields)
+        self._no_strategy = (JoinMatch((None,) * len(schema.strategy.fields), 1.0, ""),)
+        self._no_asset = (JoinMatch((None,) * len(schema.assets.fields), 1.0, ""),)
 
-        strategy = strategy_by_audience.get(norm_aud, {})
-        asset = assets_by_audience.get(norm_aud, {})
+    def rows(self, media_plan_rows: Iterable[Dict[str, Any]]) -> Iterator[AssetFeedRow]:
+        for fields in self.fields(media_plan_rows):
+            yield AssetFeedRow(**fields)
 
-        headline = (
-            strategy.get("headline")
-            or strategy.get("Headline")
-            or strategy.get("message")
-            or strategy.get("Message")
-            or ""
-        )
+    def _row_id(self, placement_key: str, audience_key: str, strategy_key: str, asset_key: str) -> str:
+        identity = "\x1e".join((placement_key, audience_key, strategy_key, asset_key))
+        seen = self._occurrences.get(identity, 0)
+        self._occurrences[identity] = seen + 1
+        if seen:
+            identity = f"{identity}\x1e{seen}"
+        # uuid5(FEED_ROW_NAMESPACE, identity), minus the UUID object overhead.
+        digest = _NAMESPACE_SHA1.copy()
+        digest.update(identity.encode("utf-8"))
+        raw = bytearray(digest.digest()[:16])
+        raw[6] = (raw[6] & 0x0F) | 0x50
+        raw[8] = (raw[8] & 0x3F) | 0x80
+        h = raw.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
 
-        image_url = (
-            asset.get("image_url")
-            or asset.get("Image_URL")
-            or asset.get("asset_url")
-            or asset.get("Asset_URL")
-            or ""
-        )
+    def fields(self, media_plan_rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        AssetFeedRow field values per media row, as plain dicts (no model
+        validation), for callers that only need to compare or re-encode.
+        """
+        strategy_join = self._strategy_join
+        asset_join = self._asset_join
 
-        exit_url = (
-            asset.get("exit_url")
-            or asset.get("Exit_URL")
-            or asset.get("click_url")
-            or asset.get("Click_URL")
-            or ""
-        )
+        for values in self.schema.media_plan.extract_all(media_plan_rows):
+            (
+                audience,
+                dimension,
+                fmt,
+                placement,
+                platform,
+                row_asset_type,
+                geo,
+                trigger,
+                start_date,
+                end_date,
+                utm,
+                placement_id,
+            ) = values
+
+            norm_aud = normalise_value(audience) if isinstance(audience, str) else ""
+            # In JOIN_FIELDS order: audience, geo, trigger, platform, size.
+            join_key = (
+                norm_aud,
+                normalise_value(geo),
+                normalise_value(trigger),
+                normalise_value(platform),
+                normalise_value(dimension),
+            )
+            strategy_matches = strategy_join.lookup(join_key) or self._no_strategy
+            asset_matches = asset_join.lookup(join_key) or self._no_asset
+            rotation = len(strategy_matches) * len(asset_matches) > 1
+
+            if placement_id not in (None, ""):
+                placement_key = str(placement_id)
+            else:
+                # Targeting fields only: flight dates and UTM tags change
+                # between plan revisions without making it a different line.
+                targeting = (audience, dimension, placement, platform, geo, trigger)
+                placement_key = "\x1f".join("" if v is None else str(v) for v in targeting)
+
+            for strategy in strategy_matches:
+                for asset in asset_matches:
+                    idx = self.rows_emitted
+                    self.rows_emitted += 1
+                    weight = strategy.weight * asset.weight if rotation else None
+                    yield self._row_fields(idx, values, placement_key, norm_aud, strategy, asset, weight)
+
+    def _row_fields(
+        self,
+        idx: int,
+        values: Tuple[Any, ...],
+        placement_key: str,
+        norm_aud: str,
+        strategy: JoinMatch,
+        asset: JoinMatch,
+        rotation_weight: float | None,
+    ) -> Dict[str, Any]:
+        (
+            audience,
+            dimension,
+            fmt,
+            placement,
+            platform,
+            row_asset_type,
+            geo,
+            trigger,
+            start_date,
+            end_date,
+            utm,
+            _,
+        ) = values
+        (
+            strategy_audience,
+            headline,
+            concept_slug,
+            subhead,
+            cta_copy,
+            cta_label,
+            legal_disclaimer,
+            *_,
+        ) = strategy.values
+        _, image_url, exit_url, asset_asset_type, *_ = asset.values
+
+        headline = headline or ""
+        image_url = image_url or ""
+        exit_url = exit_url or ""
 
         # Identity & taxonomy
-        row_id = str(uuid4())
+        row_id = self._row_id(placement_key, norm_aud, strategy.key, asset.key)
 
         # Simple creative taxonomy slug
-        base_concept = (strategy.get("concept_slug") or strategy.get("audience") or audience or "Concept").replace(
+        base_concept = (concept_slug or strategy_audience or audience or "Concept").replace(
             " ", ""
         )
         msg_slug = (headline or "Message").replace(" ", "")
-        dimension = row.get("Size") or row.get("Dimension") or ""
-        fmt = row.get("Format") or "DC"
+        dimension = dimension or ""
+        fmt = fmt or "DC"
         creative_filename = f"{base_concept}_{msg_slug}_{dimension or 'NA'}_{fmt}_v1"
 
         reporting_label = f"Audience: {audience or 'N/A'} | Msg: {headline or 'N/A'}"
@@ -110,63 +180,143 @@ def generate_dco_feed(
         asset_slot_c_path = ""
 
         copy_slot_a_text = headline or ""
-        copy_slot_b_text = strategy.get("subhead") or ""
-        copy_slot_c_text = strategy.get("cta_copy") or ""
+        copy_slot_b_text = subhead or ""
+        copy_slot_c_text = cta_copy or ""
 
         # Style defaults (can be overridden later)
-        cta_button_text = strategy.get("cta_label") or "Learn More"
+        cta_button_text = cta_label or "Learn More"
         font_color_hex = "#FFFFFF"
         cta_bg_color_hex = "#14b8a6"
         background_color_hex = "#020617"
 
         # Technical specs – best-effort from media row
-        platform_id = row.get("Platform") or "META"
-        placement_dimension = dimension or row.get("Placement") or ""
+        platform_id = platform or "META"
+        placement_dimension = dimension or placement or ""
         asset_format_type = (
-            row.get("Asset_Type")
-            or asset.get("asset_type")
+            row_asset_type
+            or asset_asset_type
             or ("VIDEO" if "video" in (fmt or "").lower() else "STATIC")
         )
 
         # Targeting
         audience_id = audience if isinstance(audience, str) else None
-        geo_targeting = row.get("Geo") or ""
-        trigger_condition = row.get("Trigger") or ""
+        geo_targeting = geo or ""
+        trigger_condition = trigger or ""
 
         destination_url = exit_url or ""
-        utm_suffix = row.get("UTM") or ""
-
-        feed.append(
-            AssetFeedRow(
-                row_id=row_id,
-                creative_filename=creative_filename,
-                reporting_label=reporting_label,
-                is_default=(idx == 0),
-                asset_slot_a_path=asset_slot_a_path,
-                asset_slot_b_path=asset_slot_b_path,
-                asset_slot_c_path=asset_slot_c_path,
-                logo_asset_path=None,
-                copy_slot_a_text=copy_slot_a_text,
-                copy_slot_b_text=copy_slot_b_text,
-                copy_slot_c_text=copy_slot_c_text,
-                legal_disclaimer_text=strategy.get("legal_disclaimer") or "",
-                cta_button_text=cta_button_text,
-                font_color_hex=font_color_hex,
-                cta_bg_color_hex=cta_bg_color_hex,
-                background_color_hex=background_color_hex,
-                platform_id=str(platform_id),
-                placement_dimension=str(placement_dimension),
-                asset_format_type=str(asset_format_type),
-                audience_id=audience_id,
-                geo_targeting=str(geo_targeting),
-                date_start=str(row.get("Start_Date") or ""),
-                date_end=str(row.get("End_Date") or ""),
-                trigger_condition=str(trigger_condition),
-                destination_url=str(destination_url),
-                utm_suffix=str(utm_suffix),
-            )
+        utm_suffix = utm or ""
+
+        return dict(
+            row_id=row_id,
+            creative_filename=creative_filename,
+            reporting_label=reporting_label,
+            is_default=(idx == 0),
+            asset_slot_a_path=asset_slot_a_path,
+            asset_slot_b_path=asset_slot_b_path,
+            asset_slot_c_path=asset_slot_c_path,
+            logo_asset_path=None,
+            copy_slot_a_text=copy_slot_a_text,
+            copy_slot_b_text=copy_slot_b_text,
+            copy_slot_c_text=copy_slot_c_text,
+            legal_disclaimer_text=legal_disclaimer or "",
+            cta_button_text=cta_button_text,
+            font_color_hex=font_color_hex,
+            cta_bg_color_hex=cta_bg_color_hex,
+            background_color_hex=background_color_hex,
+            platform_id=str(platform_id),
+            placement_dimension=str(placement_dimension),
+            asset_format_type=str(asset_format_type),
+            audience_id=audience_id,
+            geo_targeting=str(geo_targeting),
+            date_start=str(start_date or ""),
+            date_end=str(end_date or ""),
+            trigger_condition=str(trigger_condition),
+            destination_url=str(destination_url),
+            utm_suffix=str(utm_suffix),
+            rotation_weight=None if rotation_weight is None else round(rotation_weight, 6),
         )
 
-    return feed
 
+def iter_dco_feed(
+    audience_strategy: Iterable[Dict[str, Any]],
+    asset_list: Iterable[Dict[str, Any]],
+    media_plan_rows: Iterable[Dict[str, Any]],
+    schema: FeedSchema | None = None,
+) -> Iterator[AssetFeedRow]:
+    """
+    Generator mode of generate_dco_feed: yields feed rows as the media plan
+    is consumed, so memory stays flat however long the plan is.
+    """
+    return DcoFeedBuilder(audience_strategy, asset_list, schema).rows(media_plan_rows)
+
+
+def generate_dco_feed(
+    audience_strategy: List[Dict[str, Any]],
+    asset_list: List[Dict[str, Any]],
+    media_plan_rows: List[Dict[str, Any]],
+    schema: FeedSchema | None = None,
+) -> List[AssetFeedRow]:
+    """
+    Generate a simple DCO feed that connects strategy + concepts + media.
+
+    This deliberately stays schema-light so we can evolve the upstream data
+    structures (AudienceStrategy, AssetList, MediaPlanRows) without having to
+    constantly rework the core loop.
+
+    Expected (but not strictly required) shapes:
+      - audience_strategy: [{ "audience": "Prospects", "headline": "..." }, ...]
+      - asset_list:       [{ "audience": "Prospects", "image_url": "...", "exit_url": "..." }, ...]
+      - media_plan_rows:  [{ "Placement ID": "123", "Target Audience": "Prospects", ... }, ...]
+
+    The function:
+      - walks each media row
+      - finds a matching strategy row by audience -> headline
+      - finds a matching asset row by audience -> image_url / exit_url
+      - returns rows shaped like the Toyota-style feed:
+          { "Unique_ID", "Headline", "Image_URL", "Exit_URL" }
+
+    Column names are resolved through `schema` (a FeedSchema, built with the
+    default alias tables when omitted): each input's key set is compiled to
+    a direct accessor once, so the per-row work is fixed-index lookups. Pass
+    your own FeedSchema to add aliases or to read `unmapped_columns()`
+    afterwards.
+    """
+
+    return list(iter_dco_feed(audience_strategy, asset_list, media_plan_rows, schema))
+
+
+def diff_dco_feed(
+    previous_feed: Iterable[AssetFeedRow | Dict[str, Any]],
+    audience_strategy: List[Dict[str, Any]],
+    asset_list: List[Dict[str, Any]],
+    media_plan_rows: Iterable[Dict[str, Any]],
+    schema: FeedSchema | None = None,
+) -> FeedDelta:
+    """
+    Incremental regeneration against a previous feed version.
+
+    Rows are matched on their deterministic row_id. Only rows that are new
+    or whose field values differ from the previous version are built as
+    AssetFeedRows; unchanged rows are just counted, and previous row_ids no
+    longer produced are returned as removed.
+    """
+    previous: Dict[str, Dict[str, Any]] = {}
+    for row in previous_feed:
+        data = row.model_dump() if isinstance(row, AssetFeedRow) else row
+        previous[str(data.get("row_id"))] = data
 
+    delta = FeedDelta()
+    seen: Dict[str, None] = {}
+    builder = DcoFeedBuilder(audience_strategy, asset_list, schema)
+    for fields in builder.fields(media_plan_rows):
+        row_id = fields["row_id"]
+        seen[row_id] = None
+        old = previous.get(row_id)
+        if old is None:
+            delta.added.append(AssetFeedRow(**fields))
+        elif any(old.get(key) != value for key, value in fields.items()):
+            delta.changed.append(AssetFeedRow(**fields))
+        else:
+            delta.unchanged += 1
+    delta.removed = [row_id for row_id in previous if row_id not in seen]
+    return delta
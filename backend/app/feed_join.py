@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+"""
+Composite-key join between media plan rows and strategy / asset rows.
+
+Strategy and asset rows may be keyed on any subset of the join fields
+(audience, geo, trigger, platform, size). Each row is indexed once, in a
+hash index for the exact set of fields it specifies (blank, "*", "all" and
+"default" count as unspecified), so the indexes form a fallback hierarchy
+such as
+
+    (audience, geo, trigger) -> (audience, geo) -> (audience) -> default
+
+A media row is looked up level by level, most specific first, and joins to
+every row at the first level that has a hit. Several rows under the same
+key become rotation variants, weighted by their `weight` column
+(default 1). A cell listing several values ("US, CA") is indexed under each.
+Results are memoised per distinct media key, so the join is linear in the
+size of the output.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+
+# Join fields, most significant first (also the tie-break between levels
+# that specify the same number of fields).
+JOIN_FIELDS = ("audience", "geo", "trigger", "platform", "size")
+
+_WILDCARDS = {"", "*", "all", "any", "default"}
+_MULTI_VALUE_RE = re.compile(r"\s*[,;|]\s*")
+
+
+def normalise_value(value: Any) -> str:
+    """Join-key form of a cell: lowercase, whitespace collapsed to '_'."""
+    if value is None:
+        return ""
+    return "_".join(str(value).strip().lower().split())
+
+
+def cell_keys(value: Any) -> List[str]:
+    """Normalised values of one cell; [] when it is a wildcard / blank."""
+    if value is None:
+        return []
+    keys = [normalise_value(part) for part in _MULTI_VALUE_RE.split(str(value))]
+    keys = [key for key in keys if key not in _WILDCARDS]
+    return list(dict.fromkeys(keys))
+
+
+def _weight(value: Any) -> float:
+    if value in (None, ""):
+        return 1.0
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+@dataclass(frozen=True)
+class JoinMatch:
+    """One joined row: its canonical values, rotation weight and stable key."""
+
+    values: Tuple[Any, ...]
+    weight: float
+    key: str
+
+
+class JoinIndex:
+    """
+    Hash indexes over canonical value tuples (as produced by a
+    ColumnResolver), one per distinct set of specified join fields.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Tuple[Any, ...]],
+        fields: Sequence[str],
+        levels: Sequence[Sequence[str]] | None = None,
+    ) -> None:
+        positions = {field: i for i, field in enumerate(fields)}
+        self._join_positions = [(field, positions[field]) for field in JOIN_FIELDS if field in positions]
+        weight_pos = positions.get("weight")
+
+        groups: Dict[Tuple[str, ...], Dict[Tuple[str, ...], List[Tuple[Tuple[Any, ...], float]]]] = {}
+        for values in rows:
+            cells = [(field, cell_keys(values[pos])) for field, pos in self._join_positions]
+            level = tuple(field for field, keys in cells if keys)
+            weight = _weight(values[weight_pos]) if weight_pos is not None else 1.0
+            index = groups.setdefault(level, {})
+            for key in self._expand([keys for _, keys in cells if keys]):
+                index.setdefault(key, []).append((values, weight))
+
+        if levels is None:
+            rank = {field: i for i, field in enumerate(JOIN_FIELDS)}
+            ordered = sorted(groups, key=lambda level: (-len(level), [rank[f] for f in level]))
+        else:
+            ordered = [tuple(level) for level in levels if tuple(level) in groups]
+        self.levels: Tuple[Tuple[str, ...], ...] = tuple(ordered)
+
+        # (positions of the level's fields in JOIN_FIELDS, index), most specific first.
+        self._lookups: List[Tuple[Tuple[int, ...], Dict[Tuple[str, ...], Tuple[JoinMatch, ...]]]] = []
+        for level in self.levels:
+            name = "+".join(level) or "default"
+            index: Dict[Tuple[str, ...], Tuple[JoinMatch, ...]] = {}
+            for key, members in groups[level].items():
+                total = sum(weight for _, weight in members)
+                index[key] = tuple(
+                    JoinMatch(
+                        values=values,
+                        weight=(weight / total) if total else 1.0 / len(members),
+                        key=f"{name}={'/'.join(key)}#{n}",
+                    )
+                    for n, (values, weight) in enumerate(members)
+                )
+            self._lookups.append((tuple(JOIN_FIELDS.index(f) for f in level), index))
+        self._cache: Dict[Tuple[str, ...], Tuple[JoinMatch, ...]] = {}
+
+    @staticmethod
+    def _expand(parts: List[List[str]]) -> List[Tuple[str, ...]]:
+        keys: List[Tuple[str, ...]] = [()]
+        for options in parts:
+            keys = [key + (option,) for key in keys for option in options]
+        return keys
+
+    def lookup(self, probe: Tuple[str, ...]) -> Tuple[JoinMatch, ...]:
+        """
+        Matches for a media row given its normalised join values, one per
+        JOIN_FIELDS entry ("" when blank); empty when no level (not even
+        default) matches.
+        """
+        cached = self._cache.get(probe)
+        if cached is not None:
+            return cached
+        result: Tuple[JoinMatch, ...] = ()
+        for positions, index in self._lookups:
+            hit = index.get(tuple(probe[i] for i in positions))
+            if hit:
+                result = hit
+                break
+        self._cache[probe] = result
+        return result
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+"""
+Column-alias resolution for the DCO feed inputs.
+
+Media plans, audience strategies and asset lists arrive with whatever
+column names the upstream spreadsheet used ("Target Audience", "Segment",
+"Image_URL", ...). Rather than probing every alias on every row, a
+ColumnResolver looks at a row's key set once, compiles a ColumnMapping from
+canonical field -> the columns that supply it (in alias priority order),
+and reuses that mapping for every row with the same keys. Per row, the work
+is two itemgetter calls (read the mapped columns, then arrange them in field
+order) plus a fallback pass for the rare field several columns supply.
+
+Aliases match exactly first and then by normalised name (case, spacing and
+punctuation folded), so "target audience" and "TARGET-AUDIENCE" resolve like
+"Target Audience". Columns no canonical field claims are reported as
+unmapped.
+"""
+
+import re
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+
+AliasTable = Mapping[str, Sequence[str]]
+
+# Canonical field -> accepted column names, highest priority first.
+MEDIA_PLAN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "audience": ("Target Audience", "Audience", "audience", "Segment", "segment"),
+    "dimension": ("Size", "Dimension"),
+    "format": ("Format",),
+    "placement": ("Placement",),
+    "platform": ("Platform",),
+    "asset_type": ("Asset_Type",),
+    "geo": ("Geo",),
+    "trigger": ("Trigger",),
+    "start_date": ("Start_Date",),
+    "end_date": ("End_Date",),
+    "utm": ("UTM",),
+    "placement_id": ("Placement ID",),
+}
+
+STRATEGY_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "audience": ("audience", "Audience", "target_audience"),
+    "headline": ("headline", "Headline", "message", "Message"),
+    "concept_slug": ("concept_slug",),
+    "subhead": ("subhead",),
+    "cta_copy": ("cta_copy",),
+    "cta_label": ("cta_label",),
+    "legal_disclaimer": ("legal_disclaimer",),
+    # Optional join keys / rotation weight (see app.feed_join).
+    "geo": ("geo", "Geo"),
+    "trigger": ("trigger", "Trigger"),
+    "platform": ("platform", "Platform"),
+    "size": ("size", "Size", "dimension", "Dimension"),
+    "weight": ("weight", "Weight", "rotation_weight"),
+}
+
+ASSET_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "audience": ("audience", "Audience", "target_audience"),
+    "image_url": ("image_url", "Image_URL", "asset_url", "Asset_URL"),
+    "exit_url": ("exit_url", "Exit_URL", "click_url", "Click_URL"),
+    "asset_type": ("asset_type",),
+    "geo": ("geo", "Geo"),
+    "trigger": ("trigger", "Trigger"),
+    "platform": ("platform", "Platform"),
+    "size": ("size", "Size", "dimension", "Dimension"),
+    "weight": ("weight", "Weight", "rotation_weight"),
+}
+
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def normalise_column(name: str) -> str:
+    """'Target Audience' / 'target-audience' / ' TARGET_AUDIENCE ' -> 'target_audience'."""
+    return _NON_ALNUM_RE.sub("_", str(name).strip().lower()).strip("_")
+
+
+def merge_aliases(base: AliasTable, extra: AliasTable | None) -> Dict[str, Tuple[str, ...]]:
+    """
+    Alias table with `extra` layered on top; extra aliases take priority
+    over the base ones. Raises ValueError for fields `base` does not define.
+    """
+    merged = {field: tuple(aliases) for field, aliases in base.items()}
+    for field, aliases in (extra or {}).items():
+        if field not in merged:
+            raise ValueError(f"Unknown column field '{field}' (expected one of: {', '.join(merged)})")
+        seen: Dict[str, None] = {}
+        for alias in (*aliases, *merged.get(field, ())):
+            seen.setdefault(alias, None)
+        merged[field] = tuple(seen)
+    return merged
+
+
+def _tuple_getter(items: Tuple[Any, ...]) -> Callable[[Any], Tuple[Any, ...]]:
+    """itemgetter that always returns a tuple, whatever len(items) is."""
+    if not items:
+        return lambda obj: ()
+    if len(items) == 1:
+        item = items[0]
+        return lambda obj: (obj[item],)
+    return itemgetter(*items)
+
+
+class ColumnMapping:
+    """
+    Compiled accessor for one input schema (one ordered key set).
+
+    `extract(row)` returns the canonical fields' values as a tuple in
+    `fields` order. Like an `a or b or c` chain, a field with several source
+    columns yields the first truthy value (or the last value if none is
+    truthy); a field with no source column yields None.
+    """
+
+    def __init__(self, columns: Sequence[str], aliases: AliasTable) -> None:
+        self.columns = tuple(columns)
+        self.fields = tuple(aliases)
+
+        by_norm: Dict[str, List[str]] = {}
+        for column in self.columns:
+            by_norm.setdefault(normalise_column(column), []).append(column)
+        present = set(self.columns)
+
+        self.sources: Dict[str, Tuple[str, ...]] = {}
+        for field, field_aliases in aliases.items():
+            found: Dict[str, None] = {}
+            for alias in field_aliases:
+                if alias in present:
+                    found.setdefault(alias, None)
+            for alias in field_aliases:
+                for column in by_norm.get(normalise_column(alias), ()):
+                    found.setdefault(column, None)
+            self.sources[field] = tuple(found)
+
+        used: Dict[str, int] = {}
+        for field in self.fields:
+            if self.sources[field]:
+                used.setdefault(self.sources[field][0], len(used))
+        for field in self.fields:
+            for column in self.sources[field][1:]:
+                used.setdefault(column, len(used))
+        self.unmapped = [column for column in self.columns if column not in used]
+
+        # One itemgetter reads every mapped column; a second one, over those
+        # values plus a trailing None, puts them in field order (absent
+        # fields point at the None). Both run in C.
+        self._getter = _tuple_getter(tuple(used))
+        layout = tuple(used[self.sources[f][0]] if self.sources[f] else len(used) for f in self.fields)
+        self._arrange = None if layout == tuple(range(len(used))) else _tuple_getter(layout)
+        self._fallbacks = tuple(
+            (i, tuple(used[c] for c in self.sources[field][1:]))
+            for i, field in enumerate(self.fields)
+            if len(self.sources[field]) > 1
+        )
+
+    def extract(self, row: Mapping[str, Any]) -> Tuple[Any, ...]:
+        """Canonical values for `row`; raises KeyError if a mapped column is missing."""
+        raw = self._getter(row)
+        values = raw if self._arrange is None else self._arrange(raw + (None,))
+        if not self._fallbacks:
+            return values
+        values = list(values)
+        for i, slots in self._fallbacks:
+            value = values[i]
+            for slot in slots:
+                if value:
+                    break
+                value = raw[slot]
+            values[i] = value
+        return tuple(values)
+
+
+class ColumnResolver:
+    """
+    Compiles and caches a ColumnMapping per distinct row key set.
+
+    Rows from one spreadsheet normally share a single schema, so this is
+    one compile per input; `unmapped_columns()` reports every column seen
+    that no canonical field uses.
+    """
+
+    def __init__(self, aliases: AliasTable, extra_aliases: AliasTable | None = None) -> None:
+        self.aliases = merge_aliases(aliases, extra_aliases)
+        self.fields = tuple(self.aliases)
+        self._mappings: Dict[Tuple[str, ...], ColumnMapping] = {}
+        self._last: Tuple[Tuple[str, ...], ColumnMapping] | None = None
+
+    def mapping(self, row: Mapping[str, Any]) -> ColumnMapping:
+        keys = tuple(row)
+        last = self._last
+        if last is not None and last[0] == keys:
+            return last[1]
+        mapping = self._mappings.get(keys)
+        if mapping is None:
+            mapping = self._mappings[keys] = ColumnMapping(keys, self.aliases)
+        self._last = (keys, mapping)
+        return mapping
+
+    def extract(self, row: Mapping[str, Any]) -> Tuple[Any, ...]:
+        return self.mapping(row).extract(row)
+
+    def extract_all(self, rows: Iterable[Mapping[str, Any]]) -> Iterator[Tuple[Any, ...]]:
+        """
+        Canonical values for each row. A row is read with the previous row's
+        mapping only when its key tuple is the same (the normal case for one
+        spreadsheet); JSON rows that leave out empty keys get the mapping
+        for their own key set.
+        """
+        mapping: ColumnMapping | None = None
+        keys: Tuple[str, ...] = ()
+        for row in rows:
+            row_keys = tuple(row)
+            if mapping is None or row_keys != keys:
+                mapping = self.mapping(row)
+                keys = row_keys
+            yield mapping.extract(row)
+
+    def unmapped_columns(self) -> List[str]:
+        seen: Dict[str, None] = {}
+        for mapping in self._mappings.values():
+            for column in mapping.unmapped:
+                seen.setdefault(column, None)
+        return list(seen)
+
+
+class FeedSchema:
+    """
+    Resolvers for the three generate_dco_feed inputs, with optional extra
+    aliases per input (keyed "media_plan_rows", "audience_strategy",
+    "asset_list").
+    """
+
+    def __init__(self, extra_aliases: Mapping[str, AliasTable] | None = None) -> None:
+        extra = extra_aliases or {}
+        unknown = set(extra) - {"media_plan_rows", "audience_strategy", "asset_list"}
+        if unknown:
+            raise ValueError(f"Unknown feed input(s) for column aliases: {', '.join(sorted(unknown))}")
+        self.media_plan = ColumnResolver(MEDIA_PLAN_ALIASES, extra.get("media_plan_rows"))
+        self.strategy = ColumnResolver(STRATEGY_ALIASES, extra.get("audience_strategy"))
+        self.assets = ColumnResolver(ASSET_ALIASES, extra.get("asset_list"))
+
+    def unmapped_columns(self) -> Dict[str, List[str]]:
+        """Unmapped columns per input, omitting inputs where everything mapped."""
+        report = {
+            "media_plan_rows": self.media_plan.unmapped_columns(),
+            "audience_strategy": self.strategy.unmapped_columns(),
+            "asset_list": self.assets.unmapped_columns(),
+        }
+        return {name: columns for name, columns in report.items() if columns}
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+"""
+Offline decisioning simulator for DCO feeds.
+
+Given a feed (AssetFeedRows) and an impression log (CSV / Parquet with
+audience, geo, timestamp, trigger, placement and optionally platform
+columns), work out which feed row would serve each impression and report
+serve counts, the default-fallback rate and rows that never serve.
+
+Decision rule per impression:
+  - a row is eligible when every targeting field it sets (audience_id,
+    geo_targeting, trigger_condition, placement_dimension, platform_id when
+    the log has a platform column) matches, and the timestamp falls inside
+    its date_start / date_end window (date-only ends are inclusive);
+  - among eligible non-default rows the most specific wins (one point per
+    constrained audience / geo / trigger / date window); ties rotate by
+    rotation_weight (equal weights when unset);
+  - an is_default row competes like any other row on its own targeting;
+    in addition, where no row is eligible, eligible is_default rows serve
+    the impression as a fallback (placement, platform and dates still
+    apply). Only those fallback serves count as default-served;
+  - rows whose date_start / date_end is not an ISO date never serve and are
+    listed in invalid_windows (blank dates are open-ended).
+
+Impressions are never evaluated one by one. Every impression reduces to a
+cell: its (audience, geo, trigger, placement, platform) combination times a
+time segment between consecutive flight boundaries, and the winners are
+decided per cell with boolean masks over the distinct combinations. A
+weighted pick per impression is then one searchsorted over the candidates'
+cumulative weights, so tens of millions of impressions take seconds.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.feed_join import cell_keys, normalise_value
+from app.schemas.feed import AssetFeedRow
+
+
+LOG_FIELDS = ("audience", "geo", "trigger", "placement", "platform")
+
+# Feed row attribute each log field is matched against.
+_ROW_FIELDS = {
+    "audience": "audience_id",
+    "geo": "geo_targeting",
+    "trigger": "trigger_condition",
+    "placement": "placement_dimension",
+    "platform": "platform_id",
+}
+
+# Fields that count towards a row's specificity (placement and platform
+# only pick the slot, they do not make a row more targeted).
+_SPECIFIC_FIELDS = ("audience", "geo", "trigger")
+
+_MIN_TS = np.iinfo(np.int64).min
+_MAX_TS = np.iinfo(np.int64).max
+
+
+@dataclass
+class ImpressionLog:
+    """
+    Columnar impression log: per field, integer codes into a vocabulary of
+    raw values, plus epoch-second timestamps. A field absent from the
+    source log has vocabulary [""] and all-zero codes.
+    """
+
+    timestamps: np.ndarray
+    codes: Dict[str, np.ndarray]
+    vocab: Dict[str, List[str]]
+    has_platform: bool = False
+
+    def __len__(self) -> int:
+        return int(self.timestamps.shape[0])
+
+
+@dataclass
+class SimulationReport:
+    impressions: int
+    served: int
+    unserved: int
+    default_served: int
+    serve_counts: Dict[str, int]
+    never_served: List[str]
+    # Rows left out because a flight date is not an ISO date.
+    invalid_windows: List[str] = field(default_factory=list)
+    # Winning feed row index per impression (-1 when nothing serves).
+    winners: np.ndarray = field(repr=False, default_factory=lambda: np.empty(0, dtype=np.int64))
+
+    @property
+    def default_fallback_rate(self) -> float:
+        return self.default_served / self.impressions if self.impressions else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "impressions": self.impressions,
+            "served": self.served,
+            "unserved": self.unserved,
+            "default_served": self.default_served,
+            "default_fallback_rate": round(self.default_fallback_rate, 6),
+            "serve_counts": self.serve_counts,
+            "never_served": self.never_served,
+            "invalid_windows": self.invalid_windows,
+        }
+
+
+def _parse_bound(value: str | None, end: bool) -> int:
+    """
+    Epoch seconds for a date / datetime string; open bound when blank.
+    Raises ValueError when it does not parse (e.g. 01/25/2024).
+    """
+    text = (value or "").strip()
+    if not text:
+        return _MAX_TS if end else _MIN_TS
+    ts = np.datetime64(text.replace(" ", "T").rstrip("Z"), "s").astype(np.int64)
+    if end:
+        # Exclusive upper bound; a bare date covers the whole day.
+        return int(ts) + (86400 if len(text) <= 10 else 1)
+    return int(ts)
+
+
+def _row_attr(row: AssetFeedRow | Dict[str, Any], name: str) -> Any:
+    return row.get(name) if isinstance(row, dict) else getattr(row, name)
+
+
+def _flight_bounds(feed: Sequence[AssetFeedRow | Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(starts, exclusive ends, invalid mask) per row; invalid rows get an empty window."""
+    n_rows = len(feed)
+    starts = np.full(n_rows, _MIN_TS, dtype=np.int64)
+    ends = np.full(n_rows, _MAX_TS, dtype=np.int64)
+    invalid = np.zeros(n_rows, dtype=bool)
+    for r, row in enumerate(feed):
+        try:
+            starts[r] = _parse_bound(_row_attr(row, "date_start"), end=False)
+            ends[r] = _parse_bound(_row_attr(row, "date_end"), end=True)
+        except ValueError:
+            invalid[r] = True
+    starts[invalid] = _MIN_TS
+    ends[invalid] = _MAX_TS
+    return starts, ends, invalid
+
+
+def read_impressions(path: str) -> ImpressionLog:
+    """Load a CSV or Parquet impression log (needs pyarrow)."""
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+        table = pq.read_table(path)
+    else:
+        table = pa_csv.read_csv(path)
+    return impressions_from_arrow(table)
+
+
+def impressions_from_arrow(table: Any) -> ImpressionLog:
+    """Build an ImpressionLog from a pyarrow Table (columns matched case-insensitively)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = {normalise_value(name): name for name in table.column_names}
+    n = table.num_rows
+    codes: Dict[str, np.ndarray] = {}
+    vocab: Dict[str, List[str]] = {}
+    for name in LOG_FIELDS:
+        source = columns.get(name)
+        if source is None:
+            codes[name] = np.zeros(n, dtype=np.int32)
+            vocab[name] = [""]
+            continue
+        column = pc.fill_null(pc.cast(table.column(source), pa.string()), "")
+        encoded = column.combine_chunks().dictionary_encode()
+        codes[name] = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int32, copy=False)
+        vocab[name] = encoded.dictionary.to_pylist()
+
+    source = columns.get("timestamp") or columns.get("ts") or columns.get("time")
+    if source is None:
+        raise ValueError("Impression log needs a timestamp column")
+    ts_column = table.column(source)
+    if pa.types.is_integer(ts_column.type):
+        timestamps = ts_column.to_numpy().astype(np.int64)
+    else:
+        if pa.types.is_string(ts_column.type) or pa.types.is_large_string(ts_column.type):
+            # Parse at full precision so fractional seconds are accepted.
+            ts_column = pc.cast(ts_column, pa.timestamp("ns"))
+        # Decisioning works in whole seconds; drop any sub-second part.
+        timestamps = pc.cast(ts_column, pa.timestamp("s"), safe=False).cast(pa.int64()).to_numpy()
+    return ImpressionLog(timestamps=timestamps, codes=codes, vocab=vocab, has_platform="platform" in columns)
+
+
+def synthetic_impressions(
+    feed: Sequence[AssetFeedRow | Dict[str, Any]],
+    n: int,
+    seed: int = 0,
+    miss_rate: float = 0.1,
+) -> ImpressionLog:
+    """
+    Random impressions drawn from the values the feed targets (plus an
+    'other' value per field, picked `miss_rate` of the time), spread
+    uniformly over the feed's flight window (30 days when unbounded).
+    """
+    rng = np.random.default_rng(seed)
+    codes: Dict[str, np.ndarray] = {}
+    vocab: Dict[str, List[str]] = {}
+    for name in LOG_FIELDS[:-1]:
+        values: Dict[str, None] = {}
+        for row in feed:
+            for part in str(_row_attr(row, _ROW_FIELDS[name]) or "").split(","):
+                if part.strip():
+                    values.setdefault(part.strip(), None)
+        words = list(values) + [f"other_{name}"]
+        vocab[name] = words
+        picks = rng.integers(0, max(1, len(words) - 1), size=n)
+        miss = rng.random(n) < miss_rate
+        picks[miss] = len(words) - 1
+        codes[name] = picks.astype(np.int32)
+    codes["platform"] = np.zeros(n, dtype=np.int32)
+    vocab["platform"] = [""]
+
+    starts, ends, _ = _flight_bounds(feed)
+    lo = min((int(s) for s in starts if s != _MIN_TS), default=None)
+    hi = max((int(e) for e in ends if e != _MAX_TS), default=None)
+    if lo is None and hi is None:
+        lo = 1_700_000_000
+    if lo is None:
+        lo = hi - 30 * 86400
+    if hi is None:
+        hi = lo + 30 * 86400
+    timestamps = rng.integers(lo, max(hi, lo + 1), size=n, dtype=np.int64)
+    return ImpressionLog(timestamps=timestamps, codes=codes, vocab=vocab, has_platform=False)
+
+
+def _combine(log: ImpressionLog) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distinct field-code combinations in the log, as (combo index per
+    impression, combos[k] = the k-th combination's codes per LOG_FIELDS).
+    """
+    sizes = [max(1, len(log.vocab[name])) for name in LOG_FIELDS]
+    key = np.zeros(len(log), dtype=np.int64)
+    for name, size in zip(LOG_FIELDS, sizes):
+        key *= size
+        key += log.codes[name]
+    space = int(np.prod(sizes, dtype=np.float64))
+    if space <= 1 << 24:
+        present = np.flatnonzero(np.bincount(key, minlength=space))
+        lookup = np.full(space, -1, dtype=np.int64)
+        lookup[present] = np.arange(present.size)
+        combo = lookup[key]
+        uniq = present
+    else:
+        uniq, combo = np.unique(key, return_inverse=True)
+    combos = np.empty((uniq.size, len(LOG_FIELDS)), dtype=np.int64)
+    rest = uniq.copy()
+    for j in range(len(LOG_FIELDS) - 1, -1, -1):
+        combos[:, j] = rest % sizes[j]
+        rest //= sizes[j]
+    return combo, combos
+
+
+def simulate_feed(
+    feed: Sequence[AssetFeedRow | Dict[str, Any]],
+    log: ImpressionLog,
+    seed: int = 0,
+) -> SimulationReport:
+    """Decide the winning feed row for every impression in `log`."""
+    n_rows = len(feed)
+    n = len(log)
+    combo, combos = _combine(log)
+    n_combos = combos.shape[0]
+
+    # Time segments: split at every flight boundary in the feed.
+    starts, ends, invalid = _flight_bounds(feed)
+    bounds = np.unique(np.concatenate([starts[starts != _MIN_TS], ends[ends != _MAX_TS]]))
+    seg_lo = np.concatenate([[_MIN_TS], bounds])
+    seg_hi = np.concatenate([bounds, [_MAX_TS]])
+    n_segs = seg_lo.size
+    segment = np.searchsorted(bounds, log.timestamps, side="right")
+    cell = combo * n_segs + segment
+
+    # Normalised vocabularies, so row values compare like the join does.
+    norm_vocab = {name: np.array([normalise_value(v) for v in log.vocab[name]], dtype=object) for name in LOG_FIELDS}
+    active_fields = [name for name in LOG_FIELDS if name != "platform" or log.has_platform]
+
+    is_default = np.zeros(n_rows, dtype=bool)
+    weights = np.ones(n_rows, dtype=np.float64)
+    spec = np.zeros(n_rows, dtype=np.int64)
+    # Cells per row on its own targeting, and for is_default rows the wider
+    # fallback cells (placement / platform / dates only).
+    row_combos: List[np.ndarray] = []
+    fallback_combos: List[np.ndarray] = []
+    row_segs: List[np.ndarray] = []
+    empty = np.empty(0, dtype=np.int64)
+    for r, row in enumerate(feed):
+        is_default[r] = bool(_row_attr(row, "is_default"))
+        slot = np.ones(n_combos, dtype=bool)
+        mask = slot
+        for j, name in enumerate(LOG_FIELDS):
+            if name not in active_fields:
+                continue
+            keys = cell_keys(_row_attr(row, _ROW_FIELDS[name]))
+            if not keys:
+                continue
+            matches = np.isin(norm_vocab[name], keys)[combos[:, j]]
+            if name in _SPECIFIC_FIELDS:
+                spec[r] += 1
+                mask = mask & matches
+            else:
+                slot &= matches
+                mask = mask & matches
+        if starts[r] != _MIN_TS or ends[r] != _MAX_TS:
+            spec[r] += 1
+        row_combos.append(np.flatnonzero(mask))
+        fallback_combos.append(np.flatnonzero(slot) if is_default[r] else empty)
+        if invalid[r]:
+            row_segs.append(empty)
+        else:
+            row_segs.append(np.flatnonzero((seg_lo >= starts[r]) & (seg_hi <= ends[r])))
+        weight = _row_attr(row, "rotation_weight")
+        weights[r] = float(weight) if weight is not None and weight > 0 else 1.0
+
+    def candidates(rows: Iterable[int], combos_of: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(cell, row) pairs for every cell each row is eligible in."""
+        cells: List[np.ndarray] = []
+        owners: List[np.ndarray] = []
+        for r in rows:
+            if combos_of[r].size and row_segs[r].size:
+                c = (combos_of[r][:, None] * n_segs + row_segs[r][None, :]).ravel()
+                cells.append(c)
+                owners.append(np.full(c.size, r, dtype=np.int64))
+        if not cells:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(cells), np.concatenate(owners)
+
+    # Every row on its own targeting: keep only the most specific candidates per cell.
+    cand_cell, cand_row = candidates(range(n_rows), row_combos)
+    covered = np.zeros(n_combos * n_segs, dtype=bool)
+    if cand_cell.size:
+        best = np.full(n_combos * n_segs, -1, dtype=np.int64)
+        np.maximum.at(best, cand_cell, spec[cand_row])
+        top = spec[cand_row] == best[cand_cell]
+        cand_cell, cand_row = cand_cell[top], cand_row[top]
+        covered[cand_cell] = True
+
+    # Default rows fill the cells nothing covers, as fallbacks.
+    def_cell, def_row = candidates(np.flatnonzero(is_default), fallback_combos)
+    open_cells = ~covered[def_cell]
+    cand_fallback = np.r_[np.zeros(cand_cell.size, dtype=bool), np.ones(int(open_cells.sum()), dtype=bool)]
+    cand_cell = np.concatenate([cand_cell, def_cell[open_cells]])
+    cand_row = np.concatenate([cand_row, def_row[open_cells]])
+
+    winners = np.full(n, -1, dtype=np.int64)
+    if cand_cell.size:
+        order = np.lexsort((cand_row, cand_cell))
+        cand_cell, cand_row, cand_fallback = cand_cell[order], cand_row[order], cand_fallback[order]
+        w = weights[cand_row]
+        first = np.flatnonzero(np.r_[True, cand_cell[1:] != cand_cell[:-1]])
+        totals = np.add.reduceat(w, first)
+        cum = np.cumsum(w)
+        cum_before = np.repeat(cum[first] - w[first], np.diff(np.r_[first, cand_cell.size]))
+        share = (cum - cum_before) / np.repeat(totals, np.diff(np.r_[first, cand_cell.size]))
+        # Candidate j of cell c occupies (c + previous share, c + share]; an
+        # impression in cell c with draw u in [0, 1) picks the first
+        # candidate whose upper edge exceeds c + u.
+        edges = cand_cell.astype(np.float64) + share
+        edges[np.r_[first[1:] - 1, cand_cell.size - 1]] = cand_cell[np.r_[first[1:] - 1, cand_cell.size - 1]] + 1.0
+
+        has_cands = np.zeros(n_combos * n_segs, dtype=bool)
+        has_cands[cand_cell] = True
+        served_mask = has_cands[cell]
+        draws = np.random.default_rng(seed).random(int(served_mask.sum()))
+        pos = np.searchsorted(edges, cell[served_mask] + draws, side="right")
+        picked = np.minimum(pos, cand_row.size - 1)
+        winners[served_mask] = cand_row[picked]
+        fallback_served = int(cand_fallback[picked].sum())
+    else:
+        fallback_served = 0
+
+    served = winners >= 0
+    counts = np.bincount(winners[served], minlength=n_rows) if n_rows else np.zeros(0, dtype=np.int64)
+    row_ids = [str(_row_attr(row, "row_id")) for row in feed]
+    return SimulationReport(
+        impressions=n,
+        served=int(served.sum()),
+        unserved=int(n - served.sum()),
+        default_served=fallback_served,
+        serve_counts={row_ids[r]: int(counts[r]) for r in range(n_rows) if counts[r]},
+        never_served=[row_ids[r] for r in range(n_rows) if not counts[r]],
+        invalid_windows=[row_ids[r] for r in np.flatnonzero(invalid)],
+        winners=winners,
+    )
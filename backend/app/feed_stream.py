@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+"""
+Streaming encoders / decoders for the DCO feed.
+
+  - ndjson_lines / csv_lines turn an iterator of AssetFeedRows into text
+    lines one row at a time (CSV columns follow FEED_CSV_COLUMNS, the same
+    order as the frontend's exportFeedCsv).
+  - ndjson_batches splits an incoming byte stream into parsed JSON objects,
+    one batch per network chunk, so a media plan can be consumed while it
+    is still uploading.
+"""
+
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List
+
+from app.schemas.feed import FEED_CSV_COLUMNS, AssetFeedRow
+
+
+FEED_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def ndjson_lines(rows: Iterable[AssetFeedRow]) -> Iterator[str]:
+    for row in rows:
+        yield row.model_dump_json() + "\n"
+
+
+def _csv_cell(value: Any) -> Any:
+    # Same rendering as the frontend export: null -> "", booleans lower-case.
+    if value is None:
+        return ""
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    return value
+
+
+def csv_lines(rows: Iterable[AssetFeedRow], header: bool = True) -> Iterator[str]:
+    """Header line (unless `header` is False), then one quoted CSV line per feed row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    if header:
+        writer.writerow(FEED_CSV_COLUMNS)
+        yield flush()
+    for row in rows:
+        data = row.__dict__
+        writer.writerow([_csv_cell(data[column]) for column in FEED_CSV_COLUMNS])
+        yield flush()
+
+
+def encode_feed(rows: Iterable[AssetFeedRow], fmt: str, header: bool = True) -> Iterator[str]:
+    """Lines for `fmt` ("ndjson" or "csv"); `header` only applies to CSV."""
+    if fmt == "csv":
+        return csv_lines(rows, header=header)
+    return ndjson_lines(rows)
+
+
+def _parse_line(line: bytes, line_no: int) -> Dict[str, Any]:
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"NDJSON line {line_no}: {e}") from None
+    if not isinstance(item, dict):
+        raise ValueError(f"NDJSON line {line_no}: expected a JSON object")
+    return item
+
+
+async def ndjson_batches(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Parse an NDJSON byte stream into lists of objects, one list per chunk
+    that completed at least one line. Blank lines are skipped; a line that
+    is not a JSON object raises ValueError.
+    """
+    pending = b""
+    line_no = 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        pending += chunk
+        cut = pending.rfind(b"\n")
+        if cut < 0:
+            continue
+        complete, pending = pending[: cut + 1], pending[cut + 1 :]
+        batch: List[Dict[str, Any]] = []
+        for line in complete.split(b"\n"):
+            line_no += 1
+            if line.strip():
+                batch.append(_parse_line(line, line_no))
+        # The split leaves an empty piece after the final newline.
+        line_no -= 1
+        if batch:
+            yield batch
+    if pending.strip():
+        yield [_parse_line(pending, line_no + 1)]
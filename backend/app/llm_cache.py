@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+"""
+Content-addressed cache for Gemini replies.
+
+Keys are a SHA-256 of (model, system prompt, normalised chat log), so a retry
+or double-click with the exact same payload is answered without a model call.
+
+Two tiers:
+  - an in-memory LRU (per worker), always on unless max_entries is 0
+  - an optional SQLite file shared by every worker on the host, enabled by
+    setting LLM_CACHE_PATH; async callers use `aget` / `aset`, which run
+    the SQLite reads and writes on a worker thread
+
+Environment knobs:
+  - LLM_CACHE_TTL_SECONDS   entry lifetime for both tiers (default 600)
+  - LLM_CACHE_MAX_ENTRIES   in-memory LRU size (default 256, 0 disables caching)
+  - LLM_CACHE_PATH          SQLite file for the disk tier (default: disabled)
+  - LLM_CACHE_DISK_MAX_MB   disk tier size cap; oldest entries go first (default 64)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+
+BYPASS_HEADER = "X-LLM-Cache"
+
+
+def cache_key(model: str, system_prompt: str, chat_log: List[dict]) -> str:
+    """
+    Hash the parts of a request that determine the reply.
+
+    The chat log is normalised the same way the Gemini payload is built
+    (only user/assistant turns, stringified content) so cosmetic differences
+    in the incoming JSON do not defeat the cache.
+    """
+    turns = [
+        [m.get("role"), str(m.get("content", "") or "").strip()]
+        for m in (chat_log or [])
+        if m and m.get("role") in ("user", "assistant")
+    ]
+    material = json.dumps([model, system_prompt.strip(), turns], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def bypass_requested(header_value: str | None) -> bool:
+    """True when the client sent `X-LLM-Cache: bypass` (or no-cache / off)."""
+    return (header_value or "").strip().lower() in {"bypass", "no-cache", "off", "0"}
+
+
+class _DiskTier:
+    """
+    SQLite-backed tier with TTL and a total-size cap (LRU by last access).
+
+    The connection is shared across threads, so every call holds its own lock.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            return self._get(key, now)
+
+    def _get(self, key: str, now: float) -> str | None:
+        row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        value, created_at = row
+        if now - created_at > self.ttl_seconds:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key: str, value: str, now: float) -> int:
+        """Store an entry and return how many entries were evicted."""
+        with self._lock:
+            return self._set(key, value, now)
+
+    def _set(self, key: str, value: str, now: float) -> int:
+        size = len(value.encode("utf-8"))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+            (key, value, now, now, size),
+        )
+        evicted = self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed_at ASC LIMIT 1"
+            ).fetchone()
+            if not row:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (row[0],))
+            total -= row[1]
+            evicted += 1
+        return evicted
+
+    def count(self) -> Tuple[int, int]:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+
+class LLMResponseCache:
+    """
+    Two-tier (memory LRU + optional SQLite) reply cache with TTL and
+    hit/miss counters.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 600.0,
+        disk_path: str | None = None,
+        disk_max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._disk = _DiskTier(disk_path, ttl_seconds, disk_max_bytes) if disk_path else None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "bypasses": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._disk is not None:
+            value = self._disk_got(key, self._disk.get(key, now), now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    async def aget(self, key: str) -> str | None:
+        """`get` for the event loop: a disk-tier lookup runs on a worker thread."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._disk is not None:
+            value = self._disk_got(key, await asyncio.to_thread(self._disk.get, key, now), now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        self._store(key, value, now)
+        if self._disk is not None:
+            self._count_evictions(self._disk.set(key, value, now))
+
+    async def aset(self, key: str, value: str) -> None:
+        """`set` for the event loop: the disk-tier write runs on a worker thread."""
+        if not self.enabled:
+            return
+        now = time.time()
+        self._store(key, value, now)
+        if self._disk is not None:
+            self._count_evictions(await asyncio.to_thread(self._disk.set, key, value, now))
+
+    def _memory_get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if now - created_at > self.ttl_seconds:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self._counters["hits"] += 1
+            self._counters["memory_hits"] += 1
+            return value
+
+    def _disk_got(self, key: str, value: str | None, now: float) -> str | None:
+        if value is None:
+            return None
+        with self._lock:
+            # Promote into memory; the disk copy keeps its own TTL.
+            self._remember(key, value, now)
+            self._counters["hits"] += 1
+            self._counters["disk_hits"] += 1
+        return value
+
+    def _count_miss(self) -> None:
+        with self._lock:
+            self._counters["misses"] += 1
+
+    def _store(self, key: str, value: str, now: float) -> None:
+        with self._lock:
+            self._remember(key, value, now)
+
+    def _count_evictions(self, evicted: int) -> None:
+        with self._lock:
+            self._counters["evictions"] += evicted
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._counters["bypasses"] += 1
+
+    def _remember(self, key: str, value: str, now: float) -> None:
+        self._memory[key] = (now, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["hit_rate"] = round(self._counters["hits"] / lookups, 4) if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+        if self._disk is not None:
+            stats["disk_entries"], stats["disk_bytes"] = self._disk.count()
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+
+_CACHE: LLMResponseCache | None = None
+
+
+def get_response_cache() -> LLMResponseCache:
+    """Return the process-wide cache, configured from the environment."""
+    global _CACHE
+
+    if _CACHE is None:
+        _CACHE = LLMResponseCache(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "600")),
+            disk_path=os.getenv("LLM_CACHE_PATH") or None,
+            disk_max_bytes=int(float(os.getenv("LLM_CACHE_DISK_MAX_MB", "64")) * 1024 * 1024),
+        )
+    return _CACHE
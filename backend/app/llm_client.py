@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+"""
+Async Gemini REST client shared by every chat / brief route.
+
+Each worker process keeps one pooled, keep-alive httpx.AsyncClient, caps the
+number of in-flight model calls with a semaphore and enforces a deadline per
+call, so a slow model reply never blocks the event loop for other routes.
+
+Environment knobs (all optional):
+  - GEMINI_API_BASE          e.g. http://127.0.0.1:8089/v1beta for a local stand-in server
+  - GEMINI_TIMEOUT_SECONDS   per-call deadline, including time spent queued (default 25)
+  - GEMINI_MAX_CONCURRENCY   max concurrent model calls per worker (default 8)
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List
+
+import httpx
+
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+
+def build_payload(system_prompt: str, chat_log: List[dict]) -> Dict[str, Any]:
+    """Translate our role/content chat log into a Gemini `generateContent` body."""
+    return {
+        "systemInstruction": {"parts": [{"text": system_prompt.strip()}]},
+        "contents": [
+            {
+                "role": ("model" if m.get("role") == "assistant" else "user"),
+                "parts": [{"text": str(m.get("content", "") or "")}],
+            }
+            for m in (chat_log or [])
+            if m and m.get("role") in ("user", "assistant")
+        ],
+    }
+
+
+def extract_text(parsed: Dict[str, Any], strip: bool = True) -> str:
+    """
+    Join the text parts of the first candidate in a Gemini response.
+
+    Parts are concatenated as-is, the same way streamed chunks are, so a
+    reply has one shape whichever endpoint produced it. Streamed chunks use
+    `strip=False` so whitespace between consecutive chunks survives.
+    """
+    candidates = parsed.get("candidates") or [{}]
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    text = "".join((p.get("text") or "") for p in parts if isinstance(p, dict))
+    return text.strip() if strip else text
+
+
+class GeminiClient:
+    """
+    Thin asyncio-native wrapper around the Gemini REST API.
+
+    The underlying HTTP client is created lazily so the object can be built
+    at import time and only opens connections once a request needs them.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None,
+        model: str,
+        api_base: str = DEFAULT_API_BASE,
+        timeout: float = 25.0,
+        max_concurrency: int = 8,
+    ) -> None:
+        self.api_key = api_key
+        # Accept both "gemini-2.5-pro" and the "models/gemini-2.5-pro" resource name.
+        self.model_path = model if model.startswith("models/") else f"models/{model}"
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._http: httpx.AsyncClient | None = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=60.0,
+                ),
+            )
+        return self._http
+
+    def _url(self, method: str) -> str:
+        return f"{self.api_base}/{self.model_path}:{method}"
+
+    async def generate(self, system_prompt: str, chat_log: List[dict], timeout: float | None = None) -> str:
+        """
+        Call `generateContent` and return the reply text.
+
+        Raises RuntimeError on transport errors, non-2xx responses or when the
+        deadline (queueing + request) is exceeded.
+        """
+        deadline = timeout if timeout is not None else self.timeout
+        try:
+            return await asyncio.wait_for(self._generate(system_prompt, chat_log), deadline)
+        except asyncio.TimeoutError as e:
+            raise RuntimeError(f"Gemini request timed out after {deadline:g}s") from e
+
+    async def _generate(self, system_prompt: str, chat_log: List[dict]) -> str:
+        payload = build_payload(system_prompt, chat_log)
+        async with self._semaphore:
+            try:
+                resp = await self._client().post(
+                    self._url("generateContent"),
+                    params={"key": self.api_key or ""},
+                    json=payload,
+                )
+            except httpx.HTTPError as e:
+                raise RuntimeError(f"Gemini request failed: {e!r}") from e
+
+        raw = resp.text
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Gemini API error {resp.status_code}: {raw or resp.reason_phrase}")
+
+        try:
+            return extract_text(resp.json()) or "No reply generated."
+        except Exception:
+            return raw or "No reply generated."
+
+    async def stream_generate(
+        self, system_prompt: str, chat_log: List[dict], timeout: float | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Call `streamGenerateContent` (SSE) and yield reply text as it arrives.
+
+        The deadline applies to the whole stream; each wait for the next chunk
+        is bounded by whatever time is left.
+        """
+        deadline = timeout if timeout is not None else self.timeout
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline
+
+        def remaining() -> float:
+            left = expires_at - loop.time()
+            if left <= 0:
+                raise RuntimeError(f"Gemini request timed out after {deadline:g}s")
+            return left
+
+        payload = build_payload(system_prompt, chat_log)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), remaining())
+        except asyncio.TimeoutError as e:
+            raise RuntimeError(f"Gemini request timed out after {deadline:g}s") from e
+
+        try:
+            request = self._client().build_request(
+                "POST",
+                self._url("streamGenerateContent"),
+                params={"key": self.api_key or "", "alt": "sse"},
+                json=payload,
+            )
+            try:
+                resp = await asyncio.wait_for(self._client().send(request, stream=True), remaining())
+            except asyncio.TimeoutError as e:
+                raise RuntimeError(f"Gemini request timed out after {deadline:g}s") from e
+            except httpx.HTTPError as e:
+                raise RuntimeError(f"Gemini request failed: {e!r}") from e
+
+            try:
+                if resp.status_code >= 400:
+                    body = (await resp.aread()).decode("utf-8", errors="ignore")
+                    raise RuntimeError(f"Gemini API error {resp.status_code}: {body or resp.reason_phrase}")
+
+                lines = resp.aiter_lines()
+                while True:
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), remaining())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError as e:
+                        raise RuntimeError(f"Gemini request timed out after {deadline:g}s") from e
+                    except httpx.HTTPError as e:
+                        raise RuntimeError(f"Gemini request failed: {e!r}") from e
+
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        text = extract_text(json.loads(line[5:].strip()), strip=False)
+                    except Exception:
+                        continue
+                    if text:
+                        yield text
+            finally:
+                await resp.aclose()
+        finally:
+            self._semaphore.release()
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def discard(self, loop: asyncio.AbstractEventLoop | None) -> concurrent.futures.Future | None:
+        """
+        Drop the pool from outside the event loop that owns it (`loop`).
+
+        If that loop is still running (in another thread) the pool is closed
+        there and the returned future resolves once it is. Otherwise nothing
+        can await it any more: the client is dropped and its connections are
+        released when it is garbage-collected.
+        """
+        http, self._http = self._http, None
+        if http is None or loop is None or loop.is_closed() or not loop.is_running():
+            return None
+        return asyncio.run_coroutine_threadsafe(http.aclose(), loop)
+
+
+# One client per worker process / event loop.
+_CLIENT: GeminiClient | None = None
+_CLIENT_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def get_gemini_client() -> GeminiClient:
+    """
+    Return the process-wide client, (re)building it if the running event loop
+    changed (e.g. between test runs), since pooled connections are loop-bound.
+    """
+    global _CLIENT, _CLIENT_LOOP
+
+    loop = asyncio.get_running_loop()
+    if _CLIENT is None or _CLIENT_LOOP is not loop:
+        if _CLIENT is not None:
+            _CLIENT.discard(_CLIENT_LOOP)
+        _CLIENT = GeminiClient(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            model=os.getenv("GEMINI_MODEL", "models/gemini-2.5-pro"),
+            api_base=os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE),
+            timeout=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "25")),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+        )
+        _CLIENT_LOOP = loop
+    return _CLIENT
+
+
+async def close_gemini_client() -> None:
+    """Close pooled connections on application shutdown."""
+    global _CLIENT, _CLIENT_LOOP
+
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+    _CLIENT = None
+    _CLIENT_LOOP = None
@@ -1,25 +1,42 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Response
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional, Literal
-from app.agent_core import process_message
-from app.feed_generator import generate_dco_feed
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request, UploadFile, File, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, model_validator
+from typing import AsyncIterator, Iterable, List, Dict, Any, Optional, Literal
+from app.agent_core import process_message, stream_message
+from app.llm_cache import bypass_requested, get_response_cache
+from app.llm_client import close_gemini_client
+from app.export_bundle import stream_bundle
+from app.feed_conflicts import detect_feed_conflicts
+from app.feed_generator import DcoFeedBuilder, diff_dco_feed, generate_dco_feed, iter_dco_feed
+from app.feed_schema import FeedSchema
+from app.feed_stream import FEED_MEDIA_TYPES, encode_feed, ndjson_batches
+from app.plan_export import get_pdf_renderer, render_plan_txt
+from app.upload_store import get_upload_store, select_upload
 from app.api.brief_routes import router as brief_router
 from app.api.matrix_routes import router as matrix_router
 from app.api.concept_routes import router as concept_router
 from app.api.spec_routes import router as spec_router
 from app.api.production_routes import router as production_router
-from app.schemas.feed import AssetFeedRow
+from app.api.sse import sse_event, sse_response
+from app.schemas.feed import AssetFeedRow, FeedDelta
+from app.schemas.production_matrix import ProductionJob
+from app.schemas.uploads import UploadSelection
 from fastapi.middleware.cors import CORSMiddleware
 import aiofiles
 import os
 import json
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import io
-import csv
-from io import StringIO
 
-app = FastAPI(title="Intelligent Briefing Agent")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled Gemini connections when the worker shuts down.
+    await close_gemini_client()
+
+
+app = FastAPI(title="Intelligent Briefing Agent", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor"],
 )
 
 app.include_router(brief_router, prefix="/brief", tags=["brief"])
@@ -44,7 +62,17 @@ async def root():
   return {
     "service": "Intelligent Briefing Agent",
     "status": "ok",
-    "endpoints": ["/docs", "/chat", "/brief/chat", "/matrix", "/concepts", "/specs", "/production"],
+    "endpoints": [
+      "/docs",
+      "/chat",
+      "/chat/stream",
+      "/brief/chat",
+      "/brief/chat/stream",
+      "/matrix",
+      "/concepts",
+      "/specs",
+      "/production",
+    ],
   }
 
 class ChatMessage(BaseModel):
@@ -77,24 +105,121 @@ class GenerateAssetResponse(BaseModel):
 class GenerateFeedRequest(BaseModel):
     audience_strategy: List[Dict[str, Any]]
     asset_list: List[Dict[str, Any]]
-    media_plan_rows: List[Dict[str, Any]]
+    media_plan_rows: List[Dict[str, Any]] = []
+    # Instead of inline rows: a plan stored by /upload, optionally sliced / filtered.
+    media_plan: UploadSelection | None = None
+    # Extra column aliases per input, e.g. {"media_plan_rows": {"geo": ["Country"]}};
+    # they take priority over the built-in tables in app.feed_schema.
+    column_aliases: Dict[str, Dict[str, List[str]]] = {}
+
+    @model_validator(mode="after")
+    def _one_media_plan(self) -> "GenerateFeedRequest":
+        given = "media_plan_rows" in self.model_fields_set
+        if given == (self.media_plan is not None):
+            raise ValueError("Provide exactly one of media_plan_rows or media_plan")
+        return self
 
 
 class GenerateFeedResponse(BaseModel):
     feed: List[AssetFeedRow]
+    # Input columns no feed field reads, per input (omitted when all mapped).
+    unmapped_columns: Dict[str, List[str]] = {}
+
+
+class GenerateFeedDiffRequest(GenerateFeedRequest):
+    # The previously generated feed (rows as returned by /generate-feed).
+    previous_feed: List[Dict[str, Any]]
+
+
+class FeedConflictsRequest(BaseModel):
+    # Feed rows as returned by /generate-feed.
+    feed: List[Dict[str, Any]]
+
+
+class FeedStreamHeader(BaseModel):
+    """First line of an NDJSON /generate-feed/stream body."""
+
+    audience_strategy: List[Dict[str, Any]] = []
+    asset_list: List[Dict[str, Any]] = []
+    column_aliases: Dict[str, Dict[str, List[str]]] = {}
+
+
+class ExportBundleRequest(ExportRequest):
+    # Feed inputs as for /generate-feed; the bundle has no feed without them.
+    feed: GenerateFeedRequest | None = None
+    feed_formats: List[Literal["csv", "ndjson"]] = ["csv"]
+    # ProductionJobs from /production/builder/jobs.
+    jobs: List[ProductionJob] | None = None
+    # Stored production batches to include, by ID and / or whole campaign.
+    batch_ids: List[str] = []
+    campaign_id: str | None = None
+
+
+def _media_plan_rows(request: GenerateFeedRequest) -> Iterable[Dict[str, Any]]:
+    """The request's media plan rows: inline, or read from the upload store."""
+    if request.media_plan is None:
+        return request.media_plan_rows
+    try:
+        return select_upload(request.media_plan)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _feed_stream_response(lines: Any, fmt: str) -> StreamingResponse:
+    headers = {"Content-Disposition": "attachment; filename=asset_feed.csv"} if fmt == "csv" else None
+    return StreamingResponse(lines, media_type=FEED_MEDIA_TYPES[fmt], headers=headers)
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, x_llm_cache: Optional[str] = Header(default=None)):
+    """
+    Send `X-LLM-Cache: bypass` to force a fresh model call for this request.
+    """
     try:
+        usage: Dict[str, int] = {}
         reply = await process_message(
             [msg.dict() for msg in request.history], 
-            request.current_plan
+            request.current_plan,
+            use_cache=not bypass_requested(x_llm_cache),
+            usage=usage,
         )
-        return {"reply": reply}
+        return {"reply": reply, "usage": usage}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, x_llm_cache: Optional[str] = Header(default=None)):
+    """
+    SSE variant of /chat: `token` events as Gemini streams, then a `done`
+    event carrying the full reply.
+    """
+    history = [msg.dict() for msg in request.history]
+    use_cache = not bypass_requested(x_llm_cache)
+
+    async def frames() -> AsyncIterator[str]:
+        parts: List[str] = []
+        usage: Dict[str, int] = {}
+        try:
+            async for chunk in stream_message(history, request.current_plan, use_cache=use_cache, usage=usage):
+                parts.append(chunk)
+                yield sse_event("token", {"text": chunk})
+            yield sse_event("done", {"reply": "".join(parts).strip() or "No reply generated.", "usage": usage})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return sse_response(frames())
+
+
+@app.get("/chat/cache")
+async def chat_cache_stats():
+    """
+    Hit / miss counters and sizes for the LLM response cache.
+    """
+    return await run_in_threadpool(get_response_cache().stats)
+
+
 @app.post("/generate-asset", response_model=GenerateAssetResponse)
 async def generate_asset(request: GenerateAssetRequest):
     """
@@ -124,35 +249,155 @@ async def generate_asset(request: GenerateAssetRequest):
 
 
 @app.post("/generate-feed", response_model=GenerateFeedResponse)
-async def generate_feed(request: GenerateFeedRequest) -> GenerateFeedResponse:
+async def generate_feed(
+    request: GenerateFeedRequest,
+    fmt: Literal["json", "ndjson", "csv"] = Query("json", alias="format"),
+) -> GenerateFeedResponse | StreamingResponse:
     """
     Turn strategy + concepts + media plan rows into a structured DCO feed.
 
     This is intentionally simple: it walks the media rows and, for each one,
     looks up the best-matching headline (from `audience_strategy`) and image /
-    exit URL (from `asset_list`) by audience. The exact shapes of those inputs
+    exit URL (from `asset_list`) by audience, narrowed by geo / trigger /
+    platform / size where those rows specify them and falling back to
+    less specific rows, then default ones. Several matches become weighted
+    rotation variants (`rotation_weight`). The exact shapes of those inputs
     can evolve over time as long as they expose reasonable `audience` /
-    `headline` / `image_url` / `exit_url` style keys.
+    `headline` / `image_url` / `exit_url` style keys (or the request adds
+    `column_aliases` for them). Columns nothing reads come back in
+    `unmapped_columns`.
+
+    `?format=ndjson` or `?format=csv` streams the feed row by row instead
+    (CSV columns in the frontend export order); streamed output carries no
+    `unmapped_columns` report.
+
+    Instead of inline `media_plan_rows`, `media_plan` can reference a CSV
+    stored by /upload (by handle, with an optional row range and column
+    value filters); its rows are read straight from the stored plan. Exactly
+    one of the two must be given.
     """
     try:
+        schema = FeedSchema(request.column_aliases)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    media_plan_rows = await run_in_threadpool(_media_plan_rows, request)
+    if fmt != "json":
+        rows = iter_dco_feed(request.audience_strategy, request.asset_list, media_plan_rows, schema)
+        return _feed_stream_response(encode_feed(rows, fmt), fmt)
+
+    def build() -> GenerateFeedResponse:
         feed_rows = generate_dco_feed(
             audience_strategy=request.audience_strategy,
             asset_list=request.asset_list,
-            media_plan_rows=request.media_plan_rows,
+            media_plan_rows=media_plan_rows,
+            schema=schema,
+        )
+        return GenerateFeedResponse(feed=feed_rows, unmapped_columns=schema.unmapped_columns())
+
+    try:
+        return await run_in_threadpool(build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/generate-feed/diff", response_model=FeedDelta)
+async def generate_feed_diff(request: GenerateFeedDiffRequest) -> FeedDelta:
+    """
+    Regenerate the feed and return only the delta against `previous_feed`:
+    added and changed rows in full, removed row_ids, and an unchanged count.
+    Row IDs are deterministic, so the same inputs always produce the same IDs.
+    """
+    try:
+        schema = FeedSchema(request.column_aliases)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    media_plan_rows = await run_in_threadpool(_media_plan_rows, request)
+    try:
+        return await run_in_threadpool(
+            diff_dco_feed,
+            request.previous_feed,
+            request.audience_strategy,
+            request.asset_list,
+            media_plan_rows,
+            schema=schema,
         )
-        return GenerateFeedResponse(feed=feed_rows)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/generate-feed/conflicts")
+async def generate_feed_conflicts(request: FeedConflictsRequest) -> Dict[str, Any]:
+    """
+    Targeting conflicts in a generated feed: rows sharing platform, placement,
+    audience, geo and trigger whose flight dates overlap (the ad server would
+    pick one arbitrarily), and date gaps inside each group's flight span.
+    See app.feed_conflicts.
+    """
+    try:
+        report = await run_in_threadpool(detect_feed_conflicts, request.feed)
+        return report.as_dict()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/generate-feed/stream")
+async def generate_feed_stream(
+    request: Request,
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+) -> StreamingResponse:
+    """
+    Streaming in and out: the body is NDJSON (application/x-ndjson).
+
+    The first line is a FeedStreamHeader object
+    ({"audience_strategy": [...], "asset_list": [...], "column_aliases": {...}});
+    every following line is one media plan row. Feed rows are generated and
+    sent as each chunk of the plan arrives, so neither side holds the whole
+    plan. A malformed row line after the header ends the stream early.
+    """
+    batches = ndjson_batches(request.stream())
+    try:
+        first = await batches.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Empty body: expected an NDJSON header line.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        header = FeedStreamHeader.model_validate(first[0])
+        builder = DcoFeedBuilder(header.audience_strategy, header.asset_list, FeedSchema(header.column_aliases))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def lines() -> AsyncIterator[str]:
+        batch = first[1:]
+        is_first = True
+        while True:
+            # Build and encode each batch off the event loop.
+            yield await run_in_threadpool(lambda: "".join(encode_feed(builder.rows(batch), fmt, header=is_first)))
+            is_first = False
+            try:
+                batch = await batches.__anext__()
+            except StopAsyncIteration:
+                return
+
+    return _feed_stream_response(lines(), fmt)
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
+    """
+    Text / markdown files come back as a content preview. CSV files are
+    parsed in a streaming pass and stored server-side (see app.upload_store):
+    the response carries the plan's `handle`, headers, inferred `schema`,
+    `row_count` and only the first page of `rows`; fetch further pages from
+    /upload/{handle}/rows.
+    """
     try:
-        raw_bytes = await file.read()
         filename = file.filename or "uploaded_file"
         lower_name = filename.lower()
 
         # Text and markdown files – simple text content
         if lower_name.endswith(".txt") or lower_name.endswith(".md"):
+            raw_bytes = await file.read()
             content = raw_bytes.decode("utf-8", errors="ignore")
             # Truncate to keep payloads small
             return {
@@ -163,29 +408,21 @@ async def upload_file(file: UploadFile = File(...)):
 
         # CSV files – treat as structured audience matrix
         if lower_name.endswith(".csv"):
-            text = raw_bytes.decode("utf-8", errors="ignore")
-            f = StringIO(text)
-            reader = csv.reader(f)
-            headers = next(reader, [])
-
-            rows: List[Dict[str, Any]] = []
-            for row in reader:
-                # Skip completely empty rows
-                if not any(cell.strip() for cell in row):
-                    continue
-                row_dict: Dict[str, Any] = {}
-                for idx, value in enumerate(row):
-                    key = headers[idx] if idx < len(headers) else f"col_{idx}"
-                    row_dict[key] = value
-                rows.append(row_dict)
-
+            plan, preview, text = await run_in_threadpool(get_upload_store().ingest_csv, file.file, filename)
             return {
                 "filename": filename,
                 "kind": "audience_matrix",
-                "headers": headers,
-                "rows": rows,
+                "handle": plan.handle,
+                "headers": plan.headers,
+                "schema": [column.as_dict() for column in plan.columns],
+                "encoding": plan.encoding,
+                "delimiter": plan.delimiter,
+                "row_count": plan.row_count,
+                "ragged_rows": plan.ragged_rows,
+                # First page only; the rest is at /upload/{handle}/rows.
+                "rows": preview,
                 # Short preview string the frontend can show/send to the agent
-                "content": text[:5000],
+                "content": text,
             }
 
         # Fallback for other file types – binary placeholder for now
@@ -198,80 +435,92 @@ async def upload_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/upload/{handle}/rows")
+async def upload_rows(
+    handle: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """
+    One page of a stored CSV upload's rows (header -> cell text), with the
+    total row count and the offset of the next page (null on the last one).
+    """
+    store = get_upload_store()
+    plan = store.get(handle)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    try:
+        rows = await run_in_threadpool(store.rows, handle, offset, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    next_offset = offset + len(rows)
+    return {
+        "handle": handle,
+        "headers": plan.headers,
+        "offset": offset,
+        "total": plan.row_count,
+        "next_offset": next_offset if next_offset < plan.row_count else None,
+        "rows": rows,
+    }
+
 @app.post("/export/pdf")
 async def export_pdf(request: ExportRequest):
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    y = height - 50
-    
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, y, f"Production Master Plan: {request.plan.get('campaign_name', 'Untitled')}")
-    y -= 30
-    
-    p.setFont("Helvetica", 12)
-    
-    def draw_text(text, x, y_pos):
-        # Simple text wrapping could be added here
-        p.drawString(x, y_pos, str(text))
-        return y_pos - 15
-
-    if 'single_minded_proposition' in request.plan:
-        y = draw_text(f"SMP: {request.plan['single_minded_proposition']}", 50, y)
-        y -= 10
-        
-    if 'bill_of_materials' in request.plan:
-        p.setFont("Helvetica-Bold", 14)
-        y = draw_text("Bill of Materials:", 50, y)
-        p.setFont("Helvetica", 12)
-        for item in request.plan['bill_of_materials']:
-            y = draw_text(f"- {item.get('asset_id')}: {item.get('concept')} ({item.get('format')})", 70, y)
-            if y < 50:
-                p.showPage()
-                y = height - 50
-    
-    p.save()
-    buffer.seek(0)
-    return Response(content=buffer.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=brief.pdf"})
+    """
+    Render the plan as a PDF on the bounded render pool (see app.plan_export).
+    Identical plans are served from the render cache; the plan hash is
+    returned as the ETag.
+    """
+    try:
+        key, pdf = await get_pdf_renderer().render(request.plan)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=brief.pdf", "ETag": f'"{key}"'},
+    )
+
+@app.get("/export/pdf/cache")
+async def export_pdf_cache_stats():
+    """
+    Hit / miss counters and sizes for the rendered-PDF cache.
+    """
+    return get_pdf_renderer().stats()
+
+@app.post("/export/bundle")
+async def export_bundle(request: ExportBundleRequest) -> StreamingResponse:
+    """
+    One ZIP with everything production needs: brief TXT and PDF, the DCO feed
+    (CSV and / or NDJSON, generated from `feed`), the ProductionJob list and
+    stored production batches with their assets. The archive is streamed
+    as it is built (see app.export_bundle).
+    """
+    feed_inputs = None
+    if request.feed is not None:
+        try:
+            FeedSchema(request.feed.column_aliases)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        feed_inputs = request.feed.model_dump()
+        feed_inputs["media_plan_rows"] = await run_in_threadpool(_media_plan_rows, request.feed)
+    chunks = stream_bundle(
+        request.plan,
+        feed_inputs=feed_inputs,
+        feed_formats=request.feed_formats,
+        jobs=None if request.jobs is None else [job.model_dump(mode="json") for job in request.jobs],
+        batch_ids=request.batch_ids,
+        campaign_id=request.campaign_id,
+    )
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=campaign_bundle.zip"},
+    )
 
 @app.post("/export/txt")
 async def export_txt(request: ExportRequest):
-    plan = request.plan
-    lines: list[str] = []
-
-    lines.append(f"Production Master Plan: {plan.get('campaign_name', 'Untitled')}")
-    lines.append("=" * 50)
-    lines.append("")
-
-    lines.append(f"SMP: {plan.get('single_minded_proposition', 'N/A')}")
-    lines.append("")
-
-    narrative = plan.get("narrative_brief")
-    if narrative:
-        lines.append("Narrative Brief:")
-        lines.append(narrative)
-        lines.append("")
-
-    lines.append("Bill of Materials:")
-    for item in plan.get("bill_of_materials", []):
-        lines.append(f"- {item.get('asset_id')}: {item.get('concept')} ({item.get('format')})")
-    lines.append("")
-
-    # Optional content matrix section for production teams
-    matrix = plan.get("content_matrix") or []
-    if matrix:
-        lines.append("Content Matrix (rows map assets to audience / triggers / channels):")
-        for row in matrix:
-            summary = (
-                f"- asset={row.get('asset_id')} | "
-                f"audience={row.get('audience_segment')} | "
-                f"stage={row.get('funnel_stage')} | "
-                f"trigger={row.get('trigger')} | "
-                f"channel={row.get('channel')} | "
-                f"format={row.get('format')} | "
-                f"message={row.get('message')}"
-            )
-            lines.append(summary)
-
-    content = "\n".join(lines) + "\n"
+    content = render_plan_txt(request.plan)
     return Response(content=content, media_type="text/plain", headers={"Content-Disposition": "attachment; filename=brief.txt"})
@@ -10,8 +10,7 @@ class ProductionBatch(BaseModel):
     """
     Groups all assets for a specific Strategy + Concept combination.
 
-    This is a lightweight Pydantic model for the POC. In a full implementation,
-    it would back a persistent database table.
+    Persisted through app.services.production_store (SQLite by default).
     """
 
     id: str = Field(default_factory=lambda: str(uuid4()))
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+"""
+PDF / text export of a production master plan; PDFs render off the event loop.
+
+reportlab is synchronous and CPU-bound, so renders run on a small bounded
+thread pool. Finished PDFs are kept in an in-memory LRU keyed by a SHA-256
+of the plan's canonical JSON: exporting the same plan again (or a
+double-click) is served from memory, and concurrent requests for a plan
+that is still rendering share that render.
+
+The document has the title, SMP and narrative brief, the bill of materials,
+and the full content matrix as a table that wraps cell text and repeats its
+header row on every page.
+
+Environment knobs:
+  - PDF_RENDER_WORKERS       render threads per worker process (default 2)
+  - PDF_CACHE_MAX_ENTRIES    cached PDFs kept in memory (default 32, 0 disables)
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+
+# Content matrix columns: (plan key, header, relative width).
+MATRIX_COLUMNS: Tuple[Tuple[str, str, float], ...] = (
+    ("asset_id", "Asset", 1.0),
+    ("audience_segment", "Audience", 1.4),
+    ("funnel_stage", "Stage", 0.9),
+    ("trigger", "Trigger", 1.2),
+    ("channel", "Channel", 1.0),
+    ("format", "Format", 1.0),
+    ("message", "Message", 2.4),
+    ("variant", "Variant", 0.8),
+    ("source_type", "Source", 0.9),
+    ("specs", "Specs", 1.3),
+    ("notes", "Notes", 1.6),
+)
+
+
+def plan_hash(plan: Dict[str, Any]) -> str:
+    """SHA-256 of the plan's canonical JSON (key order and spacing ignored)."""
+    material = json.dumps(plan, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def render_plan_txt(plan: Dict[str, Any]) -> str:
+    """Plain-text export of the plan (the /export/txt body)."""
+    lines: list[str] = []
+
+    lines.append(f"Production Master Plan: {plan.get('campaign_name', 'Untitled')}")
+    lines.append("=" * 50)
+    lines.append("")
+
+    lines.append(f"SMP: {plan.get('single_minded_proposition', 'N/A')}")
+    lines.append("")
+
+    narrative = plan.get("narrative_brief")
+    if narrative:
+        lines.append("Narrative Brief:")
+        lines.append(narrative)
+        lines.append("")
+
+    lines.append("Bill of Materials:")
+    for item in plan.get("bill_of_materials", []):
+        lines.append(f"- {item.get('asset_id')}: {item.get('concept')} ({item.get('format')})")
+    lines.append("")
+
+    # Optional content matrix section for production teams
+    matrix = plan.get("content_matrix") or []
+    if matrix:
+        lines.append("Content Matrix (rows map assets to audience / triggers / channels):")
+        for row in matrix:
+            summary = (
+                f"- asset={row.get('asset_id')} | "
+                f"audience={row.get('audience_segment')} | "
+                f"stage={row.get('funnel_stage')} | "
+                f"trigger={row.get('trigger')} | "
+                f"channel={row.get('channel')} | "
+                f"format={row.get('format')} | "
+                f"message={row.get('message')}"
+            )
+            lines.append(summary)
+
+    return "\n".join(lines) + "\n"
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_text(v) for v in value)
+    if isinstance(value, dict):
+        return ", ".join(f"{k}: {_text(v)}" for k, v in value.items())
+    return str(value)
+
+
+def _para(value: Any, style: ParagraphStyle) -> Paragraph:
+    # Paragraph takes mini-markup; escape the text and keep line breaks.
+    return Paragraph(escape(_text(value)).replace("\n", "<br/>"), style)
+
+
+def render_plan_pdf(plan: Dict[str, Any]) -> bytes:
+    """Render the plan to PDF bytes (synchronous; see PdfRenderer for async use)."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(letter),
+        leftMargin=0.5 * inch,
+        rightMargin=0.5 * inch,
+        topMargin=0.5 * inch,
+        bottomMargin=0.5 * inch,
+        title=f"Production Master Plan: {plan.get('campaign_name', 'Untitled')}",
+    )
+    styles = getSampleStyleSheet()
+    body = styles["BodyText"]
+    cell = ParagraphStyle("MatrixCell", parent=body, fontSize=7.5, leading=9)
+    head = ParagraphStyle("MatrixHead", parent=cell, fontName="Helvetica-Bold", textColor=colors.white)
+
+    story: List[Any] = [
+        _para(f"Production Master Plan: {plan.get('campaign_name', 'Untitled')}", styles["Title"]),
+    ]
+    if "single_minded_proposition" in plan:
+        story.append(_para(f"SMP: {plan['single_minded_proposition']}", body))
+        story.append(Spacer(1, 8))
+    if plan.get("narrative_brief"):
+        story.append(_para("Narrative Brief", styles["Heading2"]))
+        story.append(_para(plan["narrative_brief"], body))
+
+    bom = plan.get("bill_of_materials") or []
+    if bom:
+        story.append(_para("Bill of Materials", styles["Heading2"]))
+        for item in bom:
+            story.append(_para(f"- {item.get('asset_id')}: {item.get('concept')} ({item.get('format')})", body))
+
+    matrix = plan.get("content_matrix") or []
+    if matrix:
+        story.append(_para(f"Content Matrix ({len(matrix)} rows)", styles["Heading2"]))
+        story.append(_matrix_table(matrix, doc.width, cell, head))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _matrix_table(
+    matrix: Sequence[Dict[str, Any]],
+    width: float,
+    cell: ParagraphStyle,
+    head: ParagraphStyle,
+) -> LongTable:
+    total = sum(weight for _, _, weight in MATRIX_COLUMNS)
+    col_widths = [width * weight / total for _, _, weight in MATRIX_COLUMNS]
+    data = [[_para(title, head) for _, title, _ in MATRIX_COLUMNS]]
+    for row in matrix:
+        data.append([_para(row.get(key), cell) for key, _, _ in MATRIX_COLUMNS])
+    # LongTable splits across pages and repeats the header row on each one;
+    # splitInRow lets a row taller than a page (a long message) continue on
+    # the next page instead of failing the layout.
+    table = LongTable(data, colWidths=col_widths, repeatRows=1, splitInRow=1)
+    table.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#0f172a")),
+                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f1f5f9")]),
+                ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#cbd5e1")),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("TOPPADDING", (0, 0), (-1, -1), 2),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+            ]
+        )
+    )
+    return table
+
+
+class PdfRenderer:
+    """Bounded render pool plus an LRU of rendered PDFs keyed by plan_hash."""
+
+    def __init__(self, max_workers: int = 2, max_entries: int = 32) -> None:
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="pdf-render")
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0}
+
+    def submit(self, plan: Dict[str, Any]) -> Tuple[str, Future]:
+        """(plan hash, Future of the PDF bytes); cached / in-flight renders are reused."""
+        key = plan_hash(plan)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._counters["hits"] += 1
+                done: Future = Future()
+                done.set_result(cached)
+                return key, done
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["shared"] += 1
+                return key, future
+            self._counters["misses"] += 1
+            future = self._inflight[key] = self._executor.submit(render_plan_pdf, plan)
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return key, future
+
+    async def render(self, plan: Dict[str, Any]) -> Tuple[str, bytes]:
+        """(plan hash, PDF bytes) without blocking the event loop."""
+        key, future = self.submit(plan)
+        return key, await asyncio.wrap_future(future)
+
+    def _finished(self, key: str, future: Future) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None or self.max_entries <= 0:
+                return
+            self._cache[key] = future.result()
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["entries"] = len(self._cache)
+            stats["bytes"] = sum(len(pdf) for pdf in self._cache.values())
+            stats["rendering"] = len(self._inflight)
+            return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+_RENDERER: PdfRenderer | None = None
+_RENDERER_LOCK = threading.Lock()
+
+
+def get_pdf_renderer() -> PdfRenderer:
+    """Return the process-wide renderer, configured from the environment."""
+    global _RENDERER
+
+    if _RENDERER is None:
+        with _RENDERER_LOCK:
+            if _RENDERER is None:
+                _RENDERER = PdfRenderer(
+                    max_workers=int(os.getenv("PDF_RENDER_WORKERS", "2")),
+                    max_entries=int(os.getenv("PDF_CACHE_MAX_ENTRIES", "32")),
+                )
+    return _RENDERER
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+"""
+Token-budgeted prompt assembly for the Gemini calls.
+
+Instead of pasting `json.dumps(plan, indent=2)` and the whole history into
+every request, the builder:
+  - serialises the plan / brief compactly, dropping empty and default fields
+  - keeps the last N chat turns verbatim and folds older turns into a rolling
+    extractive summary (cached by history prefix, so each turn only
+    summarises the one message that just left the window)
+  - shrinks the verbatim window, then the largest plan lists, then the
+    summary until the estimate fits the token budget
+  - reports the estimated input tokens for each call
+
+Environment knobs:
+  - PROMPT_TOKEN_BUDGET    target input tokens per call (default 16000)
+  - PROMPT_HISTORY_TURNS   chat messages kept verbatim (default 8)
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+
+# Rough chars-per-token ratio for English prose / JSON under Gemini's tokenizer.
+_CHARS_PER_TOKEN = 4
+_SUMMARY_WORDS_PER_TURN = 30
+_SUMMARY_CACHE_SIZE = 512
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def prune_state(data: Any, model_cls: Type[BaseModel] | None = None) -> Any:
+    """
+    Recursively drop empty values, plus top-level fields still at their
+    default value on `model_cls` (e.g. ModConBrief.status == "Draft").
+    """
+    if isinstance(data, dict):
+        defaults: Dict[str, Any] = {}
+        if model_cls is not None:
+            for name, field in model_cls.model_fields.items():
+                if field.default is not PydanticUndefined:
+                    default = field.default
+                    defaults[name] = getattr(default, "value", default)
+        pruned: Dict[str, Any] = {}
+        for key, value in data.items():
+            value = prune_state(value)
+            if _is_empty(value):
+                continue
+            if key in defaults and getattr(value, "value", value) == defaults[key]:
+                continue
+            pruned[key] = value
+        return pruned
+    if isinstance(data, list):
+        items = [prune_state(v) for v in data]
+        return [v for v in items if not _is_empty(v)]
+    return data
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _condense_turn(message: dict) -> str:
+    role = "Assistant" if message.get("role") == "assistant" else "User"
+    words = str(message.get("content", "") or "").split()
+    text = " ".join(words[:_SUMMARY_WORDS_PER_TURN])
+    if len(words) > _SUMMARY_WORDS_PER_TURN:
+        text += " …"
+    return f"{role}: {text}"
+
+
+class _SummaryCache:
+    """
+    Rolling summaries keyed by a hash chain over the summarised prefix of the
+    history, so extending the prefix by one turn reuses the previous summary.
+    """
+
+    def __init__(self, max_entries: int = _SUMMARY_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def summarise(self, turns: List[dict]) -> List[str]:
+        chain: List[str] = []
+        digest = ""
+        for turn in turns:
+            material = f"{digest}|{turn.get('role')}|{turn.get('content', '')}"
+            digest = hashlib.sha1(material.encode("utf-8")).hexdigest()
+            chain.append(digest)
+
+        with self._lock:
+            start, lines = 0, []
+            for i in range(len(chain) - 1, -1, -1):
+                cached = self._entries.get(chain[i])
+                if cached is not None:
+                    self._entries.move_to_end(chain[i])
+                    start, lines = i + 1, list(cached)
+                    break
+
+            for i in range(start, len(turns)):
+                lines.append(_condense_turn(turns[i]))
+                self._entries[chain[i]] = list(lines)
+                self._entries.move_to_end(chain[i])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return lines
+
+
+_SUMMARIES = _SummaryCache()
+
+
+@dataclass
+class PromptBuild:
+    system_prompt: str
+    chat_log: List[dict]
+    estimated_tokens: int
+    verbatim_turns: int
+    summarised_turns: int
+    trimmed_rows: int
+
+    def usage(self) -> Dict[str, int]:
+        return {
+            "input_tokens": self.estimated_tokens,
+            "verbatim_turns": self.verbatim_turns,
+            "summarised_turns": self.summarised_turns,
+            "trimmed_rows": self.trimmed_rows,
+        }
+
+
+class PromptBuilder:
+    def __init__(self, token_budget: int = 16000, history_turns: int = 8, min_history_turns: int = 2) -> None:
+        self.token_budget = token_budget
+        self.history_turns = max(1, history_turns)
+        self.min_history_turns = max(1, min(min_history_turns, self.history_turns))
+
+    def build(
+        self,
+        render: Callable[[str], str],
+        state: Dict[str, Any] | None,
+        chat_log: List[dict],
+        model_cls: Type[BaseModel] | None = None,
+    ) -> PromptBuild:
+        """
+        Assemble a system prompt + chat log under the token budget.
+
+        `render` receives the compact state JSON and returns the system prompt
+        (e.g. `lambda s: SYSTEM_PROMPT.format(current_plan=s)`).
+        """
+        plan = prune_state(state or {}, model_cls)
+        turns = [m for m in (chat_log or []) if m and m.get("role") in ("user", "assistant")]
+        keep = min(len(turns), self.history_turns)
+        trimmed_rows = 0
+
+        while True:
+            split = len(turns) - keep
+            # Start the verbatim window on a user turn so roles still alternate.
+            if split < len(turns) - 1 and turns[split].get("role") == "assistant":
+                split += 1
+            older, recent = turns[:split], turns[split:]
+            summary = _SUMMARIES.summarise(older) if older else []
+            system_prompt, estimated = self._assemble(render, plan, summary, recent)
+            if estimated <= self.token_budget:
+                break
+
+            if keep > self.min_history_turns:
+                keep -= 1
+                continue
+
+            plan, cut = self._trim_largest_list(plan)
+            if cut:
+                trimmed_rows += cut
+                continue
+
+            # Last resort: keep only the newest summary lines that fit.
+            while summary and estimated > self.token_budget:
+                summary = summary[1:]
+                system_prompt, estimated = self._assemble(render, plan, summary, recent)
+            break
+
+        return PromptBuild(
+            system_prompt=system_prompt,
+            chat_log=recent,
+            estimated_tokens=estimated,
+            verbatim_turns=len(recent),
+            summarised_turns=len(older),
+            trimmed_rows=trimmed_rows,
+        )
+
+    @staticmethod
+    def _assemble(
+        render: Callable[[str], str], plan: Dict[str, Any], summary: List[str], recent: List[dict]
+    ) -> Tuple[str, int]:
+        system_prompt = render(compact_json(plan))
+        if summary:
+            system_prompt += "\nEarlier conversation (summarised, oldest first):\n" + "\n".join(summary) + "\n"
+        estimated = estimate_tokens(system_prompt) + sum(
+            estimate_tokens(str(m.get("content", "") or "")) for m in recent
+        )
+        return system_prompt, estimated
+
+    @staticmethod
+    def _trim_largest_list(plan: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """Halve the largest top-level list, noting how many rows were omitted."""
+        candidates = [(len(compact_json(v)), k) for k, v in plan.items() if isinstance(v, list) and len(v) > 1]
+        if not candidates:
+            return plan, 0
+        _, key = max(candidates)
+        rows = plan[key]
+        keep = len(rows) // 2
+        trimmed = dict(plan)
+        trimmed[key] = rows[:keep]
+        omitted_key = f"{key}_omitted_rows"
+        trimmed[omitted_key] = int(plan.get(omitted_key, 0)) + (len(rows) - keep)
+        return trimmed, len(rows) - keep
+
+
+_BUILDER: PromptBuilder | None = None
+
+
+def get_prompt_builder() -> PromptBuilder:
+    global _BUILDER
+
+    if _BUILDER is None:
+        _BUILDER = PromptBuilder(
+            token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "16000")),
+            history_turns=int(os.getenv("PROMPT_HISTORY_TURNS", "8")),
+        )
+    return _BUILDER
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -50,4 +50,22 @@ class AssetFeedRow(BaseModel):
     destination_url: Optional[str] = None
     utm_suffix: Optional[str] = None
 
+    # Block 8: Rotation (set when a placement rotates between several variants)
+    rotation_weight: Optional[float] = None
 
+
+class FeedDelta(BaseModel):
+    """
+    Difference between two feed versions, keyed by deterministic row_id:
+    what trafficking has to push instead of the full feed.
+    """
+
+    added: List[AssetFeedRow] = []
+    changed: List[AssetFeedRow] = []
+    removed: List[str] = []  # row_ids of the previous version no longer produced
+    unchanged: int = 0
+
+
+# Column order of the feed CSV export; matches the frontend's BASE_FEED_FIELDS /
+# feed-review headers, which follow blocks 1-7 above.
+FEED_CSV_COLUMNS = tuple(name for name in AssetFeedRow.model_fields if name != "rotation_weight")
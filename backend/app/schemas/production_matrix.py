@@ -16,6 +16,17 @@ class DeliveryDestination(BaseModel):
     special_notes: str  # e.g., "Strict Safe Zone bottom 150px"
 
 
+class DerivedResize(BaseModel):
+    """
+    One delivery size cut down from a job's master render.
+    """
+
+    spec_id: str  # Destination spec served by this resize
+    dimensions: str  # e.g., "720x1280"
+    operation: str  # "scale" (same ratio) or "crop_scale" (ratio differs within tolerance)
+    crop_loss: float = 0.0  # Fraction of the master frame cropped away (0.0 for pure scales)
+
+
 class ProductionJob(BaseModel):
     """
     Represents ONE unique asset to be produced, which may serve multiple partners.
@@ -41,5 +52,7 @@ class ProductionJob(BaseModel):
     due_date: str | None = None  # ISO date string for POC
     round_label: str | None = None  # e.g., "R1", "R2", "Final"
     asset_feed_row_ids: list[str] | None = None  # Optional linkage into the asset feed
+    master_dimensions: str | None = None  # Master render size when consolidated by aspect ratio
+    derived_resizes: List[DerivedResize] | None = None  # Sizes produced from the master rather than rendered
 
 
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class UploadSelection(BaseModel):
+    """
+    Rows of a CSV stored by /upload, referenced by handle instead of sent
+    inline. The row range is taken over the stored plan first (so a big plan
+    can be processed in stable slices); `filters` then keep the rows whose
+    cell in each named column is one of the listed values.
+    """
+
+    handle: str
+    offset: int = Field(0, ge=0)
+    limit: int | None = Field(None, ge=1)
+    filters: Dict[str, List[str]] = {}
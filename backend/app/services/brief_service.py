@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, AsyncIterator, Dict, List, Tuple, Optional
 
 import os
 import re
 
-from app.agent_core import _gemini_generate
+from app.agent_core import _gemini_generate, _gemini_stream
+from app.prompt_builder import PromptBuild, get_prompt_builder
 from app.schemas.brief import ModConBrief
+from app.services.json_patch import apply_json_patch
 
 
 def _parse_model_json(raw: str) -> Dict[str, Any] | None:
@@ -108,7 +110,7 @@ SYSTEM_PROMPT = """
 You are a concise brief partner. Keep responses plain English (no markdown, bullets, or numbered lists).
 
 Inputs:
-- current_state: existing ModCon brief as JSON (with custom fields)
+- current_state: existing ModCon brief as compact JSON (with custom fields; empty or default fields are omitted)
 - chat_log: conversation so far
 
 Behavior:
@@ -133,36 +135,173 @@ Current state (for reference):
 """
 
 
-def update_brief_ai(
-    current_state: ModConBrief, chat_log: List[Dict[str, str]]
+_STUB_REPLY = (
+    "Let's tighten your ModCon brief. Please share campaign name, SMP, primary audience(s), KPIs, "
+    "flight dates, mandatories, tone/voice, offers, proof points, and any specs/asset libraries. "
+    "I'll draft and score it once Gemini is connected."
+)
+
+_MODEL_ERROR_REPLY = (
+    "I hit an issue reaching the model. Let's keep going: share campaign name, SMP, audiences, KPIs, "
+    "flight dates, mandatories, tone/voice, offers, proof points, and specs/asset libraries. "
+    "I'll draft and score it as soon as we reconnect."
+)
+
+
+def is_model_error_reply(reply: str) -> bool:
+    """True for the fallback reply sent when the model call itself failed."""
+    return reply.startswith(_MODEL_ERROR_REPLY)
+
+
+def _use_stub() -> bool:
+    """Stub path when demo mode is on (or when Gemini key is missing in serverless)."""
+    return os.getenv("DEMO_AGENT_STUB") == "1" or not os.getenv("GOOGLE_API_KEY")
+
+
+def _build_brief_prompt(
+    current_state: ModConBrief, chat_log: List[Dict[str, str]], usage: Dict[str, int] | None
+) -> PromptBuild:
+    build = get_prompt_builder().build(
+        render=lambda state_json: SYSTEM_PROMPT.format(current_state=state_json),
+        state=current_state.model_dump(mode="json"),
+        chat_log=chat_log or [],
+        model_cls=ModConBrief,
+    )
+    if usage is not None:
+        usage.update(build.usage())
+    return build
+
+
+async def update_brief_ai(
+    current_state: ModConBrief,
+    chat_log: List[Dict[str, str]],
+    use_cache: bool = True,
+    usage: Dict[str, int] | None = None,
 ) -> Tuple[ModConBrief, str, Optional[float]]:
     """
     Use the shared Gemini LLM to update the ModConBrief from chat.
 
     This stays deliberately thin: it lets the model propose an updated brief
-    and a conversational reply, then we validate & merge the state.
+    and a conversational reply, then we validate & merge the state. Pass a
+    dict as `usage` to receive the prompt's estimated input tokens.
     """
-    system_prompt = SYSTEM_PROMPT.format(current_state=json.dumps(current_state.model_dump(), indent=2))
+    build = _build_brief_prompt(current_state, chat_log, usage)
 
-    # Stub path when demo mode is on (or when Gemini key is missing in serverless)
-    if os.getenv("DEMO_AGENT_STUB") == "1" or not os.getenv("GOOGLE_API_KEY"):
-        stub_reply = (
-            "Let's tighten your ModCon brief. Please share campaign name, SMP, primary audience(s), KPIs, "
-            "flight dates, mandatories, tone/voice, offers, proof points, and any specs/asset libraries. "
-            "I'll draft and score it once Gemini is connected."
-        )
-        return current_state, stub_reply, 3.0
+    if _use_stub():
+        return current_state, _STUB_REPLY, 3.0
 
     try:
-        raw = _gemini_generate(system_prompt=system_prompt, chat_log=chat_log or [])
+        raw = await _gemini_generate(system_prompt=build.system_prompt, chat_log=build.chat_log, use_cache=use_cache)
     except Exception as exc:
-        fallback = (
-            "I hit an issue reaching the model. Let's keep going: share campaign name, SMP, audiences, KPIs, "
-            "flight dates, mandatories, tone/voice, offers, proof points, and specs/asset libraries. "
-            "I'll draft and score it as soon as we reconnect."
-        )
-        return current_state, f"{fallback} (error: {exc})", None
+        return current_state, f"{_MODEL_ERROR_REPLY} (error: {exc})", None
+
+    return _merge_model_reply(current_state, chat_log, raw)
+
+
+class _ReplyExtractor:
+    """
+    Incrementally decode the `assistant_reply` string out of a partial JSON
+    document so reply text can be streamed before the model finishes the
+    rest of the object (quality_score, modcon_brief).
+    """
+
+    _KEY = re.compile(r'"assistant_reply"\s*:\s*"')
+    _ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.done = False
+        self._pos: int | None = None
+
+    def feed(self, chunk: str) -> str:
+        """Add a raw model chunk; return any newly decoded reply text."""
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self._pos is None:
+            match = self._KEY.search(self.buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buf = self.buffer
+        i = self._pos
+        out: List[str] = []
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch == "\\":
+                # Wait for the rest of a split escape sequence.
+                if i + 1 >= len(buf):
+                    break
+                esc = buf[i + 1]
+                if esc == "u":
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[i + 2 : i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(self._ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            out.append(ch)
+            i += 1
+
+        self._pos = i
+        return "".join(out)
+
+
+async def stream_brief_ai(
+    current_state: ModConBrief,
+    chat_log: List[Dict[str, str]],
+    use_cache: bool = True,
+    usage: Dict[str, int] | None = None,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of `update_brief_ai`.
 
+    Yields ("token", {"text": ...}) events as the assistant_reply is parsed
+    out of the partial model JSON, then one ("done", {...}) event carrying the
+    cleaned reply, quality_score and merged state (same shape as /brief/chat).
+    """
+
+    def done(state: ModConBrief, reply: str, score: Optional[float]) -> Tuple[str, Dict[str, Any]]:
+        return "done", {"reply": reply, "quality_score": score, "state": state.model_dump(mode="json")}
+
+    build = _build_brief_prompt(current_state, chat_log, usage)
+
+    if _use_stub():
+        yield "token", {"text": _STUB_REPLY}
+        yield done(current_state, _STUB_REPLY, 3.0)
+        return
+
+    extractor = _ReplyExtractor()
+    try:
+        async for chunk in _gemini_stream(system_prompt=build.system_prompt, chat_log=build.chat_log, use_cache=use_cache):
+            text = extractor.feed(chunk)
+            if text:
+                yield "token", {"text": text}
+    except Exception as exc:
+        yield done(current_state, f"{_MODEL_ERROR_REPLY} (error: {exc})", None)
+        return
+
+    yield done(*_merge_model_reply(current_state, chat_log, extractor.buffer))
+
+
+def _merge_model_reply(
+    current_state: ModConBrief, chat_log: List[Dict[str, str]], raw: str
+) -> Tuple[ModConBrief, str, Optional[float]]:
+    """
+    Validate the model's JSON reply and merge its proposed brief into the
+    current state, keeping human-owned fields safe.
+    """
     payload = _parse_model_json(str(raw))
     if payload is None:
         # Fallback: keep state, surface a friendly error (avoid dumping raw JSON)
@@ -229,3 +368,15 @@ def override_brief(current_state: ModConBrief, manual_updates: Dict[str, Any]) -
     In case of conflict between AI and human, the human wins.
     """
     return current_state.copy(update=manual_updates or {})
+
+
+def patch_brief(current_state: ModConBrief, operations: List[Dict[str, Any]]) -> ModConBrief:
+    """
+    Human override expressed as a JSON-Patch (RFC 6902) against the brief.
+
+    Raises JsonPatchError if any operation cannot be applied.
+    """
+    if not operations:
+        return current_state
+    patched = apply_json_patch(current_state.model_dump(mode="json"), operations)
+    return ModConBrief(**patched)
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+"""
+Append-only store for custom specs.
+
+Custom specs live in two files:
+  - data/specs.json          compacted base (JSON array, committed seed data)
+  - data/specs.log.jsonl     append-only log, one Spec per line
+
+A save takes an exclusive flock, appends a single line with one write() and
+fsyncs it, so concurrent gunicorn workers never lose each other's specs and a
+crash can at worst leave a torn last line (dropped on the next write).
+Once the log passes a threshold, a background thread folds it into the base
+file via write-to-temp + os.replace and truncates the log.
+
+The store keeps the set of known spec IDs in memory and only reads the log
+tail appended by other workers since its last sync, so ID generation does
+not rebuild or rescan anything.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Set
+
+from app.schemas.specs import Spec, SpecCreate
+
+
+_DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data"))
+CUSTOM_SPECS_PATH = os.path.join(_DATA_DIR, "specs.json")
+CUSTOM_SPECS_LOG_PATH = os.getenv("SPEC_LOG_PATH") or os.path.join(_DATA_DIR, "specs.log.jsonl")
+
+
+def _read_json_array(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return data if isinstance(data, list) else []
+
+
+def parse_spec_log(raw: bytes) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+    for line in raw.split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            # Torn line from a crashed writer.
+            continue
+        if isinstance(item, dict):
+            items.append(item)
+    return items
+
+
+def merge_custom_specs(base: List[Dict[str, Any]], log_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Base entries followed by log entries, skipping log lines that are exact
+    copies of a base entry (left behind if compaction stopped between
+    replacing the base file and truncating the log).
+    """
+    seen = {json.dumps(item, sort_keys=True) for item in base}
+    merged = list(base)
+    for item in log_items:
+        if json.dumps(item, sort_keys=True) not in seen:
+            merged.append(item)
+    return merged
+
+
+def read_custom_specs(base_path: str, log_path: str) -> List[Dict[str, Any]]:
+    """All custom spec dicts (base + log), without taking the lock."""
+    try:
+        with open(log_path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        raw = b""
+    return merge_custom_specs(_read_json_array(base_path), parse_spec_log(raw))
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class CustomSpecStore:
+    def __init__(self, base_path: str, log_path: str, compact_threshold: int = 200) -> None:
+        self.base_path = base_path
+        self.log_path = log_path
+        self.lock_path = f"{log_path}.lock"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._ids: Set[str] = set()
+        self._next_suffix: Dict[str, int] = {}
+        self._log_offset = 0
+        self._log_lines = 0
+        self._base_stat: tuple = ()
+        self._loaded = False
+        self._compacting = False
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _stat_base(self) -> tuple:
+        try:
+            st = os.stat(self.base_path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return ()
+
+    def _sync(self) -> None:
+        """Catch up with writes made by other processes. Caller holds both locks."""
+        try:
+            log_size = os.path.getsize(self.log_path)
+        except OSError:
+            log_size = 0
+
+        base_stat = self._stat_base()
+        if not self._loaded or base_stat != self._base_stat or log_size < self._log_offset:
+            # First use, or another worker compacted: rebuild from scratch.
+            self._ids = {str(item.get("id")) for item in _read_json_array(self.base_path)}
+            self._next_suffix = {}
+            self._base_stat = base_stat
+            self._log_offset = 0
+            self._log_lines = 0
+            self._loaded = True
+
+        if log_size <= self._log_offset:
+            return
+
+        with open(self.log_path, "rb+") as f:
+            f.seek(self._log_offset)
+            tail = f.read()
+            complete = tail.rfind(b"\n") + 1
+            if complete < len(tail):
+                # Torn trailing write from a crashed process; we hold the lock, so drop it.
+                f.truncate(self._log_offset + complete)
+                f.flush()
+                os.fsync(f.fileno())
+        for item in parse_spec_log(tail[:complete]):
+            self._ids.add(str(item.get("id")))
+            self._log_lines += 1
+        self._log_offset += complete
+
+    def _unique_id(self, base: str) -> str:
+        if base not in self._ids:
+            return base
+        suffix = self._next_suffix.get(base, 1)
+        while f"{base}_{suffix}" in self._ids:
+            suffix += 1
+        self._next_suffix[base] = suffix + 1
+        return f"{base}_{suffix}"
+
+    def append(self, spec_data: SpecCreate) -> Spec:
+        """Validate, assign an ID if needed, and durably append one spec."""
+        with self._lock, self._file_lock():
+            self._sync()
+            if spec_data.id:
+                new_id = spec_data.id
+            else:
+                new_id = self._unique_id(f"{spec_data.platform}_{spec_data.placement}".upper().replace(" ", "_"))
+            spec = Spec(id=new_id, **spec_data.model_dump(exclude={"id"}))
+
+            line = (json.dumps(spec.model_dump(), ensure_ascii=False) + "\n").encode("utf-8")
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            self._ids.add(new_id)
+            self._log_offset += len(line)
+            self._log_lines += 1
+            should_compact = self._log_lines >= self.compact_threshold and not self._compacting
+            if should_compact:
+                self._compacting = True
+
+        if should_compact:
+            threading.Thread(target=self._compact_in_background, name="spec-log-compaction", daemon=True).start()
+        return spec
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except OSError:
+            pass
+        finally:
+            self._compacting = False
+
+    def compact(self) -> int:
+        """Fold the log into the base file. Returns the number of specs merged in."""
+        with self._lock, self._file_lock():
+            self._sync()
+            try:
+                with open(self.log_path, "rb") as f:
+                    log_items = parse_spec_log(f.read())
+            except OSError:
+                return 0
+            if not log_items:
+                return 0
+
+            merged = merge_custom_specs(_read_json_array(self.base_path), log_items)
+            fd, tmp = tempfile.mkstemp(prefix=".specs.", dir=os.path.dirname(self.base_path) or ".")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(merged, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.base_path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            _fsync_dir(self.base_path)
+
+            # A crash before this truncate only leaves duplicates that readers skip.
+            with open(self.log_path, "r+b") as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+
+            self._base_stat = self._stat_base()
+            self._log_offset = 0
+            self._log_lines = 0
+            return len(log_items)
+
+
+_STORE: CustomSpecStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_custom_spec_store() -> CustomSpecStore:
+    global _STORE
+
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = CustomSpecStore(
+                    base_path=CUSTOM_SPECS_PATH,
+                    log_path=CUSTOM_SPECS_LOG_PATH,
+                    compact_threshold=int(os.getenv("SPEC_LOG_COMPACT_THRESHOLD", "200")),
+                )
+    return _STORE
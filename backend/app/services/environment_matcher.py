@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+"""
+Compiled matcher from strategist environment labels to spec IDs.
+
+Labels such as "Meta: Stories/Reels (9:16)", "YouTube 6s bumper" or
+"Display 300x250" are tokenised into words, reduced ratios ("9:16") and
+dimensions ("300x250"). Every catalog entry (platform, custom and legacy
+SPEC_LIBRARY IDs) is indexed by the same tokens taken from its platform,
+placement / format name, ratio, dimensions, ID and aliases.
+
+A label is scored against the entries sharing at least one token with it,
+weighting each token by its rarity in the catalog (IDF) and by the field it
+came from (dimensions and placements count more than platform names).
+Results are ranked with a confidence equal to the share of the label's
+token weight that the entry explains. Matches are cached per label and the
+matcher is rebuilt whenever the spec catalog version changes.
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import gcd
+from typing import Any, Dict, List, Tuple
+
+from app.services.spec_registry import get_spec_registry
+
+
+_FIELD_WEIGHTS = {"platform": 1.0, "placement": 1.5, "ratio": 1.2, "dimensions": 2.0, "id": 0.5}
+
+# Source preference when scores tie: legacy environment IDs first (they carry
+# the richest production fields), then canonical platform specs, then custom.
+_SOURCE_RANK = {"library": 0, "platform": 1, "custom": 2}
+
+_SYNONYMS = {
+    "fb": "meta",
+    "facebook": "meta",
+    "instagram": "meta",
+    "ig": "meta",
+    "insta": "meta",
+    "yt": "youtube",
+    "tt": "tiktok",
+    "twitter": "x",
+    "snap": "snapchat",
+    "gdn": "display",
+    "dv360": "display",
+    "banner": "display",
+    "tv": "ctv",
+    "ott": "ctv",
+    "instream": "stream",
+    "medium": "mpu",
+    "rectangle": "mpu",
+}
+
+# Score reported for an exact ID / alias hit (finite so it serialises as JSON).
+_EXACT_SCORE = 1e6
+
+_STOPWORDS = {"a", "an", "and", "or", "the", "of", "for", "in", "on", "ad", "ads", "format", "placement"}
+
+_DIMENSION_RE = re.compile(r"(\d{2,5})\s*[x×]\s*(\d{2,5})")
+_RATIO_RE = re.compile(r"(\d{1,2}(?:\.\d+)?)\s*[:x×/]\s*(\d{1,2}(?:\.\d+)?)")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_LABEL_SPLIT_RE = re.compile(r"\s*[,;|\n]\s*")
+
+
+def _ratio_token(w: float, h: float) -> str:
+    if w <= 0 or h <= 0:
+        return ""
+    if w == int(w) and h == int(h):
+        d = gcd(int(w), int(h))
+        return f"{int(w) // d}:{int(h) // d}"
+    return f"{w:g}:{h:g}"
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Normalised tokens for a label or catalog field: 'd<W>x<H>' for
+    dimensions, 'r<W>:<H>' for reduced ratios, and stemmed words.
+    """
+    text = (text or "").lower()
+    tokens: List[str] = []
+
+    def take_dimensions(m: re.Match) -> str:
+        w, h = int(m.group(1)), int(m.group(2))
+        if w < 50 or h < 50:
+            return m.group(0)
+        tokens.append(f"d{w}x{h}")
+        tokens.append("r" + _ratio_token(w, h))
+        return " "
+
+    def take_ratio(m: re.Match) -> str:
+        ratio = _ratio_token(float(m.group(1)), float(m.group(2)))
+        if ratio:
+            tokens.append("r" + ratio)
+        return " "
+
+    text = _DIMENSION_RE.sub(take_dimensions, text)
+    text = _RATIO_RE.sub(take_ratio, text)
+    for word in _WORD_RE.findall(text):
+        word = _SYNONYMS.get(word, word)
+        if word in _STOPWORDS:
+            continue
+        tokens.append(_SYNONYMS.get(_stem(word), _stem(word)))
+
+    seen: Dict[str, None] = {}
+    for token in tokens:
+        seen.setdefault(token, None)
+    return list(seen)
+
+
+@dataclass(frozen=True)
+class EnvironmentMatch:
+    spec_id: str
+    score: float
+    confidence: float
+    matched_tokens: Tuple[str, ...]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "spec_id": self.spec_id,
+            "score": round(self.score, 4),
+            "confidence": round(self.confidence, 4),
+            "matched_tokens": list(self.matched_tokens),
+        }
+
+
+class EnvironmentMatcher:
+    """Token index over catalog entries; build once per catalog version."""
+
+    def __init__(self, entries: List[Dict[str, Any]], cache_size: int = 4096) -> None:
+        self.cache_size = cache_size
+        self._ids: List[str] = []
+        self._rank: List[Tuple[int, int]] = []
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._cache: "OrderedDict[str, Tuple[EnvironmentMatch, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compile(entries)
+
+    def _compile(self, entries: List[Dict[str, Any]]) -> None:
+        for i, entry in enumerate(entries):
+            self._ids.append(entry["id"])
+            self._rank.append((_SOURCE_RANK.get(entry["source"], 9), i))
+            self._exact.setdefault(entry["id"].upper(), i)
+
+            fields = {
+                "platform": f"{entry['platform']} {entry['platform_id']}",
+                "placement": f"{entry['placement']} {entry['format_name']}",
+                "ratio": " ".join(
+                    v for v in (entry["aspect_ratio"], entry.get("aspect_ratio_label", ""), entry["orientation_label"]) if v
+                ),
+                "dimensions": entry["dimensions"],
+                "id": " ".join([entry["id"], *entry.get("aliases", [])]).replace("_", " "),
+            }
+            platform_tokens = set(tokenize(fields["platform"]))
+            weights: Dict[str, float] = {}
+            for field, text in fields.items():
+                for token in tokenize(text):
+                    # Platform names repeated inside a placement ("Meta Reels")
+                    # should not outweigh the platform field itself.
+                    weight = _FIELD_WEIGHTS["platform"] if token in platform_tokens else _FIELD_WEIGHTS[field]
+                    weights[token] = max(weights.get(token, 0.0), weight)
+            for token, weight in weights.items():
+                self._postings.setdefault(token, []).append((i, weight))
+
+        # Aliases resolve exactly too, but never shadow a real ID.
+        for i, entry in enumerate(entries):
+            for alias in entry.get("aliases", []):
+                self._exact.setdefault(alias.upper(), i)
+
+        n = max(1, len(self._ids))
+        self._idf = {token: math.log(1.0 + n / len(posting)) for token, posting in self._postings.items()}
+        self._unknown_idf = math.log(1.0 + n)
+
+    def match(self, label: str, limit: int = 5) -> List[EnvironmentMatch]:
+        """Ranked matches for one label (best first)."""
+        key = (label or "").strip()
+        if not key:
+            return []
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return list(cached[:limit])
+
+        ranked = self._score(key)
+        with self._lock:
+            self._cache[key] = ranked
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return list(ranked[:limit])
+
+    def best(self, label: str, min_confidence: float = 0.5) -> EnvironmentMatch | None:
+        matches = self.match(label, limit=1)
+        if matches and matches[0].confidence >= min_confidence:
+            return matches[0]
+        return None
+
+    def _score(self, label: str) -> Tuple[EnvironmentMatch, ...]:
+        exact = self._exact.get(label.upper().replace(" ", "_"))
+        if exact is not None:
+            return (EnvironmentMatch(self._ids[exact], _EXACT_SCORE, 1.0, (label,)),)
+
+        tokens = tokenize(label)
+        total = sum(self._idf.get(t, self._unknown_idf) for t in tokens)
+        if not total:
+            return ()
+
+        scores: Dict[int, float] = {}
+        covered: Dict[int, float] = {}
+        matched: Dict[int, List[str]] = {}
+        for token in tokens:
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for i, weight in self._postings[token]:
+                scores[i] = scores.get(i, 0.0) + idf * weight
+                covered[i] = covered.get(i, 0.0) + idf
+                matched.setdefault(i, []).append(token)
+
+        order = sorted(scores, key=lambda i: (-scores[i], self._rank[i]))
+        return tuple(
+            EnvironmentMatch(self._ids[i], scores[i], min(1.0, covered[i] / total), tuple(matched[i])) for i in order
+        )
+
+
+def split_labels(raw: str) -> List[str]:
+    """'Meta, TikTok; YouTube' -> ['Meta', 'TikTok', 'YouTube']."""
+    return [part for part in _LABEL_SPLIT_RE.split(raw or "") if part.strip()]
+
+
+_MATCHER: Tuple[str, EnvironmentMatcher] | None = None
+_MATCHER_LOCK = threading.Lock()
+
+
+def get_environment_matcher() -> EnvironmentMatcher:
+    """Process-wide matcher for the current spec catalog version."""
+    global _MATCHER
+
+    registry = get_spec_registry()
+    version = registry.version
+    current = _MATCHER
+    if current is None or current[0] != version:
+        with _MATCHER_LOCK:
+            if _MATCHER is None or _MATCHER[0] != version:
+                _MATCHER = (version, EnvironmentMatcher(registry.entries()))
+            current = _MATCHER
+    return current[1]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+"""
+Minimal RFC 6902 JSON-Patch implementation for manual brief edits.
+
+Supports add / remove / replace / move / copy / test against plain
+dict / list documents (e.g. `ModConBrief.model_dump()`).
+"""
+
+import copy
+from typing import Any, Dict, List, Tuple
+
+
+class JsonPatchError(ValueError):
+    """Raised when a patch operation is malformed or cannot be applied."""
+
+
+def _parse_pointer(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    idx = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if idx > limit:
+        raise JsonPatchError(f"Array index out of range: {idx}")
+    return idx
+
+
+def _resolve_parent(doc: Any, pointer: str) -> Tuple[Any, str]:
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("Operation on the document root is not supported")
+    node = doc
+    for token in tokens[:-1]:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found: {pointer}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_list_index(node, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path not found: {pointer}")
+    return node, tokens[-1]
+
+
+def _get(doc: Any, pointer: str) -> Any:
+    node = doc
+    for token in _parse_pointer(pointer):
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found: {pointer}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_list_index(node, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path not found: {pointer}")
+    return node
+
+
+def _add(doc: Any, pointer: str, value: Any) -> None:
+    parent, token = _resolve_parent(doc, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, token, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add at {pointer}")
+
+
+def _remove(doc: Any, pointer: str) -> Any:
+    parent, token = _resolve_parent(doc, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"Path not found: {pointer}")
+        return parent.pop(token)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, token, allow_end=False))
+    raise JsonPatchError(f"Cannot remove at {pointer}")
+
+
+def apply_json_patch(doc: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Apply a list of JSON-Patch operations and return the patched copy.
+
+    The input document is never mutated; if any operation fails the whole
+    patch is rejected with JsonPatchError.
+    """
+    result = copy.deepcopy(doc)
+
+    for op in operations or []:
+        if not isinstance(op, dict) or "op" not in op or "path" not in op:
+            raise JsonPatchError(f"Malformed patch operation: {op!r}")
+        kind = op["op"]
+        path = op["path"]
+
+        if kind in ("add", "replace", "test") and "value" not in op:
+            raise JsonPatchError(f"'{kind}' operation requires a value")
+        if kind in ("move", "copy") and "from" not in op:
+            raise JsonPatchError(f"'{kind}' operation requires 'from'")
+
+        if kind == "add":
+            _add(result, path, copy.deepcopy(op["value"]))
+        elif kind == "remove":
+            _remove(result, path)
+        elif kind == "replace":
+            _remove(result, path)
+            _add(result, path, copy.deepcopy(op["value"]))
+        elif kind == "move":
+            if path.startswith(op["from"] + "/"):
+                raise JsonPatchError("Cannot move a value into one of its children")
+            _add(result, path, _remove(result, op["from"]))
+        elif kind == "copy":
+            _add(result, path, copy.deepcopy(_get(result, op["from"])))
+        elif kind == "test":
+            if _get(result, path) != op["value"]:
+                raise JsonPatchError(f"Test failed at {path}")
+        else:
+            raise JsonPatchError(f"Unsupported patch operation: {kind!r}")
+
+    return result
@@ -3,28 +3,112 @@ from __future__ import annotations
 """
 Matrix Builder – Many-to-One ProductionJob grouper.
 
-Given a set of selected specs and a creative concept, this service groups
-redundant specs (same physical asset) into a single ProductionJob with
-multiple DeliveryDestinations.
+Given a set of selected specs and one or more creative concepts, this service
+groups redundant specs (same physical asset) into a single ProductionJob per
+concept with multiple DeliveryDestinations.
+
+Specs are first normalised into a columnar view (SpecColumns) whose
+dimensions and file types are interned to integer codes, so grouping is a
+single pass over integer keys and is shared by every concept in a campaign.
+The catalog-wide view is built once per spec catalog version.
+
+`consolidate_campaign` goes further than exact-size grouping: specs whose
+aspect ratios agree within a tolerance are served by one master render
+(chosen by greedy set cover over ratio and resolution) and derived by
+scaling, or cropping then scaling, down from it.
 """
 
-from typing import Dict, List
+import re
+import threading
+from dataclasses import dataclass, field
+from math import gcd
+from typing import Dict, Iterable, List, Tuple
 
-from app.schemas.production_matrix import DeliveryDestination, ProductionJob
+from app.schemas.production_matrix import DeliveryDestination, DerivedResize, ProductionJob
+from app.services.spec_registry import get_spec_registry
 
 
-class MatrixBuilder:
+_SIZE_RE = re.compile(r"^\s*(\d+)\s*[x×]\s*(\d+)\s*$")
+_MEDIA_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+_MEDIA_JOINERS = {"or", "and"}
+
+
+def _media_key(value: object) -> str:
     """
-    Group flat spec selections into consolidated ProductionJob tickets.
+    Canonical file type: the sorted set of accepted media, so "video_or_image",
+    "Image or Video" and "image_or_video" are one type.
     """
+    tokens = {t for t in _MEDIA_SPLIT_RE.split(str(value).lower()) if t and t not in _MEDIA_JOINERS}
+    return "_or_".join(sorted(tokens)) or "asset"
 
-    def group_specs_by_creative(self, selected_specs: List[Dict], creative_concept: str) -> List[ProductionJob]:
+
+def _ratio_label(w: int, h: int) -> str:
+    d = gcd(w, h)
+    return f"{w // d}:{h // d}"
+
+
+def _crop_fit(master: Tuple[int, int], target: Tuple[int, int]) -> Tuple[bool, float]:
+    """
+    Whether `target` can be cut from `master` without upscaling, and the
+    fraction of the master frame lost to the crop.
+
+    The largest target-ratio window inside the master is taken first, then
+    scaled down to the target size; the window must be at least as large as
+    the target.
+    """
+    mw, mh = master
+    tw, th = target
+    ratio = tw / th
+    crop_w = min(mw, mh * ratio)
+    crop_h = crop_w / ratio
+    if crop_w + 1e-6 < tw or crop_h + 1e-6 < th:
+        return False, 0.0
+    return True, max(0.0, 1.0 - (crop_w * crop_h) / (mw * mh))
+
+
+@dataclass
+class SpecColumns:
+    """
+    Column-oriented, pre-normalised spec table.
+
+    `dim_code` / `file_code` index into `dim_values` / `file_values`;
+    `dim_sizes` holds the parsed (width, height) per dimension code, (0, 0)
+    when the dimensions are not a WxH size. Every other column is the
+    normalised display value for that row.
+    """
+
+    spec_ids: List[str] = field(default_factory=list)
+    platform_names: List[str] = field(default_factory=list)
+    format_names: List[str] = field(default_factory=list)
+    notes: List[str] = field(default_factory=list)
+    aspect_ratios: List[str] = field(default_factory=list)
+    max_durations: List[int | None] = field(default_factory=list)
+    dim_code: List[int] = field(default_factory=list)
+    file_code: List[int] = field(default_factory=list)
+    dim_values: List[str] = field(default_factory=list)
+    dim_sizes: List[Tuple[int, int]] = field(default_factory=list)
+    file_values: List[str] = field(default_factory=list)
+    positions: Dict[str, int] = field(default_factory=dict)
+    _dim_codes: Dict[str, int] = field(default_factory=dict)
+    _file_codes: Dict[str, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.spec_ids)
+
+    def _intern(self, value: str, codes: Dict[str, int], values: List[str]) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, spec: Dict, idx: int | None = None) -> int:
         """
-        Input: A list of selected spec dicts (from spec library or UI).
+        Normalise one raw spec dict (spec library or UI shape) into a row.
 
         Expected keys (best-effort, falls back when missing):
           - dimensions (e.g. "1080x1920") or width/height
-          - file_type or media_type
+          - file_type or media_type (normalised by _media_key)
           - aspect_ratio or orientation
           - platform_name or platform
           - id (spec identifier)
@@ -32,61 +116,309 @@ class MatrixBuilder:
           - safe_zone_notes or notes or safe_zone
           - max_duration (optional)
         """
-        grouped_jobs: Dict[str, ProductionJob] = {}
-
-        for idx, spec in enumerate(selected_specs):
-            # Normalise raw spec fields to a common shape
-            dimensions = spec.get("dimensions")
-            if not dimensions:
-                w = spec.get("width")
-                h = spec.get("height")
-                if w and h:
-                    dimensions = f"{w}x{h}"
-
-            file_type = spec.get("file_type") or spec.get("media_type") or "asset"
-            aspect_ratio = spec.get("aspect_ratio") or spec.get("orientation") or ""
-
-            platform_name = spec.get("platform_name") or spec.get("platform") or "Unknown"
-            spec_id = spec.get("id") or spec.get("spec_id") or f"SPEC-{idx+1}"
-            format_name = spec.get("format_name") or spec.get("placement") or ""
-
-            safe_notes = (
-                spec.get("safe_zone_notes")
-                or spec.get("notes")
-                or spec.get("safe_zone")
-                or "Standard"
-            )
-            max_duration = spec.get("max_duration")
-
-            # Group key: physical asset (dimensions + file_type) + concept
-            key_dimensions = dimensions or "GENERIC"
-            key_file = file_type or "asset"
-            group_key = f"{key_dimensions}_{key_file}_{creative_concept}"
-
-            if group_key not in grouped_jobs:
-                tech_parts = [key_dimensions]
-                if max_duration:
-                    tech_parts.append(f"{max_duration}s")
-                tech_parts.append(file_type.upper())
-                technical_summary = ", ".join(tech_parts)
-
-                grouped_jobs[group_key] = ProductionJob(
-                    job_id=f"JOB-{len(grouped_jobs) + 1}",
-                    creative_concept=creative_concept,
-                    asset_type=f"{aspect_ratio or key_dimensions} {file_type}".strip(),
-                    technical_summary=technical_summary,
-                    destinations=[],
-                )
+        row = len(self.spec_ids)
+        get = spec.get
+        dimensions = get("dimensions")
+        if not dimensions:
+            w = get("width")
+            h = get("height")
+            if w and h:
+                dimensions = f"{w}x{h}"
+        dimensions = dimensions or "GENERIC"
+        file_type = _media_key(get("file_type") or get("media_type") or "asset")
+
+        dim = self._dim_codes.get(dimensions)
+        if dim is None:
+            dim = self._intern(dimensions, self._dim_codes, self.dim_values)
+            m = _SIZE_RE.match(dimensions)
+            self.dim_sizes.append((int(m.group(1)), int(m.group(2))) if m else (0, 0))
+        file = self._file_codes.get(file_type)
+        if file is None:
+            file = self._intern(file_type, self._file_codes, self.file_values)
+
+        spec_id = get("id") or get("spec_id") or f"SPEC-{(row if idx is None else idx) + 1}"
+        self.spec_ids.append(spec_id)
+        self.platform_names.append(get("platform_name") or get("platform") or "Unknown")
+        self.format_names.append(get("format_name") or get("placement") or "")
+        self.notes.append(get("safe_zone_notes") or get("notes") or get("safe_zone") or "Standard")
+        self.aspect_ratios.append(get("aspect_ratio") or get("orientation") or "")
+        self.max_durations.append(get("max_duration"))
+        self.dim_code.append(dim)
+        self.file_code.append(file)
+        # Later rows win on duplicate IDs, as in the spec registry.
+        self.positions[spec_id] = row
+        return row
+
+    @classmethod
+    def from_specs(cls, specs: Iterable[Dict]) -> "SpecColumns":
+        columns = cls()
+        for idx, spec in enumerate(specs):
+            columns.append(spec, idx)
+        return columns
+
+
+class MatrixBuilder:
+    """
+    Group flat spec selections into consolidated ProductionJob tickets.
+    """
+
+    def group_specs_by_creative(self, selected_specs: List[Dict], creative_concept: str) -> List[ProductionJob]:
+        """
+        Input: A list of selected spec dicts (from spec library or UI).
+        See SpecColumns.append for the accepted keys.
+        """
+        columns = SpecColumns.from_specs(selected_specs)
+        return self.group_campaign(columns, range(len(columns)), [creative_concept])
+
+    def group_campaign(
+        self, columns: SpecColumns, rows: Iterable[int], creative_concepts: List[str]
+    ) -> List[ProductionJob]:
+        """
+        Group the selected rows of `columns` once, then emit one job per
+        (concept, physical asset) group, concept-major, numbered JOB-1..N
+        across the whole campaign.
+
+        Destination objects are shared between the concepts' jobs; treat
+        the returned jobs as read-only.
+        """
+        n_files = max(1, len(columns.file_values))
+        groups: Dict[int, List[int]] = {}
+        for row in rows:
+            # Group key: physical asset (dimensions + file_type) as one integer.
+            groups.setdefault(columns.dim_code[row] * n_files + columns.file_code[row], []).append(row)
+
+        templates: List[Tuple[str, str, List[DeliveryDestination]]] = []
+        for members in groups.values():
+            first = members[0]
+            dimensions = columns.dim_values[columns.dim_code[first]]
+            file_type = columns.file_values[columns.file_code[first]]
+
+            tech_parts = [dimensions]
+            if columns.max_durations[first]:
+                tech_parts.append(f"{columns.max_durations[first]}s")
+            tech_parts.append(file_type.upper())
 
-            grouped_jobs[group_key].destinations.append(
+            destinations = [
                 DeliveryDestination(
-                    platform_name=platform_name,
-                    spec_id=spec_id,
-                    format_name=format_name or key_dimensions,
-                    special_notes=safe_notes,
+                    platform_name=columns.platform_names[row],
+                    spec_id=columns.spec_ids[row],
+                    format_name=columns.format_names[row] or dimensions,
+                    special_notes=columns.notes[row],
+                )
+                for row in members
+            ]
+            asset_type = f"{columns.aspect_ratios[first] or dimensions} {file_type}".strip()
+            templates.append((asset_type, ", ".join(tech_parts), destinations))
+
+        jobs: List[ProductionJob] = []
+        for concept in creative_concepts:
+            for asset_type, technical_summary, destinations in templates:
+                jobs.append(
+                    ProductionJob(
+                        job_id=f"JOB-{len(jobs) + 1}",
+                        creative_concept=concept,
+                        asset_type=asset_type,
+                        technical_summary=technical_summary,
+                        destinations=list(destinations),
+                    )
+                )
+        return jobs
+
+    def consolidate_campaign(
+        self,
+        columns: SpecColumns,
+        rows: Iterable[int],
+        creative_concepts: List[str],
+        ratio_tolerance: float = 0.05,
+    ) -> List[ProductionJob]:
+        """
+        Like group_campaign, but collapse every size that can be derived from
+        a larger render into that render's job.
+
+        Within each file type, a candidate master (any selected size) covers
+        a size when their aspect ratios differ by at most `ratio_tolerance`
+        (relative) and the target can be cut from the master without
+        upscaling. Masters are picked greedily: the one covering the most
+        still-uncovered specs first, ties going to the smaller render and
+        then the smaller crop loss. Sizes that are not WxH (e.g. "GENERIC")
+        stay on their own job.
+
+        A spec that accepts several media (e.g. image_or_video) joins the
+        single-medium type it accepts that has the most selected specs, so a
+        video master also serves image-or-video slots; it keeps its own type
+        when no such single-medium type is selected.
+
+        Each job lists every destination it serves; those not delivered at
+        the master size appear in `derived_resizes`.
+        """
+        rows = list(rows)
+        file_of = self._merge_flexible_media(columns, rows)
+        members_by_dim: Dict[Tuple[int, int], List[int]] = {}
+        for row in rows:
+            key = (file_of[columns.file_code[row]], columns.dim_code[row])
+            members = members_by_dim.get(key)
+            if members is None:
+                members = members_by_dim[key] = []
+            members.append(row)
+
+        dims_by_file: Dict[int, List[int]] = {}
+        for file, dim in members_by_dim:
+            dims_by_file.setdefault(file, []).append(dim)
+
+        # (first row, file code, master dim, covered dims with crop loss)
+        clusters: List[Tuple[int, int, int, List[Tuple[int, float]]]] = []
+        for file, dims in dims_by_file.items():
+            sized = [d for d in dims if columns.dim_sizes[d][0] and columns.dim_sizes[d][1]]
+            sized_set = set(sized)
+            for dim in dims:
+                if dim not in sized_set:
+                    clusters.append((members_by_dim[(file, dim)][0], file, dim, [(dim, 0.0)]))
+
+            # Coverage sets for each candidate master, built once per file type.
+            cover: Dict[int, Dict[int, float]] = {}
+            for master in sized:
+                mw, mh = columns.dim_sizes[master]
+                master_ratio = mw / mh
+                covered: Dict[int, float] = {}
+                for dim in sized:
+                    tw, th = columns.dim_sizes[dim]
+                    if abs(tw / th - master_ratio) / master_ratio > ratio_tolerance + 1e-9:
+                        continue
+                    fits, loss = _crop_fit((mw, mh), (tw, th))
+                    if fits:
+                        covered[dim] = loss
+                cover[master] = covered
+
+            weight = {dim: len(members_by_dim[(file, dim)]) for dim in sized}
+            uncovered = set(sized)
+            while uncovered:
+                best = min(
+                    sized,
+                    key=lambda m: (
+                        -sum(weight[d] for d in cover[m] if d in uncovered),
+                        columns.dim_sizes[m][0] * columns.dim_sizes[m][1],
+                        sum(cover[m][d] for d in cover[m] if d in uncovered),
+                        members_by_dim[(file, m)][0],
+                    ),
+                )
+                taken = [(d, cover[best][d]) for d in sized if d in uncovered and d in cover[best]]
+                uncovered.difference_update(d for d, _ in taken)
+                first = min(members_by_dim[(file, d)][0] for d, _ in taken)
+                clusters.append((first, file, best, taken))
+
+        clusters.sort(key=lambda c: c[0])
+
+        templates: List[Tuple[str, str, str | None, List[DeliveryDestination], List[DerivedResize]]] = []
+        for _, file, master, taken in clusters:
+            file_type = columns.file_values[file]
+            dimensions = columns.dim_values[master]
+            mw, mh = columns.dim_sizes[master]
+            cluster_rows = sorted(row for d, _ in taken for row in members_by_dim[(file, d)])
+
+            durations = [columns.max_durations[row] for row in cluster_rows if columns.max_durations[row]]
+            tech_parts = [f"{dimensions} master" if len(taken) > 1 else dimensions]
+            if durations:
+                tech_parts.append(f"{max(durations)}s")
+            tech_parts.append(file_type.upper())
+
+            loss_by_dim = dict(taken)
+            destinations: List[DeliveryDestination] = []
+            resizes: List[DerivedResize] = []
+            for row in cluster_rows:
+                dim = columns.dim_code[row]
+                destinations.append(
+                    DeliveryDestination(
+                        platform_name=columns.platform_names[row],
+                        spec_id=columns.spec_ids[row],
+                        format_name=columns.format_names[row] or columns.dim_values[dim],
+                        special_notes=columns.notes[row],
+                    )
+                )
+                if dim != master:
+                    loss = loss_by_dim[dim]
+                    resizes.append(
+                        DerivedResize(
+                            spec_id=columns.spec_ids[row],
+                            dimensions=columns.dim_values[dim],
+                            operation="crop_scale" if loss > 1e-6 else "scale",
+                            crop_loss=round(loss, 4),
+                        )
+                    )
+
+            label = _ratio_label(mw, mh) if mw and mh else (columns.aspect_ratios[cluster_rows[0]] or dimensions)
+            templates.append(
+                (
+                    f"{label} {file_type}".strip(),
+                    ", ".join(tech_parts),
+                    dimensions if mw and mh else None,
+                    destinations,
+                    resizes,
                 )
             )
 
-        return list(grouped_jobs.values())
+        jobs: List[ProductionJob] = []
+        for concept in creative_concepts:
+            for asset_type, technical_summary, master_dimensions, destinations, resizes in templates:
+                jobs.append(
+                    ProductionJob(
+                        job_id=f"JOB-{len(jobs) + 1}",
+                        creative_concept=concept,
+                        asset_type=asset_type,
+                        technical_summary=technical_summary,
+                        destinations=list(destinations),
+                        master_dimensions=master_dimensions,
+                        derived_resizes=list(resizes),
+                    )
+                )
+        return jobs
+
+    @staticmethod
+    def _merge_flexible_media(columns: SpecColumns, rows: List[int]) -> Dict[int, int]:
+        """Map each selected file code to the code its specs are produced under."""
+        counts: Dict[int, int] = {}
+        for row in rows:
+            counts[columns.file_code[row]] = counts.get(columns.file_code[row], 0) + 1
+        single = {columns.file_values[f]: f for f in counts if "_or_" not in columns.file_values[f]}
+        file_of = {}
+        for file in counts:
+            accepted = [single[t] for t in columns.file_values[file].split("_or_") if t in single]
+            # Most selected specs first, then the earlier-seen type.
+            file_of[file] = min(accepted, key=lambda f: (-counts[f], f)) if accepted else file
+        return file_of
+
 
+_COLUMNS: Tuple[str, SpecColumns] | None = None
+_COLUMNS_LOCK = threading.Lock()
+
+
+def get_catalog_columns() -> SpecColumns:
+    """
+    Columnar view of every spec in the catalog (including legacy IDs),
+    rebuilt only when the catalog version changes.
+    """
+    global _COLUMNS
 
+    registry = get_spec_registry()
+    version = registry.version
+    current = _COLUMNS
+    if current is None or current[0] != version:
+        with _COLUMNS_LOCK:
+            if _COLUMNS is None or _COLUMNS[0] != version:
+                columns = SpecColumns()
+                for entry in registry.entries():
+                    # Same fields the Spec view exposes (see spec_registry._spec_view).
+                    columns.append(
+                        {
+                            "id": entry["id"],
+                            "platform": entry["platform"],
+                            "placement": entry["placement"],
+                            "width": entry["width"],
+                            "height": entry["height"],
+                            "orientation": entry["orientation_label"],
+                            "media_type": entry["media_type"],
+                            "notes": entry["notes"],
+                        }
+                    )
+                _COLUMNS = (version, columns)
+            current = _COLUMNS
+    return current[1]
@@ -4,7 +4,7 @@ from __future__ import annotations
 Matrix Engine – Production Matrix Generator (Module 4 simulation).
 
 Takes a StrategySegment (Module 2) and CreativeConcept (Module 3), looks up
-environment specs from SPEC_LIBRARY, and explodes them into a list of
+environment specs from the compiled spec catalog, and explodes them into a list of
 ProductionAsset tickets (Module 4).
 """
 
@@ -12,7 +12,7 @@ from typing import List
 
 from app.models.inputs import StrategySegment, CreativeConcept
 from app.models.production_asset import ProductionAsset
-from app.services.spec_library import SPEC_LIBRARY
+from app.services.spec_library import get_spec_by_id
 
 
 def generate_bill_of_materials(strategy: StrategySegment, concept: CreativeConcept) -> List[ProductionAsset]:
@@ -23,7 +23,7 @@ def generate_bill_of_materials(strategy: StrategySegment, concept: CreativeConce
     bill_of_materials: List[ProductionAsset] = []
 
     for env_id in strategy.selected_environments:
-        spec = SPEC_LIBRARY.get(env_id)
+        spec = get_spec_by_id(env_id)
         if not spec:
             continue
 
@@ -5,100 +5,83 @@ Module 4 – Production Matrix generator.
 
 Takes a Strategy row (Module 2) and a Concept (Module 3), looks up specs from
 the SPEC_LIBRARY, and generates a set of ProductionAsset tickets (Module 4).
+Batches and assets are persisted through the production store.
 """
 
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
 from app.models.production_matrix import ProductionAsset, ProductionBatch
 from app.schemas.concepts import CreativeConcept
 from app.schemas.strategic_matrix import StrategicMatrixRow
+from app.services.environment_matcher import get_environment_matcher, split_labels
+from app.services.production_store import get_production_store
 from app.services.spec_library import get_spec_by_id
 
 
-# In-memory stores for the POC (no real database yet).
-_BATCHES: dict[str, ProductionBatch] = {}
-_ASSETS: dict[str, ProductionAsset] = {}
+# Shown when no label matches anything, so the board is never empty.
+DEFAULT_ENVIRONMENT_IDS = ["META_STORY", "YT_BUMPER", "DISPLAY_MPU"]
 
 
-def _normalize_environment_ids(raw_envs: List[str]) -> List[str]:
+def _normalize_environment_ids(raw_envs: List[str], min_confidence: float = 0.5) -> List[str]:
     """
-    POC-friendly normalisation for platform_environments.
+    Map platform_environments labels to spec IDs.
 
     The Strategy Matrix may store human-readable labels
-    (e.g. 'Meta: Stories/Reels (9:16)'), but the SPEC_LIBRARY is keyed
-    by environment IDs like 'META_STORY'.
+    (e.g. 'Meta: Stories/Reels (9:16)' or 'Meta, TikTok'), while specs are
+    keyed by IDs like 'META_STORY' or 'TIKTOK_IN_FEED_9X16'. Each label
+    (comma / semicolon separated lists are split first) is resolved with the
+    compiled environment matcher over the full spec catalog, keeping the
+    best match at or above `min_confidence`.
 
-    This helper maps fuzzy labels to the closest spec IDs and falls back
-    to a sensible demo set if nothing matches.
+    Falls back to DEFAULT_ENVIRONMENT_IDS if nothing matches at all.
     """
-    normalized: List[str] = []
+    matcher = get_environment_matcher()
+    deduped: Dict[str, None] = {}
 
     for raw in raw_envs:
-        label = (raw or "").strip()
-        upper = label.upper()
+        for label in split_labels(raw):
+            match = matcher.best(label, min_confidence=min_confidence)
+            if match is not None:
+                deduped.setdefault(match.spec_id, None)
 
-        if not label:
-            continue
-
-        # Direct ID pass-through
-        if upper in {"META_STORY", "META_FEED", "YT_BUMPER", "DISPLAY_MPU", "DISPLAY_LEADER"}:
-            normalized.append(upper)
-            continue
-
-        # Fuzzy mappings based on common copy in the UI / strategist language
-        if "STOR" in upper or "REEL" in upper:
-            normalized.append("META_STORY")
-            continue
+    if not deduped:
+        return list(DEFAULT_ENVIRONMENT_IDS)
 
-        if "FEED" in upper and "META" in upper:
-            normalized.append("META_FEED")
-            continue
+    return list(deduped)
 
-        if "BUMPER" in upper or "6S" in upper or ("YOUTUBE" in upper and "16:9" in upper):
-            normalized.append("YT_BUMPER")
-            continue
 
-        if "300X250" in upper or "MPU" in upper:
-            normalized.append("DISPLAY_MPU")
-            continue
-
-        if "728X90" in upper or "LEADER" in upper:
-            normalized.append("DISPLAY_LEADER")
-            continue
+class _SpecResolver:
+    """
+    Memoises environment normalisation and spec lookups so a bulk run
+    resolves each distinct environment list / spec ID once.
+    """
 
-    # Deduplicate while preserving order
-    seen: set[str] = set()
-    deduped: List[str] = []
-    for eid in normalized:
-        if eid not in seen:
-            seen.add(eid)
-            deduped.append(eid)
+    def __init__(self) -> None:
+        self._env_ids: Dict[Tuple[str, ...], List[str]] = {}
+        self._specs: Dict[str, Dict[str, Any] | None] = {}
 
-    # POC safety net: if after normalisation we still have nothing,
-    # return a small default pack so the board is never empty.
-    if not deduped:
-        return ["META_STORY", "YT_BUMPER", "DISPLAY_MPU"]
+    def env_ids(self, raw_envs: List[str]) -> List[str]:
+        key = tuple(raw_envs)
+        if key not in self._env_ids:
+            self._env_ids[key] = _normalize_environment_ids(list(raw_envs))
+        return self._env_ids[key]
 
-    return deduped
+    def spec(self, env_id: str) -> Dict[str, Any] | None:
+        if env_id not in self._specs:
+            self._specs[env_id] = get_spec_by_id(env_id)
+        return self._specs[env_id]
 
 
-def generate_production_plan(
+def _explode(
     campaign_id: str,
     strategy: StrategicMatrixRow,
     concept: CreativeConcept,
+    resolver: _SpecResolver,
     batch_name: str | None = None,
     source_asset_requirements: str | None = None,
     adaptation_instruction: str | None = None,
 ) -> Tuple[ProductionBatch, List[ProductionAsset]]:
-    """
-    Core 'explosion' logic for the Production Matrix.
-
-    - Reads `platform_environments` from the Strategy row (e.g. ['META_STORY', 'DISPLAY_MPU']).
-    - For each environment ID, looks up a spec in SPEC_LIBRARY.
-    - Creates a ProductionAsset ticket with spec + directive context.
-    """
-    raw_envs = strategy.platform_environments or []
-    env_ids = _normalize_environment_ids(raw_envs)
+    env_ids = resolver.env_ids(strategy.platform_environments or [])
 
     batch = ProductionBatch(
         campaign_id=campaign_id,
@@ -106,12 +89,11 @@ def generate_production_plan(
         concept_id=concept.id,
         batch_name=batch_name or f"{strategy.segment_name} – {concept.name}",
     )
-    _BATCHES[batch.id] = batch
 
     assets: List[ProductionAsset] = []
 
     for env_id in env_ids:
-        spec = get_spec_by_id(env_id)
+        spec = resolver.spec(env_id)
         if not spec:
             continue
 
@@ -140,33 +122,94 @@ def generate_production_plan(
             adaptation_instruction=adaptation_instruction,
         )
 
-        _ASSETS[asset.id] = asset
         assets.append(asset)
 
     return batch, assets
 
 
-def get_batch(batch_id: str) -> tuple[ProductionBatch | None, List[ProductionAsset]]:
-    """
-    Retrieve a ProductionBatch and all associated assets.
+def generate_production_plan(
+    campaign_id: str,
+    strategy: StrategicMatrixRow,
+    concept: CreativeConcept,
+    batch_name: str | None = None,
+    source_asset_requirements: str | None = None,
+    adaptation_instruction: str | None = None,
+) -> Tuple[ProductionBatch, List[ProductionAsset]]:
     """
-    batch = _BATCHES.get(batch_id)
-    if not batch:
-        return None, []
+    Core 'explosion' logic for the Production Matrix.
 
-    assets = [a for a in _ASSETS.values() if a.batch_id == batch_id]
+    - Reads `platform_environments` from the Strategy row (e.g. ['META_STORY', 'DISPLAY_MPU']).
+    - For each environment ID, looks up a spec in SPEC_LIBRARY.
+    - Creates a ProductionAsset ticket with spec + directive context.
+    """
+    batch, assets = _explode(
+        campaign_id,
+        strategy,
+        concept,
+        _SpecResolver(),
+        batch_name=batch_name,
+        source_asset_requirements=source_asset_requirements,
+        adaptation_instruction=adaptation_instruction,
+    )
+    get_production_store().save_plan(batch, assets)
     return batch, assets
 
 
+def generate_production_plans(
+    campaign_id: str,
+    strategies: List[StrategicMatrixRow],
+    concepts: List[CreativeConcept],
+    source_asset_requirements: str | None = None,
+    adaptation_instruction: str | None = None,
+) -> List[Tuple[ProductionBatch, List[ProductionAsset]]]:
+    """
+    Bulk explosion: one batch per (strategy row, concept) pair, segment-major.
+
+    Environment normalisation and spec lookups are shared across the whole
+    grid, and every batch + asset is written to the store in one transaction.
+    """
+    resolver = _SpecResolver()
+    plans = [
+        _explode(
+            campaign_id,
+            strategy,
+            concept,
+            resolver,
+            source_asset_requirements=source_asset_requirements,
+            adaptation_instruction=adaptation_instruction,
+        )
+        for strategy in strategies
+        for concept in concepts
+    ]
+    get_production_store().save_plans(plans)
+    return plans
+
+
+def get_batch(batch_id: str, status: str | None = None) -> tuple[ProductionBatch | None, List[ProductionAsset]]:
+    """
+    Retrieve a ProductionBatch and its assets (optionally only one status column).
+    """
+    return get_production_store().get_batch(batch_id, status)
+
+
+def get_batch_status_counts(batch_id: str) -> Dict[str, int] | None:
+    """
+    Kanban column counts for a batch ({status: n}); None if the batch is unknown.
+    """
+    return get_production_store().status_counts(batch_id)
+
+
+def list_campaign_batches(campaign_id: str) -> List[ProductionBatch]:
+    """
+    All ProductionBatches generated for a campaign, oldest first.
+    """
+    return get_production_store().list_batches(campaign_id)
+
+
 def update_asset_status(asset_id: str, status: str) -> ProductionAsset | None:
     """
     Update the workflow status of a given ProductionAsset.
     """
-    asset = _ASSETS.get(asset_id)
-    if not asset:
-        return None
-    asset.status = status
-    _ASSETS[asset_id] = asset
-    return asset
+    return get_production_store().update_asset_status(asset_id, status)
 
 
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+"""
+Persistence for Production Matrix batches and assets.
+
+Backends:
+  - SQLiteProductionStore: WAL-mode SQLite file shared by every gunicorn worker
+    on the host (default; PRODUCTION_DB, falling back to <tmpdir>/production.db).
+  - MemoryProductionStore: per-process dicts for tests and throwaway demos
+    (PRODUCTION_STORE=memory).
+
+Both expose the same methods; status updates are atomic read-modify-write
+transactions so concurrent kanban moves cannot interleave. Both keep
+secondary indexes (campaign -> batches, batch -> assets, (batch, status) ->
+assets, and per-batch status counts) in step with every insert and status
+change, so board reads never scan unrelated assets.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from app.models.production_matrix import ProductionAsset, ProductionBatch
+
+
+Plan = Tuple[ProductionBatch, List[ProductionAsset]]
+
+
+class AssetIndex:
+    """
+    Secondary indexes over production assets.
+
+    Dicts are used as insertion-ordered sets so listings keep creation
+    order. Not thread-safe on its own; the owning store holds the lock.
+    """
+
+    def __init__(self) -> None:
+        self.campaign_batches: Dict[str, Dict[str, None]] = {}
+        self.batch_assets: Dict[str, Dict[str, None]] = {}
+        self.batch_status_assets: Dict[Tuple[str, str], Dict[str, None]] = {}
+        self.batch_status_counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, batch_id: str, status: str, delta: int) -> None:
+        counts = self.batch_status_counts.setdefault(batch_id, {})
+        counts[status] = counts.get(status, 0) + delta
+        if counts[status] <= 0:
+            del counts[status]
+
+    def add_batch(self, batch: ProductionBatch) -> None:
+        self.campaign_batches.setdefault(batch.campaign_id, {})[batch.id] = None
+        self.batch_assets.setdefault(batch.id, {})
+
+    def add_asset(self, asset: ProductionAsset) -> None:
+        self.batch_assets.setdefault(asset.batch_id, {})[asset.id] = None
+        self.batch_status_assets.setdefault((asset.batch_id, asset.status), {})[asset.id] = None
+        self._count(asset.batch_id, asset.status, 1)
+
+    def move_asset(self, asset: ProductionAsset, old_status: str) -> None:
+        if old_status == asset.status:
+            return
+        bucket = self.batch_status_assets.get((asset.batch_id, old_status))
+        if bucket is not None:
+            bucket.pop(asset.id, None)
+            if not bucket:
+                del self.batch_status_assets[(asset.batch_id, old_status)]
+        self.batch_status_assets.setdefault((asset.batch_id, asset.status), {})[asset.id] = None
+        self._count(asset.batch_id, old_status, -1)
+        self._count(asset.batch_id, asset.status, 1)
+
+    def asset_ids(self, batch_id: str, status: str | None = None) -> List[str]:
+        if status is None:
+            return list(self.batch_assets.get(batch_id, ()))
+        return list(self.batch_status_assets.get((batch_id, status), ()))
+
+    def batch_ids(self, campaign_id: str) -> List[str]:
+        return list(self.campaign_batches.get(campaign_id, ()))
+
+    def status_counts(self, batch_id: str) -> Dict[str, int]:
+        return dict(self.batch_status_counts.get(batch_id, {}))
+
+
+class MemoryProductionStore:
+    """In-process store (lost on restart, not shared by workers)."""
+
+    def __init__(self) -> None:
+        self._batches: Dict[str, ProductionBatch] = {}
+        self._assets: Dict[str, ProductionAsset] = {}
+        self._index = AssetIndex()
+        self._lock = threading.Lock()
+
+    def save_plans(self, plans: Iterable[Plan]) -> None:
+        plans = list(plans)
+        with self._lock:
+            # Check first so a rejected call leaves nothing half-written.
+            for _, assets in plans:
+                for asset in assets:
+                    if asset.id in self._assets:
+                        raise ValueError(f"Asset {asset.id} already exists")
+            for batch, assets in plans:
+                self._batches[batch.id] = batch.model_copy()
+                self._index.add_batch(batch)
+                for asset in assets:
+                    self._assets[asset.id] = asset.model_copy()
+                    self._index.add_asset(asset)
+
+    def save_plan(self, batch: ProductionBatch, assets: List[ProductionAsset]) -> None:
+        self.save_plans([(batch, assets)])
+
+    def get_batch(
+        self, batch_id: str, status: str | None = None
+    ) -> Tuple[ProductionBatch | None, List[ProductionAsset]]:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None, []
+            assets = [self._assets[aid].model_copy() for aid in self._index.asset_ids(batch_id, status)]
+        return batch.model_copy(), assets
+
+    def list_batches(self, campaign_id: str) -> List[ProductionBatch]:
+        with self._lock:
+            return [self._batches[bid].model_copy() for bid in self._index.batch_ids(campaign_id)]
+
+    def status_counts(self, batch_id: str) -> Dict[str, int] | None:
+        with self._lock:
+            if batch_id not in self._batches:
+                return None
+            return self._index.status_counts(batch_id)
+
+    def update_asset_status(self, asset_id: str, status: str) -> ProductionAsset | None:
+        with self._lock:
+            asset = self._assets.get(asset_id)
+            if asset is None:
+                return None
+            old_status = asset.status
+            asset.status = status
+            self._index.move_asset(asset, old_status)
+            return asset.model_copy()
+
+
+class SQLiteProductionStore:
+    """WAL-mode SQLite store shared by all workers on the host."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS production_batches (
+                id TEXT PRIMARY KEY,
+                campaign_id TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS production_batches_campaign ON production_batches (campaign_id);
+            CREATE TABLE IF NOT EXISTS production_assets (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                batch_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS production_assets_batch_status ON production_assets (batch_id, status);
+            CREATE INDEX IF NOT EXISTS production_assets_status ON production_assets (status);
+            CREATE TABLE IF NOT EXISTS production_status_counts (
+                batch_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (batch_id, status)
+            ) WITHOUT ROWID;
+            """
+        )
+        # Databases written before the counts table existed start with it
+        # empty; rebuild it once from the assets themselves.
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM production_status_counts LIMIT 1").fetchone() is None:
+                conn.execute(
+                    "INSERT INTO production_status_counts (batch_id, status, n)"
+                    " SELECT batch_id, status, COUNT(*) FROM production_assets GROUP BY batch_id, status"
+                )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so read-modify-write
+            # sequences cannot interleave across workers.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, rows: Iterable[Tuple[str, str, int]]) -> None:
+        conn.executemany(
+            "INSERT INTO production_status_counts (batch_id, status, n) VALUES (?, ?, ?)"
+            " ON CONFLICT (batch_id, status) DO UPDATE SET n = n + excluded.n",
+            rows,
+        )
+
+    def save_plans(self, plans: Iterable[Plan]) -> None:
+        batch_rows = []
+        asset_rows = []
+        counts: Dict[Tuple[str, str], int] = {}
+        for batch, assets in plans:
+            batch_rows.append((batch.id, batch.campaign_id, batch.model_dump_json()))
+            for a in assets:
+                asset_rows.append((a.id, a.batch_id, a.status, a.model_dump_json()))
+                counts[(a.batch_id, a.status)] = counts.get((a.batch_id, a.status), 0) + 1
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO production_batches (id, campaign_id, data) VALUES (?, ?, ?)", batch_rows
+            )
+            # Plain INSERT: asset IDs are unique, and the status counts rely on it.
+            conn.executemany(
+                "INSERT INTO production_assets (id, batch_id, status, data) VALUES (?, ?, ?, ?)", asset_rows
+            )
+            self._bump(conn, ((b, st, n) for (b, st), n in counts.items()))
+
+    def save_plan(self, batch: ProductionBatch, assets: List[ProductionAsset]) -> None:
+        self.save_plans([(batch, assets)])
+
+    def get_batch(
+        self, batch_id: str, status: str | None = None
+    ) -> Tuple[ProductionBatch | None, List[ProductionAsset]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM production_batches WHERE id = ?", (batch_id,)).fetchone()
+            if not row:
+                return None, []
+            if status is None:
+                asset_rows = self._conn.execute(
+                    "SELECT data FROM production_assets WHERE batch_id = ? ORDER BY seq", (batch_id,)
+                ).fetchall()
+            else:
+                asset_rows = self._conn.execute(
+                    "SELECT data FROM production_assets WHERE batch_id = ? AND status = ? ORDER BY seq",
+                    (batch_id, status),
+                ).fetchall()
+        return (
+            ProductionBatch.model_validate_json(row[0]),
+            [ProductionAsset.model_validate_json(r[0]) for r in asset_rows],
+        )
+
+    def list_batches(self, campaign_id: str) -> List[ProductionBatch]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM production_batches WHERE campaign_id = ? ORDER BY rowid", (campaign_id,)
+            ).fetchall()
+        return [ProductionBatch.model_validate_json(r[0]) for r in rows]
+
+    def status_counts(self, batch_id: str) -> Dict[str, int] | None:
+        with self._lock:
+            if not self._conn.execute("SELECT 1 FROM production_batches WHERE id = ?", (batch_id,)).fetchone():
+                return None
+            rows = self._conn.execute(
+                "SELECT status, n FROM production_status_counts WHERE batch_id = ? AND n > 0", (batch_id,)
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+    def update_asset_status(self, asset_id: str, status: str) -> ProductionAsset | None:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM production_assets WHERE id = ?", (asset_id,)).fetchone()
+            if not row:
+                return None
+            asset = ProductionAsset.model_validate_json(row[0])
+            old_status = asset.status
+            asset.status = status
+            conn.execute(
+                "UPDATE production_assets SET status = ?, data = ? WHERE id = ?",
+                (status, asset.model_dump_json(), asset_id),
+            )
+            if old_status != status:
+                self._bump(conn, [(asset.batch_id, old_status, -1), (asset.batch_id, status, 1)])
+        return asset
+
+
+_STORE: MemoryProductionStore | SQLiteProductionStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_production_store() -> MemoryProductionStore | SQLiteProductionStore:
+    """Return the process-wide production store, chosen from the environment."""
+    global _STORE
+
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                if os.getenv("PRODUCTION_STORE", "sqlite").lower() == "memory":
+                    _STORE = MemoryProductionStore()
+                else:
+                    path = os.getenv("PRODUCTION_DB") or os.path.join(tempfile.gettempdir(), "production.db")
+                    _STORE = SQLiteProductionStore(path)
+    return _STORE
+
+
+def set_production_store(store: MemoryProductionStore | SQLiteProductionStore | None) -> None:
+    """Swap the process-wide store (e.g. a MemoryProductionStore in tests)."""
+    global _STORE
+    _STORE = store
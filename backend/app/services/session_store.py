@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+"""
+Server-side brief sessions.
+
+A session keeps the ModConBrief state and the chat history on the server so
+clients only send the new message (or a JSON-Patch of manual edits) per turn.
+
+Backends:
+  - MemorySessionStore: per-process LRU, used when no database is configured.
+  - SQLiteSessionStore: WAL-mode SQLite file, shared across gunicorn workers
+    and surviving restarts. Enabled with BRIEF_SESSION_DB=/path/to/sessions.db.
+
+Every save bumps a version number; saving a stale copy raises
+SessionConflictError so two concurrent turns cannot silently overwrite
+each other.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+from pydantic import BaseModel, Field
+
+from app.schemas.brief import ModConBrief
+
+
+class BriefSession(BaseModel):
+    session_id: str = Field(default_factory=lambda: str(uuid4()))
+    state: ModConBrief = Field(default_factory=ModConBrief)
+    chat_log: List[Dict[str, str]] = []
+    version: int = 0
+    updated_at: float = Field(default_factory=time.time)
+
+
+class SessionConflictError(RuntimeError):
+    """The session was modified by another request since it was loaded."""
+
+
+class MemorySessionStore:
+    """In-process LRU of sessions (lost on restart, not shared by workers)."""
+
+    def __init__(self, max_sessions: int = 1000) -> None:
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> BriefSession | None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions.move_to_end(session_id)
+        # Stored serialised so callers never share mutable state.
+        return BriefSession.model_validate_json(entry[1])
+
+    def save(self, session: BriefSession) -> BriefSession:
+        with self._lock:
+            entry = self._sessions.get(session.session_id)
+            stored_version = entry[0] if entry is not None else 0
+            if stored_version != session.version:
+                raise SessionConflictError(f"Session {session.session_id} was updated concurrently")
+            saved = session.model_copy(update={"version": session.version + 1, "updated_at": time.time()})
+            self._sessions[session.session_id] = (saved.version, saved.model_dump_json())
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return saved
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+class SQLiteSessionStore:
+    """WAL-mode SQLite store shared by all workers on the host."""
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS brief_sessions ("
+            " session_id TEXT PRIMARY KEY, state TEXT NOT NULL, chat_log TEXT NOT NULL,"
+            " version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS brief_sessions_updated ON brief_sessions (updated_at)")
+
+    def get(self, session_id: str) -> BriefSession | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, chat_log, version, updated_at FROM brief_sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if not row:
+            return None
+        state, chat_log, version, updated_at = row
+        return BriefSession(
+            session_id=session_id,
+            state=ModConBrief.model_validate_json(state),
+            chat_log=json.loads(chat_log),
+            version=version,
+            updated_at=updated_at,
+        )
+
+    def save(self, session: BriefSession) -> BriefSession:
+        now = time.time()
+        state = session.state.model_dump_json()
+        chat_log = json.dumps(session.chat_log, separators=(",", ":"))
+        with self._lock:
+            if session.version == 0:
+                try:
+                    self._conn.execute(
+                        "INSERT INTO brief_sessions (session_id, state, chat_log, version, updated_at)"
+                        " VALUES (?, ?, ?, 1, ?)",
+                        (session.session_id, state, chat_log, now),
+                    )
+                except sqlite3.IntegrityError as e:
+                    raise SessionConflictError(f"Session {session.session_id} already exists") from e
+                # Opportunistic expiry of idle sessions on create.
+                self._conn.execute("DELETE FROM brief_sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+            else:
+                updated = self._conn.execute(
+                    "UPDATE brief_sessions SET state = ?, chat_log = ?, version = version + 1, updated_at = ?"
+                    " WHERE session_id = ? AND version = ?",
+                    (state, chat_log, now, session.session_id, session.version),
+                ).rowcount
+                if not updated:
+                    raise SessionConflictError(f"Session {session.session_id} was updated concurrently")
+        return session.model_copy(update={"version": session.version + 1, "updated_at": now})
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return bool(
+                self._conn.execute("DELETE FROM brief_sessions WHERE session_id = ?", (session_id,)).rowcount
+            )
+
+
+_STORE: MemorySessionStore | SQLiteSessionStore | None = None
+
+
+def get_session_store() -> MemorySessionStore | SQLiteSessionStore:
+    """Return the process-wide session store, chosen from the environment."""
+    global _STORE
+
+    if _STORE is None:
+        db_path = os.getenv("BRIEF_SESSION_DB")
+        if db_path:
+            _STORE = SQLiteSessionStore(db_path)
+        else:
+            _STORE = MemorySessionStore(max_sessions=int(os.getenv("BRIEF_SESSION_MAX", "1000")))
+    return _STORE
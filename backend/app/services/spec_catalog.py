@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+"""
+Compiled spec catalog.
+
+Merges the three spec sources into one normalised list of entries:
+  - data/platform_specs.json  (nested canonical platform library)
+  - data/specs.json + data/specs.log.jsonl (flat custom specs, see custom_spec_store.py)
+  - spec_library.SPEC_LIBRARY (legacy environment IDs such as META_STORY)
+
+Every entry carries precomputed width / height / dimensions / reduced aspect
+ratio / orientation so consumers never re-parse "1080x1920" strings or juggle
+`dimension` vs `dimensions` and `format_name` vs `placement`.
+
+The compiled catalog is pickled to a snapshot (data/spec_catalog.pickle, or
+SPEC_CATALOG_PATH) tagged with a fingerprint of the sources. Startup loads the
+snapshot when the fingerprint matches and recompiles otherwise. Run
+`python build_spec_catalog.py` at build time to ship a warm snapshot.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from math import gcd
+from typing import Any, Dict, List, Tuple
+
+from app.services.custom_spec_store import (
+    CUSTOM_SPECS_LOG_PATH,
+    CUSTOM_SPECS_PATH,
+    merge_custom_specs,
+    parse_spec_log,
+)
+from app.services.spec_library import LEGACY_EQUIVALENTS, SPEC_LIBRARY
+
+
+CATALOG_FORMAT = 1
+
+_DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data"))
+PLATFORM_SPECS_PATH = os.path.join(_DATA_DIR, "platform_specs.json")
+
+
+def snapshot_path() -> str:
+    return os.getenv("SPEC_CATALOG_PATH") or os.path.join(_DATA_DIR, "spec_catalog.pickle")
+
+
+def aspect_ratio_key(width: int, height: int) -> str:
+    """Reduced 'W:H' ratio (e.g. 1080x1920 -> '9:16'); '' when unknown."""
+    if width <= 0 or height <= 0:
+        return ""
+    d = gcd(width, height)
+    return f"{width // d}:{height // d}"
+
+
+def parse_dimensions(value: Any) -> Tuple[int, int]:
+    """'1080x1920' -> (1080, 1920); (0, 0) when unparseable."""
+    if isinstance(value, str) and "x" in value.lower():
+        try:
+            w_str, h_str = value.lower().split("x")
+            return int(w_str), int(h_str)
+        except ValueError:
+            pass
+    return 0, 0
+
+
+def _orientation(width: int, height: int) -> str:
+    if width <= 0 or height <= 0:
+        return ""
+    if width == height:
+        return "square"
+    return "vertical" if height > width else "horizontal"
+
+
+def _production_profile(media_type: str) -> Tuple[str, List[str], str, bool]:
+    """
+    Derive the legacy SPEC_LIBRARY production fields from a media_type:
+    (file_type, allowed_types, asset_type, is_html5_capable).
+    """
+    media = (media_type or "").lower()
+    tokens = media.split("_or_")
+    allowed: List[str] = []
+    for token in tokens:
+        if token == "video":
+            allowed.append("VIDEO")
+        elif token == "image":
+            allowed.append("STATIC")
+        elif token == "html5":
+            allowed.append("HTML5")
+    if not allowed:
+        allowed = ["STATIC"]
+
+    html5 = "HTML5" in allowed
+    files = {"VIDEO": "mp4", "STATIC": "jpg", "HTML5": "html5"}
+    file_type = "/".join(files[a] for a in sorted(allowed, key=["HTML5", "VIDEO", "STATIC"].index))
+    if html5:
+        asset_type = "html5"
+    elif tokens[0] == "video":
+        asset_type = "video"
+    else:
+        asset_type = "static"
+    return file_type, allowed, asset_type, html5
+
+
+def _entry(
+    spec_id: str,
+    source: str,
+    platform: str,
+    platform_id: str,
+    placement: str,
+    format_name: str,
+    width: int,
+    height: int,
+    orientation_label: str,
+    media_type: str,
+    notes: str | None,
+    **production: Any,
+) -> Dict[str, Any]:
+    file_type, allowed, asset_type, html5 = _production_profile(media_type)
+    return {
+        "id": spec_id,
+        "source": source,
+        "platform": platform,
+        "platform_id": platform_id,
+        "placement": placement,
+        "format_name": format_name,
+        "width": width,
+        "height": height,
+        "dimensions": f"{width}x{height}" if width and height else "",
+        "aspect_ratio": aspect_ratio_key(width, height),
+        "ratio": round(width / height, 6) if width and height else 0.0,
+        "orientation": _orientation(width, height),
+        "orientation_label": orientation_label,
+        "media_type": media_type,
+        "file_type": production.get("file_type") or file_type,
+        "allowed_types": production.get("allowed_types") or allowed,
+        "asset_type": production.get("asset_type") or asset_type,
+        "is_html5_capable": production.get("is_html5_capable", html5),
+        "max_duration": production.get("max_duration"),
+        "notes": notes,
+        "aliases": [],
+        "alias_of": None,
+    }
+
+
+def _slug(value: str) -> str:
+    return "".join(ch if ch.isalnum() else "_" for ch in value.lower()).strip("_")
+
+
+def compile_catalog(
+    platform_data: Dict[str, Any], custom_specs: List[Dict[str, Any]], library: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Merge the three sources into one catalog dict (plain builtins only, so it
+    pickles quickly and safely).
+    """
+    entries: List[Dict[str, Any]] = []
+
+    for platform_id, platform in (platform_data.get("platforms") or {}).items():
+        for fmt in platform.get("formats", []):
+            width, height = parse_dimensions(fmt.get("resolution_recommended", ""))
+            entries.append(
+                _entry(
+                    spec_id=f"{platform_id}_{fmt.get('id', '')}".upper(),
+                    source="platform",
+                    platform=platform.get("name", platform_id),
+                    platform_id=platform_id,
+                    placement=fmt.get("name", fmt.get("id", "")),
+                    format_name=fmt.get("name", fmt.get("id", "")),
+                    width=width,
+                    height=height,
+                    orientation_label=fmt.get("ratio", ""),
+                    media_type=fmt.get("media_type", "image_or_video"),
+                    notes=(fmt.get("safe_zones") or {}).get("instruction"),
+                    max_duration=fmt.get("max_duration_seconds"),
+                )
+            )
+
+    for item in custom_specs or []:
+        try:
+            width, height = int(item["width"]), int(item["height"])
+            entries.append(
+                _entry(
+                    spec_id=str(item["id"]),
+                    source="custom",
+                    platform=str(item["platform"]),
+                    platform_id=_slug(str(item["platform"])),
+                    placement=str(item["placement"]),
+                    format_name=str(item["placement"]),
+                    width=width,
+                    height=height,
+                    orientation_label=str(item["orientation"]),
+                    media_type=str(item["media_type"]),
+                    notes=item.get("notes"),
+                )
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    for legacy_id, spec in library.items():
+        width, height = parse_dimensions(spec.get("dimensions") or spec.get("dimension"))
+        allowed = spec.get("allowed_types") or []
+        media_type = "_or_".join(
+            {"VIDEO": "video", "STATIC": "image", "HTML5": "html5"}.get(a, a.lower()) for a in allowed
+        ) or "image"
+        entry = _entry(
+            spec_id=legacy_id,
+            source="library",
+            platform=spec.get("platform", legacy_id),
+            platform_id=_slug(spec.get("platform", legacy_id)),
+            placement=spec.get("placement", ""),
+            format_name=spec.get("format_name") or spec.get("format") or "",
+            width=width,
+            height=height,
+            orientation_label=spec.get("aspect_ratio", ""),
+            media_type=media_type,
+            notes=spec.get("safe_zone"),
+            file_type=spec.get("file_type"),
+            allowed_types=list(allowed),
+            asset_type=spec.get("asset_type"),
+            is_html5_capable=bool(spec.get("is_html5_capable")),
+            max_duration=spec.get("max_duration"),
+        )
+        # Keep the author's declared ratio label (e.g. "1.2:1") alongside the reduced one.
+        entry["aspect_ratio_label"] = spec.get("aspect_ratio", "")
+        entry["alias_of"] = LEGACY_EQUIVALENTS.get(legacy_id)
+        entries.append(entry)
+
+    by_id = {e["id"]: i for i, e in enumerate(entries) if e["source"] != "library"}
+    for entry in entries:
+        target = entry.get("alias_of")
+        if target in by_id:
+            entries[by_id[target]]["aliases"].append(entry["id"])
+
+    return {
+        "format": CATALOG_FORMAT,
+        "entries": entries,
+        "platform_data": platform_data,
+    }
+
+
+def _read_bytes(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def _parse(raw: bytes, default: Any) -> Any:
+    try:
+        return json.loads(raw.decode("utf-8")) if raw else default
+    except ValueError:
+        return default
+
+
+def _fingerprint(platform_raw: bytes, custom_raw: bytes, log_raw: bytes) -> str:
+    digest = hashlib.sha1()
+    digest.update(str(CATALOG_FORMAT).encode())
+    for raw in (platform_raw, custom_raw, log_raw):
+        digest.update(raw)
+        digest.update(b"\0")
+    digest.update(json.dumps(SPEC_LIBRARY, sort_keys=True).encode("utf-8"))
+    digest.update(json.dumps(LEGACY_EQUIVALENTS, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _compile_raw(platform_raw: bytes, custom_raw: bytes, log_raw: bytes) -> Dict[str, Any]:
+    custom_specs = merge_custom_specs(_parse(custom_raw, []) or [], parse_spec_log(log_raw))
+    catalog = compile_catalog(_parse(platform_raw, {"platforms": {}}), custom_specs, SPEC_LIBRARY)
+    catalog["fingerprint"] = _fingerprint(platform_raw, custom_raw, log_raw)
+    return catalog
+
+
+def build_catalog(
+    platform_path: str = PLATFORM_SPECS_PATH,
+    custom_path: str = CUSTOM_SPECS_PATH,
+    log_path: str = CUSTOM_SPECS_LOG_PATH,
+) -> Dict[str, Any]:
+    """Compile the catalog from the current sources (no snapshot involved)."""
+    return _compile_raw(_read_bytes(platform_path), _read_bytes(custom_path), _read_bytes(log_path))
+
+
+def write_snapshot(catalog: Dict[str, Any] | None = None, path: str | None = None) -> str:
+    """Atomically write the pickled catalog snapshot and return its path."""
+    catalog = catalog or build_catalog()
+    path = path or snapshot_path()
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".spec_catalog.", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return path
+
+
+def load_catalog(
+    platform_path: str = PLATFORM_SPECS_PATH,
+    custom_path: str = CUSTOM_SPECS_PATH,
+    log_path: str = CUSTOM_SPECS_LOG_PATH,
+) -> Dict[str, Any]:
+    """
+    Return the catalog, from the snapshot when it matches the current sources,
+    otherwise by compiling (and refreshing the snapshot when writable).
+    """
+    platform_raw = _read_bytes(platform_path)
+    custom_raw = _read_bytes(custom_path)
+    log_raw = _read_bytes(log_path)
+    fingerprint = _fingerprint(platform_raw, custom_raw, log_raw)
+
+    path = snapshot_path()
+    try:
+        with open(path, "rb") as f:
+            catalog = pickle.load(f)
+        if catalog.get("format") == CATALOG_FORMAT and catalog.get("fingerprint") == fingerprint:
+            return catalog
+    except Exception:
+        pass
+
+    catalog = _compile_raw(platform_raw, custom_raw, log_raw)
+    try:
+        write_snapshot(catalog, path)
+    except OSError:
+        # Read-only deploys still work; they just compile on each cold start.
+        pass
+    return catalog
+
+
+def legacy_view(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    SPEC_LIBRARY-shaped dict for an entry, as consumed by the production
+    matrix services (`dimensions`, `format_name`, `allowed_types`, ...).
+    """
+    return {
+        "platform": entry["platform"],
+        "placement": entry["placement"],
+        "format_name": entry["format_name"],
+        "dimensions": entry["dimensions"],
+        "aspect_ratio": entry.get("aspect_ratio_label") or entry["aspect_ratio"],
+        "max_duration": entry["max_duration"] or 0,
+        "file_type": entry["file_type"],
+        "allowed_types": list(entry["allowed_types"]),
+        "is_html5_capable": entry["is_html5_capable"],
+        "asset_type": entry["asset_type"],
+        "safe_zone": entry["notes"] or "",
+    }
@@ -85,15 +85,33 @@ SPEC_LIBRARY: Dict[str, Dict[str, Any]] = {
 }
 
 
+# Canonical platform_specs.json entry each legacy environment ID corresponds to.
+# The compiled spec catalog (spec_catalog.py) records these as aliases so the
+# legacy IDs and the canonical IDs resolve side by side.
+LEGACY_EQUIVALENTS: Dict[str, str] = {
+    "META_STORY": "META_STORIES_9X16",
+    "META_FEED": "META_FEED_4X5",
+    "YT_BUMPER": "YOUTUBE_BUMPER_16X9",
+    "DISPLAY_MPU": "GDN_MPU_300X250",
+    "DISPLAY_LEADER": "GDN_LEADERBOARD_728X90",
+}
+
+
 def get_spec_by_id(spec_id: str) -> Dict[str, Any] | None:
     """
     Return a spec profile by its environment / format ID.
 
+    Resolves against the compiled spec catalog, so both the legacy IDs above
+    and any platform / custom spec ID work; the result always has the
+    SPEC_LIBRARY shape (dimensions, format_name, allowed_types, ...).
+
     Example IDs:
       - META_STORY
       - META_FEED
       - DISPLAY_MPU
+      - TIKTOK_IN_FEED_9X16
     """
-    return SPEC_LIBRARY.get(spec_id)
-
+    # Imported lazily: the catalog compiler imports this module's tables.
+    from app.services.spec_registry import get_spec_registry
 
+    return get_spec_registry().legacy_spec(spec_id)
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+"""
+Process-wide, indexed spec registry.
+
+Serves the compiled spec catalog (see spec_catalog.py): platform specs, custom
+specs and the legacy SPEC_LIBRARY IDs, normalised into one entry shape, with
+Spec views and lookup indexes built once. The snapshot is rebuilt only when a
+source file's mtime changes (checked at most once per second) or on an
+explicit reload(), so request handlers never re-open or re-validate the JSON.
+"""
+
+import bisect
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from app.schemas.specs import Spec
+from app.services.spec_catalog import (
+    CUSTOM_SPECS_LOG_PATH,
+    CUSTOM_SPECS_PATH,
+    PLATFORM_SPECS_PATH,
+    aspect_ratio_key,
+    legacy_view,
+    load_catalog,
+)
+
+
+_MTIME_CHECK_INTERVAL = 1.0
+
+_ORIENTATION_SYNONYMS = {"portrait": "vertical", "landscape": "horizontal"}
+
+
+def parse_ratio(value: str) -> float | None:
+    """'9:16', '9x16', '1.2:1' or '0.5625' -> width / height; None if invalid."""
+    text = (value or "").strip().lower().replace("x", ":").replace("/", ":")
+    try:
+        if ":" in text:
+            w_str, h_str = text.split(":", 1)
+            w, h = float(w_str), float(h_str)
+            return w / h if w > 0 and h > 0 else None
+        ratio = float(text)
+        return ratio if ratio > 0 else None
+    except ValueError:
+        return None
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def _signature(path: str) -> Tuple[int, int]:
+    # Size as well as mtime: several appends can land within one mtime tick.
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (0, 0)
+
+
+def _spec_view(entry: Dict[str, Any]) -> Spec:
+    # Entries were validated when the catalog was compiled.
+    return Spec.model_construct(
+        id=entry["id"],
+        platform=entry["platform"],
+        placement=entry["placement"],
+        width=entry["width"],
+        height=entry["height"],
+        orientation=entry["orientation_label"],
+        media_type=entry["media_type"],
+        notes=entry["notes"],
+    )
+
+
+@dataclass
+class _Snapshot:
+    platform_data: Dict[str, Any]
+    entries: List[Dict[str, Any]]
+    platform_specs: List[Spec] = field(default_factory=list)
+    specs: List[Spec] = field(default_factory=list)
+    entry_by_id: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    entry_by_folded_id: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    by_id: Dict[str, Spec] = field(default_factory=dict)
+    by_platform: Dict[str, List[Spec]] = field(default_factory=dict)
+    by_dimensions: Dict[Tuple[int, int], List[Spec]] = field(default_factory=dict)
+    by_aspect_ratio: Dict[str, List[Spec]] = field(default_factory=dict)
+    by_media_type: Dict[str, List[Spec]] = field(default_factory=dict)
+    formats: Dict[Tuple[str, str], Dict[str, Any]] = field(default_factory=dict)
+    # Query indexes over positions in `specs` (see SpecRegistry.query).
+    pos_by_platform: Dict[str, Set[int]] = field(default_factory=dict)
+    pos_by_media_type: Dict[str, Set[int]] = field(default_factory=dict)
+    pos_by_orientation: Dict[str, Set[int]] = field(default_factory=dict)
+    ratio_sorted: List[Tuple[float, int]] = field(default_factory=list)
+    search_text: List[str] = field(default_factory=list)
+    version: str = ""
+    last_modified: float = 0.0
+
+    def index(self) -> None:
+        for entry in self.entries:
+            # Later entries (custom, then legacy) win on duplicate IDs.
+            self.entry_by_id[entry["id"]] = entry
+            self.entry_by_folded_id.setdefault(entry["id"].upper(), entry)
+            if entry["source"] == "library":
+                continue
+
+            spec = _spec_view(entry)
+            if entry["source"] == "platform":
+                self.platform_specs.append(spec)
+            pos = len(self.specs)
+            self.specs.append(spec)
+            for key in {spec.platform.lower(), entry["platform_id"].lower()}:
+                self.pos_by_platform.setdefault(key, set()).add(pos)
+            self.pos_by_media_type.setdefault(spec.media_type.lower(), set()).add(pos)
+            for key in {entry["orientation"], spec.orientation.lower()}:
+                if key:
+                    self.pos_by_orientation.setdefault(key, set()).add(pos)
+            if entry["ratio"]:
+                self.ratio_sorted.append((entry["ratio"], pos))
+            self.search_text.append(
+                " ".join(
+                    str(v)
+                    for v in (spec.id, spec.platform, spec.placement, entry["dimensions"], spec.media_type, spec.notes or "")
+                ).lower()
+            )
+            self.by_id[spec.id] = spec
+            self.by_platform.setdefault(spec.platform.lower(), []).append(spec)
+            self.by_dimensions.setdefault((spec.width, spec.height), []).append(spec)
+            if entry["aspect_ratio"]:
+                self.by_aspect_ratio.setdefault(entry["aspect_ratio"], []).append(spec)
+            self.by_media_type.setdefault(spec.media_type.lower(), []).append(spec)
+
+        self.ratio_sorted.sort()
+
+        for platform_id, platform in self.platform_data.get("platforms", {}).items():
+            for fmt in platform.get("formats", []):
+                self.formats[(platform_id, fmt.get("id", ""))] = fmt
+
+
+class SpecRegistry:
+    """
+    Indexed, lazily (re)loaded view over the compiled spec catalog.
+
+    Returned Spec objects and dicts are shared; treat them as read-only.
+    """
+
+    def __init__(self, platform_path: str, custom_path: str, log_path: str = CUSTOM_SPECS_LOG_PATH) -> None:
+        self.platform_path = platform_path
+        self.custom_path = custom_path
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._snapshot: _Snapshot | None = None
+        self._signatures: Tuple[Tuple[int, int], ...] = ()
+        self._checked_at = 0.0
+
+    def _current(self) -> _Snapshot:
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < _MTIME_CHECK_INTERVAL:
+            return snapshot
+
+        with self._lock:
+            signatures = tuple(_signature(p) for p in (self.platform_path, self.custom_path, self.log_path))
+            if self._snapshot is None or signatures != self._signatures:
+                self._snapshot = self._load()
+                self._signatures = signatures
+            self._checked_at = now
+            return self._snapshot
+
+    def _load(self) -> _Snapshot:
+        catalog = load_catalog(self.platform_path, self.custom_path, self.log_path)
+        snapshot = _Snapshot(platform_data=catalog["platform_data"], entries=catalog["entries"])
+        snapshot.index()
+        snapshot.version = catalog["fingerprint"][:16]
+        snapshot.last_modified = max(_mtime(p) for p in (self.platform_path, self.custom_path, self.log_path))
+        return snapshot
+
+    def reload(self) -> None:
+        """Force a rebuild on next access (e.g. right after a write)."""
+        with self._lock:
+            self._snapshot = None
+
+    @property
+    def version(self) -> str:
+        """Content fingerprint of the catalog sources."""
+        return self._current().version
+
+    @property
+    def last_modified(self) -> float:
+        """Newest source-file mtime (epoch seconds)."""
+        return self._current().last_modified
+
+    def platform_data(self) -> Dict[str, Any]:
+        return self._current().platform_data
+
+    def platform_format(self, platform_id: str, format_id: str) -> Dict[str, Any] | None:
+        return self._current().formats.get((platform_id, format_id))
+
+    def platform_specs(self) -> List[Spec]:
+        return list(self._current().platform_specs)
+
+    def all_specs(self) -> List[Spec]:
+        return list(self._current().specs)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Every catalog entry, including the legacy SPEC_LIBRARY IDs."""
+        return list(self._current().entries)
+
+    def entry(self, spec_id: str) -> Dict[str, Any] | None:
+        """
+        Resolve any spec ID to its catalog entry: exact match first, then a
+        case-insensitive match (e.g. 'meta_story', 'Tiktok_In_Feed_9x16').
+        """
+        snapshot = self._current()
+        found = snapshot.entry_by_id.get(spec_id)
+        if found is None and spec_id:
+            found = snapshot.entry_by_folded_id.get(spec_id.strip().upper())
+        return found
+
+    def legacy_spec(self, spec_id: str) -> Dict[str, Any] | None:
+        """SPEC_LIBRARY-shaped profile for any resolvable spec ID."""
+        found = self.entry(spec_id)
+        return legacy_view(found) if found is not None else None
+
+    def get(self, spec_id: str) -> Spec | None:
+        snapshot = self._current()
+        spec = snapshot.by_id.get(spec_id)
+        if spec is None:
+            found = self.entry(spec_id)
+            spec = _spec_view(found) if found is not None else None
+        return spec
+
+    def by_platform(self, platform: str) -> List[Spec]:
+        return list(self._current().by_platform.get(platform.lower(), []))
+
+    def by_dimensions(self, width: int, height: int) -> List[Spec]:
+        return list(self._current().by_dimensions.get((width, height), []))
+
+    def by_aspect_ratio(self, ratio: str) -> List[Spec]:
+        """Accepts '9:16' or any equivalent ratio such as '1080:1920'."""
+        try:
+            w, h = (int(part) for part in ratio.split(":"))
+            key = aspect_ratio_key(w, h)
+        except ValueError:
+            key = ratio
+        return list(self._current().by_aspect_ratio.get(key, []))
+
+    def by_media_type(self, media_type: str) -> List[Spec]:
+        return list(self._current().by_media_type.get(media_type.lower(), []))
+
+    def query(
+        self,
+        platform: str | None = None,
+        media_type: str | None = None,
+        orientation: str | None = None,
+        min_width: int | None = None,
+        max_width: int | None = None,
+        min_height: int | None = None,
+        max_height: int | None = None,
+        aspect_ratio: str | None = None,
+        ratio_tolerance: float = 0.01,
+        search: str | None = None,
+        after: int = -1,
+        limit: int | None = None,
+    ) -> Tuple[List[Spec], int | None]:
+        """
+        Filter the spec list using the snapshot indexes.
+
+        Results keep catalog order. `after` is the position of the last spec
+        already returned (keyset pagination); the second return value is the
+        position to pass as `after` for the next page, or None at the end.
+        """
+        snapshot = self._current()
+        candidates: List[Set[int]] = []
+
+        if platform:
+            candidates.append(snapshot.pos_by_platform.get(platform.strip().lower(), set()))
+        if media_type:
+            candidates.append(snapshot.pos_by_media_type.get(media_type.strip().lower(), set()))
+        if orientation:
+            key = orientation.strip().lower()
+            candidates.append(snapshot.pos_by_orientation.get(_ORIENTATION_SYNONYMS.get(key, key), set()))
+        if aspect_ratio:
+            target = parse_ratio(aspect_ratio)
+            if target is None:
+                raise ValueError(f"Invalid aspect_ratio: {aspect_ratio!r}")
+            tolerance = max(0.0, ratio_tolerance) * target
+            ratios = snapshot.ratio_sorted
+            lo = bisect.bisect_left(ratios, (target - tolerance, -1))
+            hi = bisect.bisect_right(ratios, (target + tolerance, len(snapshot.specs)))
+            candidates.append({pos for _, pos in ratios[lo:hi]})
+
+        positions: Iterable[int]
+        if candidates:
+            candidates.sort(key=len)
+            matched = set(candidates[0])
+            for other in candidates[1:]:
+                matched &= other
+            positions = sorted(p for p in matched if p > after)
+        else:
+            positions = range(after + 1, len(snapshot.specs))
+
+        terms = (search or "").lower().split()
+        results: List[Spec] = []
+        last_pos = after
+        for pos in positions:
+            spec = snapshot.specs[pos]
+            if min_width is not None and spec.width < min_width:
+                continue
+            if max_width is not None and spec.width > max_width:
+                continue
+            if min_height is not None and spec.height < min_height:
+                continue
+            if max_height is not None and spec.height > max_height:
+                continue
+            if terms and not all(term in snapshot.search_text[pos] for term in terms):
+                continue
+            if limit is not None and len(results) == limit:
+                # There is at least one more match: resume after the last one returned.
+                return results, last_pos
+            results.append(spec)
+            last_pos = pos
+        return results, None
+
+
+_REGISTRY: SpecRegistry | None = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_spec_registry() -> SpecRegistry:
+    global _REGISTRY
+
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = SpecRegistry(platform_path=PLATFORM_SPECS_PATH, custom_path=CUSTOM_SPECS_PATH)
+    return _REGISTRY
@@ -0,0 +1,551 @@
+from __future__ import annotations
+
+"""
+Server-side storage for uploaded CSV media plans.
+
+An upload is parsed straight from the spooled request file in blocks
+(pyarrow's streaming CSV reader), never as one decoded string or a list of
+per-row dicts:
+
+  - the encoding comes from the BOM, else the first block is tried as UTF-8,
+    then cp1252, then latin-1; the file is re-encoded to UTF-8 on the way
+    in, and bytes past the sniffed block that do not decode become U+FFFD
+    rather than failing the upload;
+  - the dialect (delimiter / quoting) is sniffed from that block, and the
+    header row is read with it (blank names become col_<n>, duplicates get a
+    numeric suffix);
+  - every cell is kept as text, exactly as the old /upload returned it, and
+    a type (integer, number, boolean, date, datetime or string) is inferred
+    per column batch by batch from the non-blank cells;
+  - rows whose cells are all blank are dropped, as before. Rows with the
+    wrong number of cells are kept, as before: short rows are padded with
+    blanks and extra cells go to col_<n> columns. pyarrow cannot do that, so
+    a file with such rows is re-read with the csv module (slower) and the
+    rows are counted.
+
+Batches go straight into an Arrow IPC file, one per upload handle, in a
+directory shared by all workers on the host. Reads memory-map that file,
+so a page of rows touches only the pages it needs.
+
+Environment knobs:
+  - UPLOAD_STORE_DIR         where plans are kept (default: <tmp>/media-plan-uploads)
+  - UPLOAD_STORE_MAX_MB      total size cap; least recently used go first (default 1024)
+  - UPLOAD_TTL_SECONDS       plans unused for this long are dropped (default 86400)
+"""
+
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, Iterator, List, Mapping, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+
+from app.schemas.uploads import UploadSelection
+
+
+# Bytes read up front for encoding / dialect sniffing and the text preview.
+SNIFF_BYTES = 64 * 1024
+# csv.Sniffer is regex-heavy; a few dozen lines are plenty.
+DIALECT_SAMPLE_CHARS = 8 * 1024
+PREVIEW_ROWS = 100
+# Rows turned into dicts at a time when a stored plan is read back in full.
+READ_BATCH_ROWS = 4096
+# Raw bytes decoded per read when re-encoding an upload to UTF-8.
+TRANSCODE_CHUNK_BYTES = 1024 * 1024
+# Rows per Arrow batch when a ragged file is parsed with the csv module.
+CSV_MODULE_BATCH_ROWS = 16 * 1024
+CONTENT_PREVIEW_CHARS = 5000
+
+_HANDLE_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Inferred column types, most specific first, with the pattern every
+# non-blank cell must match.
+_TYPE_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ("integer", r"^[+-]?\d+$"),
+    ("number", r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"),
+    ("boolean", r"(?i)^(true|false|yes|no|y|n)$"),
+    ("date", r"^(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4})$"),
+    ("datetime", r"^\d{4}-\d{1,2}-\d{1,2}[T ]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$"),
+)
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str = "string"
+    # Non-blank cells seen.
+    filled: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "type": self.type, "filled": self.filled}
+
+
+@dataclass
+class UploadedPlan:
+    """Metadata for one stored upload (kept next to its Arrow file)."""
+
+    handle: str
+    filename: str
+    encoding: str
+    delimiter: str
+    columns: List[ColumnInfo] = field(default_factory=list)
+    row_count: int = 0
+    # Rows with more or fewer cells than the header (padded / extended).
+    ragged_rows: int = 0
+    created_at: float = 0.0
+
+    @property
+    def headers(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "handle": self.handle,
+            "filename": self.filename,
+            "encoding": self.encoding,
+            "delimiter": self.delimiter,
+            "schema": [column.as_dict() for column in self.columns],
+            "row_count": self.row_count,
+            "ragged_rows": self.ragged_rows,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UploadedPlan":
+        return cls(
+            handle=data["handle"],
+            filename=data["filename"],
+            encoding=data["encoding"],
+            delimiter=data["delimiter"],
+            columns=[ColumnInfo(**column) for column in data["schema"]],
+            row_count=data["row_count"],
+            ragged_rows=data.get("ragged_rows", 0),
+            created_at=data.get("created_at", 0.0),
+        )
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """Python codec name for a sample of the file."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Incremental, so a multi-byte character cut off at the end is fine.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def sniff_dialect(text: str) -> type[csv.Dialect] | csv.Dialect:
+    """Dialect of a text sample; plain comma CSV when it cannot be told."""
+    lines = text[:DIALECT_SAMPLE_CHARS].splitlines()
+    # Drop a last line that may have been cut off mid-row.
+    sample = "\n".join(lines[:-1] if len(lines) > 1 else lines)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        return csv.excel
+
+
+def _header_names(cells: Sequence[str]) -> List[str]:
+    names: List[str] = []
+    seen: Dict[str, int] = {}
+    for idx, cell in enumerate(cells):
+        name = cell.strip() or f"col_{idx}"
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if not count else f"{name}_{count + 1}")
+    return names
+
+
+class _TypeInference:
+    """Narrows each column's candidate types batch by batch."""
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self.columns = [ColumnInfo(name) for name in names]
+        self._candidates = [[name for name, _ in _TYPE_PATTERNS] for _ in names]
+        self._patterns = dict(_TYPE_PATTERNS)
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        for i, column in enumerate(batch.columns):
+            trimmed = pc.utf8_trim_whitespace(column)
+            filled = trimmed.filter(pc.not_equal(trimmed, ""))
+            if not len(filled):
+                continue
+            self.columns[i].filled += len(filled)
+            self._candidates[i] = [
+                name
+                for name in self._candidates[i]
+                if pc.all(pc.match_substring_regex(filled, self._patterns[name])).as_py()
+            ]
+
+    def result(self) -> List[ColumnInfo]:
+        for column, candidates in zip(self.columns, self._candidates):
+            column.type = candidates[0] if column.filled and candidates else "string"
+        return self.columns
+
+
+def _drop_blank_rows(batch: pa.RecordBatch) -> pa.RecordBatch:
+    keep = None
+    for column in batch.columns:
+        filled = pc.not_equal(pc.utf8_trim_whitespace(column), "")
+        keep = filled if keep is None else pc.or_(keep, filled)
+    if keep is None or pc.all(keep).as_py():
+        return batch
+    return batch.filter(keep)
+
+
+class _Utf8Reader(io.RawIOBase):
+    """
+    Read-only stream of `raw` re-encoded from `encoding` to UTF-8. Bytes that
+    do not decode become U+FFFD, so one stray byte cannot fail an upload.
+    """
+
+    def __init__(self, raw: BinaryIO, encoding: str) -> None:
+        self._raw = raw
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._pending and not self._eof:
+            chunk = self._raw.read(TRANSCODE_CHUNK_BYTES)
+            self._eof = not chunk
+            self._pending = memoryview(self._decoder.decode(chunk, final=self._eof).encode("utf-8"))
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+class _RaggedRows(Exception):
+    """A row's cell count differs from the header's (pyarrow cannot keep it)."""
+
+
+def _arrow_batches(
+    stream: BinaryIO, encoding: str, dialect: Any, names: List[str]
+) -> Iterator[pa.RecordBatch]:
+    """Batches from pyarrow's streaming reader; raises _RaggedRows on a ragged row."""
+    ragged_seen: List[int] = []
+
+    def ragged(row: Any) -> str:
+        # Exceptions raised here are swallowed; flag the row and fail the read.
+        ragged_seen.append(row.number)
+        return "error"
+
+    try:
+        reader = pa_csv.open_csv(
+            _Utf8Reader(stream, encoding),
+            read_options=pa_csv.ReadOptions(column_names=names, skip_rows=1),
+            parse_options=pa_csv.ParseOptions(
+                delimiter=dialect.delimiter,
+                quote_char=dialect.quotechar or False,
+                double_quote=dialect.doublequote,
+                escape_char=dialect.escapechar or False,
+                newlines_in_values=True,
+                ignore_empty_lines=True,
+                invalid_row_handler=ragged,
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in names},
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        yield from reader
+    except pa.ArrowInvalid:
+        if ragged_seen:
+            raise _RaggedRows()
+        raise
+
+
+def _csv_rows(stream: BinaryIO, encoding: str, dialect: Any) -> Iterator[List[str]]:
+    """Data rows (header skipped) via the csv module, decoding leniently."""
+    stream.seek(0)
+    text = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    try:
+        reader = csv.reader(text, dialect)
+        next(reader, None)
+        yield from reader
+    finally:
+        text.detach()
+
+
+def _csv_module_batches(
+    stream: BinaryIO, encoding: str, dialect: Any, names: List[str], header_width: int, plan: UploadedPlan
+) -> Iterator[pa.RecordBatch]:
+    """
+    Batches of `names` (the header plus col_<n> for extra cells), short rows
+    padded with blanks; rows whose width differs from the header's are
+    counted in plan.ragged_rows.
+    """
+    width = len(names)
+    rows: List[List[str]] = []
+    for row in _csv_rows(stream, encoding, dialect):
+        if len(row) != header_width and row:
+            plan.ragged_rows += 1
+        rows.append(row + [""] * (width - len(row)))
+        if len(rows) >= CSV_MODULE_BATCH_ROWS:
+            yield pa.record_batch([pa.array(col, pa.string()) for col in zip(*rows)], names=names)
+            rows = []
+    if rows:
+        yield pa.record_batch([pa.array(col, pa.string()) for col in zip(*rows)], names=names)
+
+
+class UploadRows:
+    """
+    Re-iterable view of a stored plan's rows (dicts, header -> cell text)
+    after a row range and value filters. Rows are materialised one Arrow
+    batch at a time, so iterating is memory-bounded however big the plan.
+    """
+
+    def __init__(self, table: pa.Table) -> None:
+        self.table = table
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for batch in self.table.to_batches(max_chunksize=READ_BATCH_ROWS):
+            yield from batch.to_pylist()
+
+
+class UploadStore:
+    """Directory of uploaded plans: <handle>.arrow plus <handle>.json metadata."""
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, handle: str, suffix: str) -> str:
+        if not _HANDLE_RE.match(handle or ""):
+            raise KeyError(handle)
+        return os.path.join(self.directory, f"{handle}{suffix}")
+
+    def ingest_csv(self, stream: BinaryIO, filename: str) -> Tuple[UploadedPlan, List[Dict[str, Any]], str]:
+        """
+        Parse and store a CSV upload. Returns the plan metadata, the first
+        PREVIEW_ROWS rows and the start of the decoded text.
+        """
+        sample = stream.read(SNIFF_BYTES)
+        stream.seek(0)
+        encoding = sniff_encoding(sample)
+        text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, final=False)
+        dialect = sniff_dialect(text)
+        header = next(csv.reader(io.StringIO(text), dialect), [])
+        names = _header_names(header)
+
+        handle = uuid.uuid4().hex
+        plan = UploadedPlan(
+            handle=handle,
+            filename=filename,
+            encoding=encoding,
+            delimiter=dialect.delimiter,
+            created_at=time.time(),
+        )
+        preview: List[Dict[str, Any]] = []
+        if not names:
+            plan.columns = []
+            self._write_meta(plan)
+            pa_ipc.new_file(self._path(handle, ".arrow"), pa.schema([])).close()
+            return plan, preview, text[:CONTENT_PREVIEW_CHARS]
+
+        final_path = self._path(handle, ".arrow")
+        partial_path = final_path + ".partial"
+        try:
+            try:
+                columns = self._write_batches(
+                    partial_path, names, _arrow_batches(stream, encoding, dialect, names), plan, preview
+                )
+            except _RaggedRows:
+                # Re-read with the csv module: one pass for the widest row,
+                # then the rows, padded to that width.
+                width = max((len(row) for row in _csv_rows(stream, encoding, dialect)), default=0)
+                names = _header_names(header + [""] * (width - len(header)))
+                plan.row_count = 0
+                preview.clear()
+                batches = _csv_module_batches(stream, encoding, dialect, names, len(header), plan)
+                columns = self._write_batches(partial_path, names, batches, plan, preview)
+            os.replace(partial_path, final_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        plan.columns = columns
+        self._write_meta(plan)
+        self._evict(keep=handle)
+        return plan, preview, text[:CONTENT_PREVIEW_CHARS]
+
+    @staticmethod
+    def _write_batches(
+        path: str,
+        names: List[str],
+        batches: Iterator[pa.RecordBatch],
+        plan: UploadedPlan,
+        preview: List[Dict[str, Any]],
+    ) -> List[ColumnInfo]:
+        """Write non-blank rows to an Arrow IPC file; returns the inferred columns."""
+        inference = _TypeInference(names)
+        with pa_ipc.new_file(path, pa.schema([(name, pa.string()) for name in names])) as writer:
+            for batch in batches:
+                batch = _drop_blank_rows(batch)
+                if not batch.num_rows:
+                    continue
+                inference.update(batch)
+                writer.write_batch(batch)
+                plan.row_count += batch.num_rows
+                if len(preview) < PREVIEW_ROWS:
+                    preview.extend(batch.slice(0, PREVIEW_ROWS - len(preview)).to_pylist())
+        return inference.result()
+
+    def _write_meta(self, plan: UploadedPlan) -> None:
+        with open(self._path(plan.handle, ".json"), "w", encoding="utf-8") as f:
+            json.dump(plan.as_dict(), f)
+
+    def get(self, handle: str) -> UploadedPlan | None:
+        try:
+            path = self._path(handle, ".json")
+            with open(path, "r", encoding="utf-8") as f:
+                plan = UploadedPlan.from_dict(json.load(f))
+        except (KeyError, OSError, ValueError):
+            return None
+        # Reads count as use for the LRU / TTL.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return plan
+
+    def table(self, handle: str) -> pa.Table | None:
+        """The stored plan as a memory-mapped Arrow table (string columns)."""
+        try:
+            source = pa.memory_map(self._path(handle, ".arrow"), "r")
+        except (KeyError, OSError):
+            return None
+        return pa_ipc.open_file(source).read_all()
+
+    def rows(
+        self,
+        handle: str,
+        offset: int = 0,
+        limit: int = PREVIEW_ROWS,
+    ) -> List[Dict[str, Any]] | None:
+        """One page of rows as dicts (header -> cell text), or None for an unknown handle."""
+        table = self.table(handle)
+        if table is None:
+            return None
+        return table.slice(offset, limit).to_pylist()
+
+    def select(
+        self,
+        handle: str,
+        offset: int = 0,
+        limit: int | None = None,
+        filters: Mapping[str, Sequence[str]] | None = None,
+    ) -> UploadRows:
+        """
+        Rows [offset, offset + limit) of a stored plan, then only those whose
+        cell in each `filters` column is one of its values. Raises KeyError
+        for an unknown handle and ValueError for an unknown filter column.
+        """
+        table = self.table(handle) if self.get(handle) is not None else None
+        if table is None:
+            raise KeyError(handle)
+        if offset or limit is not None:
+            table = table.slice(offset, limit)
+        mask = None
+        for column, values in (filters or {}).items():
+            if column not in table.column_names:
+                raise ValueError(f"Unknown column '{column}' in filters (expected one of: {', '.join(table.column_names)})")
+            keep = pc.is_in(table[column], value_set=pa.array([str(v) for v in values], pa.string()))
+            mask = keep if mask is None else pc.and_(mask, keep)
+        if mask is not None:
+            table = table.filter(mask)
+        return UploadRows(table)
+
+    def _evict(self, keep: str) -> None:
+        """Drop expired plans, then least recently used ones over the size cap."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                handle = name[: -len(".json")]
+                try:
+                    used = os.path.getmtime(self._path(handle, ".json"))
+                    size = os.path.getsize(self._path(handle, ".arrow"))
+                except (KeyError, OSError):
+                    continue
+                entries.append((used, handle, size))
+            entries.sort()
+            total = sum(size for _, _, size in entries)
+            for used, handle, size in entries:
+                if handle == keep:
+                    continue
+                if now - used <= self.ttl_seconds and total <= self.max_bytes:
+                    continue
+                self.delete(handle)
+                total -= size
+
+    def delete(self, handle: str) -> None:
+        for suffix in (".json", ".arrow"):
+            try:
+                os.remove(self._path(handle, suffix))
+            except (KeyError, OSError):
+                pass
+
+
+_STORE: UploadStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """Return the process-wide upload store, configured from the environment."""
+    global _STORE
+
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = UploadStore(
+                    directory=os.getenv("UPLOAD_STORE_DIR")
+                    or os.path.join(tempfile.gettempdir(), "media-plan-uploads"),
+                    max_bytes=int(float(os.getenv("UPLOAD_STORE_MAX_MB", "1024")) * 1024 * 1024),
+                    ttl_seconds=float(os.getenv("UPLOAD_TTL_SECONDS", "86400")),
+                )
+    return _STORE
+
+
+def select_upload(selection: UploadSelection) -> UploadRows:
+    """UploadStore.select for a request's UploadSelection (KeyError / ValueError as there)."""
+    return get_upload_store().select(
+        selection.handle,
+        offset=selection.offset,
+        limit=selection.limit,
+        filters=selection.filters,
+    )
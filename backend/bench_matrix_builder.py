@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+"""
+Benchmark for MatrixBuilder campaign grouping.
+
+Scenario:
+  - 10,000 synthetic specs spread over ~200 dimension / file-type combos
+  - 50 creative concepts
+
+Times, on the same selection:
+  - baseline: the dict-per-spec grouper MatrixBuilder shipped with before
+    the columnar rewrite, copied below as `_baseline_group`, called once per
+    concept (the old request pattern)
+  - the current group_specs_by_creative, also once per concept (it now
+    builds a SpecColumns view on every call)
+  - a single group_campaign pass over a prebuilt SpecColumns
+  - the aspect-ratio consolidation pass (consolidate_campaign)
+
+Usage:
+  python bench_matrix_builder.py [n_specs] [n_concepts]
+"""
+
+import random
+import sys
+import time
+from typing import Dict, List
+
+from app.schemas.production_matrix import DeliveryDestination, ProductionJob
+from app.services.matrix_builder import MatrixBuilder, SpecColumns
+
+
+def _baseline_group(selected_specs: List[Dict], creative_concept: str) -> List[ProductionJob]:
+    """The pre-columnar MatrixBuilder.group_specs_by_creative, kept verbatim for comparison."""
+    grouped_jobs: Dict[str, ProductionJob] = {}
+
+    for idx, spec in enumerate(selected_specs):
+        dimensions = spec.get("dimensions")
+        if not dimensions:
+            w = spec.get("width")
+            h = spec.get("height")
+            if w and h:
+                dimensions = f"{w}x{h}"
+
+        file_type = spec.get("file_type") or spec.get("media_type") or "asset"
+        aspect_ratio = spec.get("aspect_ratio") or spec.get("orientation") or ""
+
+        platform_name = spec.get("platform_name") or spec.get("platform") or "Unknown"
+        spec_id = spec.get("id") or spec.get("spec_id") or f"SPEC-{idx+1}"
+        format_name = spec.get("format_name") or spec.get("placement") or ""
+
+        safe_notes = spec.get("safe_zone_notes") or spec.get("notes") or spec.get("safe_zone") or "Standard"
+        max_duration = spec.get("max_duration")
+
+        key_dimensions = dimensions or "GENERIC"
+        key_file = file_type or "asset"
+        group_key = f"{key_dimensions}_{key_file}_{creative_concept}"
+
+        if group_key not in grouped_jobs:
+            tech_parts = [key_dimensions]
+            if max_duration:
+                tech_parts.append(f"{max_duration}s")
+            tech_parts.append(file_type.upper())
+            technical_summary = ", ".join(tech_parts)
+
+            grouped_jobs[group_key] = ProductionJob(
+                job_id=f"JOB-{len(grouped_jobs) + 1}",
+                creative_concept=creative_concept,
+                asset_type=f"{aspect_ratio or key_dimensions} {file_type}".strip(),
+                technical_summary=technical_summary,
+                destinations=[],
+            )
+
+        grouped_jobs[group_key].destinations.append(
+            DeliveryDestination(
+                platform_name=platform_name,
+                spec_id=spec_id,
+                format_name=format_name or key_dimensions,
+                special_notes=safe_notes,
+            )
+        )
+
+    return list(grouped_jobs.values())
+
+
+def _synthetic_specs(n: int) -> list[dict]:
+    rng = random.Random(7)
+    sizes = [(w, h) for w in (300, 320, 728, 970, 1080, 1200, 1920) for h in (50, 90, 250, 600, 1080, 1350, 1920)]
+    media = ["video", "image", "image_or_video", "image_or_html5"]
+    specs = []
+    for i in range(n):
+        w, h = rng.choice(sizes)
+        specs.append(
+            {
+                "id": f"SPEC_{i}",
+                "platform": f"Platform {i % 40}",
+                "placement": f"Placement {i % 300}",
+                "width": w,
+                "height": h,
+                "orientation": "vertical" if h > w else "horizontal",
+                "media_type": rng.choice(media),
+                "notes": None,
+            }
+        )
+    return specs
+
+
+def main() -> None:
+    n_specs = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_concepts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    specs = _synthetic_specs(n_specs)
+    concepts = [f"Concept {i}" for i in range(n_concepts)]
+    builder = MatrixBuilder()
+
+    start = time.perf_counter()
+    baseline = [job for c in concepts for job in _baseline_group(specs, c)]
+    baseline_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    per_concept = [job for c in concepts for job in builder.group_specs_by_creative(specs, c)]
+    per_concept_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = SpecColumns.from_specs(specs)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    campaign = builder.group_campaign(columns, range(len(columns)), concepts)
+    campaign_s = time.perf_counter() - start
+
+    assert len(baseline) == len(per_concept) == len(campaign)
+    print(f"{n_specs} specs x {n_concepts} concepts -> {len(campaign)} jobs")
+    print(f"  baseline, per concept: {baseline_s * 1000:8.1f} ms")
+    print(f"  current, per concept:  {per_concept_s * 1000:8.1f} ms")
+    print(f"  columnar view (once):  {build_s * 1000:8.1f} ms")
+    print(f"  group_campaign:        {campaign_s * 1000:8.1f} ms")
+
+    start = time.perf_counter()
+    consolidated = builder.consolidate_campaign(columns, range(len(columns)), concepts)
+    consolidate_s = time.perf_counter() - start
+    print(f"  consolidate_campaign:  {consolidate_s * 1000:8.1f} ms ({len(consolidated)} jobs)")
+
+
+if __name__ == "__main__":
+    main()
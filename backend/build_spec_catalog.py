@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+"""
+Build-time compiler for the spec catalog.
+
+Merges data/platform_specs.json, data/specs.json and the legacy SPEC_LIBRARY
+into one normalised catalog and writes the pickled snapshot the API loads at
+startup (data/spec_catalog.pickle, or SPEC_CATALOG_PATH).
+
+Usage:
+  python build_spec_catalog.py
+"""
+
+from collections import Counter
+
+from app.services.spec_catalog import build_catalog, write_snapshot
+
+
+def main() -> None:
+    catalog = build_catalog()
+    path = write_snapshot(catalog)
+    sources = Counter(entry["source"] for entry in catalog["entries"])
+    print(f"Wrote {len(catalog['entries'])} specs to {path}")
+    print(f"  platform={sources['platform']} custom={sources['custom']} legacy={sources['library']}")
+    print(f"  fingerprint={catalog['fingerprint']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Column resolution for rows whose key sets differ (JSON rows often omit empty keys).
+"""
+
+from app.feed_generator import generate_dco_feed
+from app.feed_schema import FeedSchema
+
+
+def test_heterogeneous_rows_each_use_their_own_columns():
+    schema = FeedSchema()
+    rows = [
+        {"Target Audience": "A", "Notes": "x"},
+        {"Target Audience": "B", "Size": "300x250"},
+        {"Target Audience": "C", "Geo": "US"},
+    ]
+    feed = generate_dco_feed(audience_strategy=[], asset_list=[], media_plan_rows=rows, schema=schema)
+
+    assert [row.placement_dimension for row in feed] == ["", "300x250", ""]
+    assert [row.geo_targeting for row in feed] == ["", "", "US"]
+    assert schema.unmapped_columns() == {"media_plan_rows": ["Notes"]}
+
+
+def test_same_width_rows_with_different_keys_are_not_mixed_up():
+    schema = FeedSchema()
+    rows = [{"Target Audience": "A", "Size": "300x250"}, {"Target Audience": "B", "Geo": "US"}]
+    values = list(schema.media_plan.extract_all(rows))
+    fields = schema.media_plan.fields
+
+    assert values[1][fields.index("geo")] == "US"
+    assert values[1][fields.index("dimension")] is None
@@ -0,0 +1,139 @@
+"""
+GeminiClient against a local stand-in generateContent server (GEMINI_API_BASE).
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import llm_client
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests: list = []
+    # Connections the client has closed (the handler returns on EOF).
+    closed = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        _StandIn.requests.append((self.path, body))
+        model = self.path.split("?")[0].rsplit("/", 1)[-1]
+        if model.startswith("broken"):
+            payload = b'{"error": "quota"}'
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+        elif ":streamGenerateContent" in self.path:
+            chunks = [{"candidates": [{"content": {"parts": [{"text": text}]}}]} for text in ("Hel", "lo ", "there")]
+            payload = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+        else:
+            last = body["contents"][-1]["parts"][0]["text"]
+            reply = {"candidates": [{"content": {"parts": [{"text": f"echo: {last}"}]}}]}
+            payload = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def finish(self):
+        super().finish()
+        _StandIn.closed += 1
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _StandIn.requests = []
+    _StandIn.closed = 0
+    monkeypatch.setenv("GEMINI_API_BASE", f"http://127.0.0.1:{server.server_port}/v1beta")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_MODEL", "gemini-test")
+    monkeypatch.setattr(llm_client, "_CLIENT", None)
+    monkeypatch.setattr(llm_client, "_CLIENT_LOOP", None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_generate_uses_api_base(stand_in):
+    async def call():
+        client = llm_client.get_gemini_client()
+        try:
+            return await client.generate("Be brief.", [{"role": "user", "content": "hi"}])
+        finally:
+            await llm_client.close_gemini_client()
+
+    assert asyncio.run(call()) == "echo: hi"
+    path, body = _StandIn.requests[0]
+    assert path.startswith("/v1beta/models/gemini-test:generateContent?key=test-key")
+    assert body["systemInstruction"]["parts"][0]["text"] == "Be brief."
+
+
+def test_stream_generate_yields_chunks(stand_in):
+    async def call():
+        client = llm_client.get_gemini_client()
+        try:
+            return [text async for text in client.stream_generate("", [{"role": "user", "content": "hi"}])]
+        finally:
+            await llm_client.close_gemini_client()
+
+    assert asyncio.run(call()) == ["Hel", "lo ", "there"]
+    assert "alt=sse" in _StandIn.requests[0][0]
+
+
+def test_error_status_raises(stand_in, monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL", "broken-model")
+
+    async def call():
+        try:
+            return await llm_client.get_gemini_client().generate("", [{"role": "user", "content": "hi"}])
+        finally:
+            await llm_client.close_gemini_client()
+
+    with pytest.raises(RuntimeError, match="429"):
+        asyncio.run(call())
+
+
+def test_new_event_loop_closes_old_pool(stand_in):
+    async def call():
+        client = llm_client.get_gemini_client()
+        await client.generate("", [{"role": "user", "content": "hi"}])
+        return client
+
+    # The first client lives on a loop that keeps running in another thread.
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        first = asyncio.run_coroutine_threadsafe(call(), old_loop).result(timeout=10)
+        assert _StandIn.closed == 0
+
+        async def call_and_close():
+            try:
+                return await call()
+            finally:
+                await llm_client.close_gemini_client()
+
+        second = asyncio.run(call_and_close())
+        assert second is not first
+        # The old keep-alive connection is closed from the old loop.
+        deadline = time.monotonic() + 5
+        while _StandIn.closed < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _StandIn.closed == 2
+    finally:
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join(timeout=5)
+        old_loop.close()
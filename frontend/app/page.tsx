@@ -982,6 +982,24 @@ const deriveProductionRowsFromMatrix = (rows: MatrixRow[]): ProductionMatrixLine
   });
 };
 
+// /upload returns only the first page of a CSV's rows. The plan keeps that
+// preview plus the upload handle; anything that needs more rows reads them
+// from the stored upload (GET /upload/{handle}/rows) a page at a time rather
+// than holding the whole matrix in state.
+const UPLOAD_ROWS_PAGE_SIZE = 5000;
+
+const fetchUploadRowsPage = async (handle: string, offset: number, limit: number = UPLOAD_ROWS_PAGE_SIZE) => {
+  const res = await fetch(
+    `${API_BASE_URL}/upload/${encodeURIComponent(handle)}/rows?offset=${offset}&limit=${limit}`
+  );
+  if (!res.ok) throw new Error(`Failed to load uploaded rows (${res.status})`);
+  const page = await res.json();
+  return {
+    rows: (Array.isArray(page.rows) ? page.rows : []) as Record<string, string>[],
+    nextOffset: (page.next_offset ?? null) as number | null,
+  };
+};
+
 const HISTORICAL_BRIEFS: HistoricalBrief[] = [
   {
     id: "HB-001",
@@ -1889,10 +1907,16 @@ export default function Home() {
 
         // If this is an audience CSV, keep a structured copy in the plan
         if (data.kind === 'audience_matrix') {
+          const firstPage = Array.isArray(data.rows) ? data.rows : [];
           setPreviewPlan((prev: any) => ({
             ...prev,
-            audience_matrix: data.rows,
+            // Preview page only; further rows are paged on demand with
+            // fetchUploadRowsPage(audience_matrix_handle, offset).
+            audience_matrix: firstPage,
             audience_headers: data.headers,
+            audience_matrix_row_count: data.row_count ?? firstPage.length,
+            // Server-side copy of the upload, for requests that take a handle.
+            audience_matrix_handle: data.handle,
           }));
 
           const sampleRows = Array.isArray(data.rows) ? data.rows.slice(0, 3) : [];